@@ -0,0 +1,121 @@
+import asyncio
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+from typing import Any, Callable, TypeVar
+
+import example
+
+
+_Result = TypeVar("_Result")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class AsyncImageService:
+    def __init__(
+        self,
+        executor: Executor | None = None,
+        max_concurrency: int | None = None,
+        max_queue: int | None = None,
+        timeout: float | None = None,
+        use_processes: bool = False,
+    ) -> None:
+        self._max_concurrency = max_concurrency or os.cpu_count() or 1
+        # Pillow releases the GIL in decode, resize and encode, not in counting
+        self._owns_executor = executor is None
+        self._executor = executor or (
+            ProcessPoolExecutor(self._max_concurrency)
+            if use_processes
+            else ThreadPoolExecutor(self._max_concurrency)
+        )
+        self._max_queue = max_queue
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    async def get_palette(
+        self,
+        image_name: str,
+        pixel_budget: int | None = None,
+        top_n: int | None = None,
+        timeout: float | None = None,
+    ) -> tuple[str, list[str]]:
+        return await self.run(
+            example.get_palette, image_name, pixel_budget, top_n, timeout=timeout
+        )
+
+    async def resize(
+        self, image_name: str, timeout: float | None = None
+    ) -> list[BytesIO]:
+        return await self.run(example.resize, image_name, timeout=timeout)
+
+    async def run(
+        self,
+        func: Callable[..., _Result],
+        *args: Any,
+        timeout: float | None = None,
+        **kwargs: Any,
+    ) -> _Result:
+        # Rejects right away instead of queueing without bound
+        if (
+            self._max_queue is not None
+            and self._semaphore.locked()
+            and self._waiting >= self._max_queue
+        ):
+            raise QueueFullError(f"{self._waiting} requests are already waiting.")
+
+        timeout = timeout if timeout is not None else self._timeout
+        return await asyncio.wait_for(
+            self._run(partial(func, *args, **kwargs)), timeout
+        )
+
+    async def _run(self, func: Callable[[], _Result]) -> _Result:
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            future: Future = self._executor.submit(func)
+        except BaseException:
+            self._release()
+            raise
+
+        # A job that's already running can't be stopped, so its slot is only
+        # released when it's done, even if the caller was cancelled
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(
+            lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._release)
+        )
+        return await asyncio.wrap_future(future)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    async def close(self) -> None:
+        if self._owns_executor:
+            await asyncio.get_running_loop().run_in_executor(
+                None, partial(self._executor.shutdown, cancel_futures=True)
+            )
+
+    async def __aenter__(self) -> "AsyncImageService":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from PIL import Image
+
+from color import cluster, palette
+from color.palette import Color
+from example_settings import SAVE_OPTIONS, SUPPORTED_IMAGES
+from image import sniff
+from image.category import CategoryProxy
+from image.editor import IEditor, LazyStaticEditor
+from image.profile import IAnimatedProfile, IStaticProfile
+from image.utils import bulk_resize
+
+
+IMAGE_SUFFIXES = {".gif", ".jpeg", ".jpg", ".png", ".webp"}
+DEFAULT_SIZES = [(256, 256), (128, 128)]
+
+
+def get_resize_save_options(sizes: list[tuple[int, int]]) -> list[dict]:
+    return [
+        {
+            "resize": {"size": size, "resample": 1, "reducing_gap": 3},
+            "save": {"format": "JPEG", "optimize": True, "quality": 75},
+        }
+        for size in sizes
+    ]
+
+
+def iter_sources(source: str) -> Iterator[str]:
+    # A directory is scanned for images, anything else is a manifest of paths
+    if os.path.isdir(source):
+        for path in sorted(Path(source).iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                yield str(path)
+        return
+
+    with open(source) as manifest:
+        for line in manifest:
+            if line.strip():
+                yield line.strip()
+
+
+def process_image(
+    source: str,
+    output_dir: str | None = None,
+    sizes: list[tuple[int, int]] = DEFAULT_SIZES,
+    top_n: int | None = 8,
+    pixel_budget: int | None = 256_000,
+) -> dict:
+    try:
+        return _process_image(source, output_dir, sizes, top_n, pixel_budget)
+    except Exception as error:
+        return _get_error(source, error)
+
+
+def _process_image(
+    source: str,
+    output_dir: str | None,
+    sizes: list[tuple[int, int]],
+    top_n: int | None,
+    pixel_budget: int | None,
+) -> dict:
+    # Rejects unsupported files from their header, without decoding them
+    if not sniff.get_profile_class(source, SUPPORTED_IMAGES):
+        # Opening only parses the header, for the same errors as before
+        with Image.open(source) as image:
+            raise Exception(f"Unsupported image type: {image.format}/{image.mode}.")
+
+    with Image.open(source) as image:
+        profile = CategoryProxy(image, SUPPORTED_IMAGES).get_profile()
+
+        if not profile:
+            raise Exception(f"Unsupported image type: {image.format}/{image.mode}.")
+
+        if isinstance(profile, IStaticProfile):
+            # Converted and resized in one pass, every size is saved as a JPEG.
+            # It runs before the palette loads the image, a JPEG can only be
+            # drafted to the planned scale while it isn't loaded yet
+            lazy_editor = LazyStaticEditor(image)
+            lazy_editor.convert_mode("RGB")
+            resized = list(
+                bulk_resize(lazy_editor, get_resize_save_options(sizes), cascade=True)
+            )
+            sorted_palette = _get_palette(profile, pixel_budget, top_n)
+        elif profile.is_optimized():
+            # Before resizing moves the image past the 1st frame, the one it reads
+            sorted_palette = _get_palette(profile, pixel_budget, top_n)
+            resized = _resize_animated(profile.get_editor(), sizes)
+        else:
+            sorted_palette = _get_palette(profile, pixel_budget, top_n)
+            # Avoid format-related problems by resizing the optimized image
+            optimized = BytesIO()
+            profile.optimize(output=optimized, save_options=SAVE_OPTIONS)  # type: ignore
+
+            with Image.open(optimized) as optimized_image:
+                optimized_profile = CategoryProxy(
+                    optimized_image, SUPPORTED_IMAGES
+                ).get_profile()
+                resized = _resize_animated(
+                    optimized_profile.get_editor(), sizes  # type: ignore
+                )
+
+    return {
+        "source": source,
+        "dominant_color": sorted_palette[0],
+        "palette": sorted_palette,
+        "outputs": [
+            _write_output(source, output_dir, size, output)
+            for size, output in zip(sizes, resized)
+        ],
+    }
+
+
+def _resize_animated(editor: IEditor, sizes: list[tuple[int, int]]) -> list[BytesIO]:
+    # Every size is saved as a JPEG, so an animation with alpha drops it too
+    editor.convert_mode("RGB")
+    return list(bulk_resize(editor, get_resize_save_options(sizes), cascade=True))
+
+
+def _get_palette(
+    profile: IStaticProfile | IAnimatedProfile,
+    pixel_budget: int | None,
+    top_n: int | None,
+) -> list[Color]:
+    cc_image = profile.get_color_clustering_image(pixel_budget)
+    color_cluster = cluster.SortedColorCluster(palette.HexRGB(cc_image))
+    return color_cluster.get_palette(top_n)
+
+
+def _write_output(
+    source: str, output_dir: str | None, size: tuple[int, int], output: BytesIO
+) -> str | int:
+    if not output_dir:
+        return output.getbuffer().nbytes
+
+    path = os.path.join(output_dir, f"{Path(source).stem}_{size[0]}x{size[1]}.jpg")
+    with open(path, "wb") as file:
+        file.write(output.getbuffer())
+    return path
+
+
+def run_batch(
+    sources: Iterable[str],
+    workers: int | None = None,
+    ordered: bool = True,
+    max_in_flight: int | None = None,
+    **process_options,
+) -> Iterator[dict]:
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    pending: deque[tuple[str, Future]] = deque()
+    sources = iter(sources)
+    executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit() -> bool:
+        nonlocal executor
+
+        source = next(sources, None)
+        if source is None:
+            return False
+        try:
+            future = executor.submit(process_image, source, **process_options)
+        except BrokenProcessPool:
+            # A crashed worker breaks the whole pool, later files get a new one
+            executor.shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=workers)
+            future = executor.submit(process_image, source, **process_options)
+        pending.append((source, future))
+        return True
+
+    try:
+        # Only max_in_flight images are ever queued, so memory stays flat
+        while len(pending) < max_in_flight and submit():
+            pass
+
+        while pending:
+            if ordered:
+                source, future = pending.popleft()
+            else:
+                done, _ = wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+                source, future = next(item for item in pending if item[1] in done)
+                pending.remove((source, future))
+
+            yield _get_result(source, future, process_options)
+            submit()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _get_result(source: str, future: Future, process_options: dict) -> dict:
+    # process_image isolates its own errors, this covers crashed workers
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        # Every file queued on a crashed pool fails with it, so each one is
+        # retried on its own and only the file that crashed is reported
+        return _process_isolated(source, process_options)
+    except Exception as error:
+        return _get_error(source, error)
+
+
+def _process_isolated(source: str, process_options: dict) -> dict:
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(process_image, source, **process_options)
+        try:
+            return future.result()
+        except Exception as error:
+            return _get_error(source, error)
+
+
+def _get_error(source: str, error: Exception) -> dict:
+    return {"source": source, "error": f"{type(error).__name__}: {error}"}
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch process wallpapers.")
+    parser.add_argument("source", help="directory of images or manifest file")
+    parser.add_argument("-o", "--output-dir", default=None)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--unordered", action="store_true")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--top-n", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = 0
+    for result in run_batch(
+        iter_sources(args.source),
+        workers=args.workers,
+        ordered=not args.unordered,
+        max_in_flight=args.max_in_flight,
+        output_dir=args.output_dir,
+        sizes=args.sizes,
+        top_n=args.top_n,
+    ):
+        failed += "error" in result
+        print(json.dumps(result))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
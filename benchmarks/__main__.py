@@ -0,0 +1,57 @@
+import argparse
+import sys
+
+from benchmarks import runner
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmark the image pipeline."
+    )
+    parser.add_argument("-o", "--output", default="bench_output.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.15)
+    parser.add_argument("--metric", choices=["wall", "cpu"], default="wall")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--sizes", type=parse_size, nargs="+", default=[(640, 360), (1920, 1080)]
+    )
+    parser.add_argument("--frames", type=int, nargs="+", default=[10])
+    parser.add_argument(
+        "--operations", nargs="+", choices=runner.OPERATIONS, default=runner.OPERATIONS
+    )
+    parser.add_argument("-k", "--filter", default="", help="only matching cases")
+    args = parser.parse_args(argv)
+
+    cases = [
+        case
+        for case in runner.get_cases(args.sizes, args.frames, args.operations)
+        if args.filter in runner.get_case_name(case)
+    ]
+    results = runner.run(cases, repeat=args.repeat)
+    runner.dump(results, args.output)
+
+    for name, result in results["results"].items():
+        print(
+            f"{name:<48} wall {result['wall']:.4f}s  cpu {result['cpu']:.4f}s  "
+            f"peak {result['peak_memory_kb']} KB"
+        )
+
+    if not args.baseline:
+        return 0
+
+    regressions = runner.compare(
+        results, runner.load(args.baseline), args.threshold, args.metric
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
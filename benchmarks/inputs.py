@@ -0,0 +1,57 @@
+from io import BytesIO
+
+from PIL import Image
+
+
+# format, mode -> save options used to produce an input of that profile
+STATIC_INPUTS = {
+    "JPEG_RGB": ("RGB", {"format": "JPEG", "quality": 90}),
+    "PNG_RGB": ("RGB", {"format": "PNG"}),
+    "PNG_RGBA": ("RGBA", {"format": "PNG"}),
+    "WEBP_RGB": ("RGB", {"format": "WEBP", "quality": 90}),
+    "WEBP_RGBA": ("RGBA", {"format": "WEBP", "lossless": True}),
+}
+ANIMATED_INPUTS = {
+    "GIF_P": ("RGB", {"format": "GIF"}),
+    "WEBP_RGB": ("RGB", {"format": "WEBP", "quality": 90}),
+    "WEBP_RGBA": ("RGBA", {"format": "WEBP", "lossless": True}),
+}
+
+
+def make_frame(mode: str, size: tuple[int, int], seed: int = 0) -> Image.Image:
+    # Gradients plus noise, so palettes and encoders don't get a trivial image
+    width, height = size
+    red = Image.linear_gradient("L").resize(size)
+    green = Image.linear_gradient("L").rotate(90 + seed * 7).resize(size)
+    blue = Image.effect_noise(size, 64 + seed % 32)
+    bands = [red, green, blue]
+
+    if mode == "RGBA":
+        # Translucent in the top rows only
+        alpha = Image.new("L", size, 255)
+        alpha.paste(128, (0, 0, width, max(1, height // 8)))
+        bands.append(alpha)
+    return Image.merge(mode, bands)
+
+
+def make_input(
+    category: str, format_mode: str, size: tuple[int, int], frames: int = 1
+) -> bytes:
+    inputs = STATIC_INPUTS if category == "STATIC" else ANIMATED_INPUTS
+    mode, save_options = inputs[format_mode]
+    output = BytesIO()
+
+    if category == "STATIC":
+        make_frame(mode, size).save(output, **save_options)
+        return output.getvalue()
+
+    images = [make_frame(mode, size, seed) for seed in range(frames)]
+    images[0].save(
+        output,
+        save_all=True,
+        append_images=images[1:],
+        duration=40,
+        loop=0,
+        **save_options,
+    )
+    return output.getvalue()
@@ -0,0 +1,208 @@
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+from typing import Callable
+
+import PIL
+from PIL import Image
+
+from benchmarks import inputs
+from color import cluster, palette
+from example_settings import SAVE_OPTIONS, SUPPORTED_IMAGES
+from image.category import CategoryProxy
+from image.editor import IEditor, LazyStaticEditor
+from image.profile import IStaticProfile
+from image.utils import bulk_resize
+
+
+OPERATIONS = ["palette", "optimize", "bulk_resize"]
+RESIZE_SIZES = [(1280, 720), (512, 288), (256, 144), (128, 72)]
+
+Case = tuple[str, str, tuple[int, int], int, str]  # category, key, size, frames, op
+
+
+def get_cases(
+    sizes: list[tuple[int, int]], frame_counts: list[int], operations: list[str]
+) -> list[Case]:
+    cases = []
+
+    for category, profiles in SUPPORTED_IMAGES.items():
+        for format_mode, profile_cls in profiles.items():
+            for size in sizes:
+                for frames in frame_counts if category == "ANIMATED" else [1]:
+                    for operation in operations:
+                        if operation == "optimize" and not _is_optimizable(
+                            profile_cls, frames
+                        ):
+                            continue
+                        cases.append((category, format_mode, size, frames, operation))
+    return cases
+
+
+def _is_optimizable(profile_cls: type, frames: int) -> bool:
+    # Already optimized profiles have nothing to run, an animated GIF is one
+    if not hasattr(profile_cls, "optimize"):
+        return False
+    return not (profile_cls.name == "GIF_P" and frames > 1)
+
+
+def get_case_name(case: Case) -> str:
+    category, format_mode, (width, height), frames, operation = case
+    name = f"{category}/{format_mode}/{width}x{height}"
+    if category == "ANIMATED":
+        name = f"{name}/{frames}f"
+    return f"{name}/{operation}"
+
+
+def run_palette(source: BytesIO) -> None:
+    with Image.open(source) as image:
+        profile = CategoryProxy(image, SUPPORTED_IMAGES).get_profile()
+        cc_image = profile.get_color_clustering_image()  # type: ignore
+        cluster.SortedColorCluster(palette.HexRGB(cc_image)).get_palette()
+
+
+def run_optimize(source: BytesIO) -> None:
+    with Image.open(source) as image:
+        profile = CategoryProxy(image, SUPPORTED_IMAGES).get_profile()
+        profile.optimize(BytesIO(), SAVE_OPTIONS)  # type: ignore
+
+
+def run_bulk_resize(source: BytesIO) -> None:
+    with Image.open(source) as image:
+        profile = CategoryProxy(image, SUPPORTED_IMAGES).get_profile()
+
+        if isinstance(profile, IStaticProfile):
+            image_editor: IEditor = LazyStaticEditor(image)
+            image_editor.convert_mode("RGB")
+            save_options = SAVE_OPTIONS["JPEG"]
+        else:
+            image_editor = profile.get_editor()  # type: ignore
+            save_options = SAVE_OPTIONS["GIF"]
+
+        resize_save_options = [
+            {
+                "resize": {"size": size, "resample": 1, "reducing_gap": 3},
+                "save": save_options,
+            }
+            for size in RESIZE_SIZES
+            if size[0] < image.width
+        ]
+        list(bulk_resize(image_editor, resize_save_options, cascade=True))
+
+
+_RUNNERS: dict[str, Callable[[BytesIO], None]] = {
+    "palette": run_palette,
+    "optimize": run_optimize,
+    "bulk_resize": run_bulk_resize,
+}
+
+
+def measure(operation: str, data: bytes, repeat: int) -> dict[str, float]:
+    runner = _RUNNERS[operation]
+
+    rss_before = _reset_peak_rss()
+    walls, cpus = [], []
+
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        runner(BytesIO(data))
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+
+    rss_after = _get_peak_rss()
+    return {
+        "wall": statistics.median(walls),
+        "cpu": statistics.median(cpus),
+        "peak_memory_kb": max(0, rss_after - rss_before),
+        "input_bytes": len(data),
+    }
+
+
+def _reset_peak_rss() -> int:
+    # A spawned worker inherits the parent's ru_maxrss across exec, Linux can
+    # reset the high-water mark, elsewhere this falls back to a delta
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return _read_proc_status("VmRSS")
+    except OSError:
+        return _get_max_rss()
+
+
+def _get_peak_rss() -> int:
+    try:
+        return _read_proc_status("VmHWM")
+    except OSError:
+        return _get_max_rss()
+
+
+def _get_max_rss() -> int:
+    # In KB, except on macOS where ru_maxrss is in bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == "darwin" else max_rss
+
+
+def _read_proc_status(field: str) -> int:
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1])
+    raise OSError(f"{field} not found.")
+
+
+def run(cases: list[Case], repeat: int = 3) -> dict:
+    results = {}
+    context = get_context("spawn")
+
+    with ProcessPoolExecutor(1, mp_context=context, max_tasks_per_child=1) as pool:
+        for case in cases:
+            # Made here so building the input doesn't count towards peak memory
+            category, format_mode, size, frames, operation = case
+            data = inputs.make_input(category, format_mode, size, frames)
+            future = pool.submit(measure, operation, data, repeat)
+            results[get_case_name(case)] = future.result()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float, metric: str = "wall"
+) -> list[str]:
+    regressions = []
+
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if not reference or not reference[metric]:
+            continue
+
+        change = result[metric] / reference[metric] - 1
+        if change > threshold:
+            regressions.append(
+                f"{name}: {metric} {reference[metric]:.4f} -> "
+                f"{result[metric]:.4f} (+{change:.0%})"
+            )
+    return regressions
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def dump(results: dict, path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
@@ -0,0 +1,125 @@
+import shelve
+from collections import OrderedDict
+from hashlib import blake2b
+from os import PathLike
+from typing import IO, Any
+
+import PIL.Image
+
+from color.palette import Color, IColor
+
+
+Source = str | bytes | PathLike | IO[bytes]
+
+_CHUNK_SIZE = 1 << 20
+
+
+def get_file_digest(source: Source) -> str:
+    digest = blake2b(digest_size=20)
+
+    if hasattr(source, "read"):
+        position = source.tell()  # type: ignore
+        for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):  # type: ignore
+            digest.update(chunk)
+        source.seek(position)  # type: ignore
+        return digest.hexdigest()
+
+    with open(source, "rb") as file:  # type: ignore
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_image_digest(image: PIL.Image.Image) -> str:
+    digest = blake2b(digest_size=20)
+    digest.update(f"{image.mode}:{image.width}x{image.height}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def get_cache_key(
+    digest: str,
+    color_cluster_class: type,
+    color_class: type[IColor],
+    alpha: bool,
+    *params: Any,
+) -> str:
+    return ":".join(
+        [
+            digest,
+            color_cluster_class.__name__,
+            color_class.__name__,
+            str(int(alpha)),
+            *map(str, params),
+        ]
+    )
+
+
+class PaletteCache:
+    def __init__(self, max_size: int = 256, path: str | None = None) -> None:
+        self.max_size = max_size
+        self._palettes: OrderedDict[str, list[Color]] = OrderedDict()
+        self._store: shelve.Shelf | None = shelve.open(path) if path else None
+
+    def get(self, key: str) -> list[Color] | None:
+        # Copies, so a caller changing its palette can't change the cached one
+        if key in self._palettes:
+            self._palettes.move_to_end(key)
+            return list(self._palettes[key])
+
+        if self._store is not None and key in self._store:
+            palette = self._store[key]
+            self._remember(key, palette)
+            return list(palette)
+        return None
+
+    def set(self, key: str, palette: list[Color]) -> None:
+        self._remember(key, list(palette))
+
+        if self._store is not None:
+            self._store[key] = palette
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def __enter__(self) -> "PaletteCache":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _remember(self, key: str, palette: list[Color]) -> None:
+        self._palettes[key] = palette
+        self._palettes.move_to_end(key)
+
+        while len(self._palettes) > self.max_size:
+            self._palettes.popitem(last=False)
+
+
+class CachedColorCluster:
+    def __init__(
+        self, color_cluster: Any, cache: PaletteCache, key: str | None = None
+    ) -> None:
+        self.color_cluster = color_cluster
+        self.cache = cache
+        self.key = key
+
+    def get_palette(self, top_n: int | None = None) -> list[Color]:
+        key = self.key or self.get_key()
+        palette = self.cache.get(key)
+
+        if palette is None:
+            palette = self.color_cluster.get_palette()
+            self.cache.set(key, palette)
+        return palette[:top_n]
+
+    def get_key(self) -> str:
+        color = self.color_cluster.color
+        return get_cache_key(
+            get_image_digest(color.image),
+            type(self.color_cluster),
+            type(color),
+            bool(color.alpha),
+        )
@@ -1,11 +1,54 @@
-from color.palette import ColorBands, ColorIterator, Color, IColor
+from array import array
+from collections import Counter
+from heapq import nlargest
+from time import perf_counter
+from typing import Hashable, TypeVar
+
+from color import utils
+from color.palette import (
+    ColorBands,
+    ColorIterator,
+    Color,
+    ColorPalette,
+    IColor,
+    PackedColors,
+)
+from common import observer
+
+
+_Key = TypeVar("_Key", bound=Hashable)
+_Channels = tuple[int, ...]
+_Bucket = tuple[_Channels, int]
 
 
 class SortedColorCluster:
     def __init__(self, color: IColor) -> None:
         self.color = color
 
-    def get_palette(self) -> list[Color]:
+    def get_palette(self, top_n: int | None = None) -> list[Color]:
+        return self.get_color_palette(top_n).colors
+
+    def get_dominant_color(self) -> Color:
+        return self.get_palette(top_n=1)[0]
+
+    def get_color_palette(self, top_n: int | None = None) -> ColorPalette:
+        packed_colors = self.color.get_packed_colors()
+
+        with observer.stage("palette_count") as stage:
+            stage.pixels = len(packed_colors)
+            color_counts = self._count_packed_colors(packed_colors)
+            if not self.color.lossless:
+                return self._get_merged_palette(color_counts, top_n)
+            top_colors = self._select_top_colors(color_counts, top_n)
+
+        # Only the selected colors get structured
+        return ColorPalette(
+            list(self.color.structure_packed_palette(top_colors)),
+            array("Q", map(color_counts.__getitem__, top_colors)),
+            sum(color_counts.values()),
+        )
+
+    def get_reference_palette(self) -> list[Color]:
         color_bands = self.get_color_bands()
         raw_palette = self.structure_palette(color_bands)
 
@@ -20,6 +63,28 @@ class SortedColorCluster:
     def structure_palette(self, color_bands: ColorBands) -> ColorIterator:
         return self.color.structure_palette(color_bands)
 
+    def _get_merged_palette(
+        self, packed_counts: dict[int, int], top_n: int | None
+    ) -> ColorPalette:
+        # Distinct packed colors can round to the same color, so the counts are
+        # merged after structuring all of them, like get_reference_palette
+        color_counts: dict[Color, int] = {}
+        structured = self.color.structure_packed_palette(packed_counts)
+        for color, count in zip(structured, packed_counts.values()):
+            color_counts[color] = color_counts.get(color, 0) + count
+
+        top_colors = self._select_top_colors(color_counts, top_n)
+        return ColorPalette(
+            top_colors,
+            array("Q", map(color_counts.__getitem__, top_colors)),
+            sum(color_counts.values()),
+        )
+
+    @staticmethod
+    def _count_packed_colors(packed_colors: PackedColors) -> dict[int, int]:
+        # Counter keeps the first-seen order, so ties sort like _count_colors
+        return Counter(packed_colors)
+
     @staticmethod
     def _count_colors(raw_palette: ColorIterator) -> dict[Color, int]:
         color_counts: dict[Color, int] = {}
@@ -29,5 +94,147 @@ class SortedColorCluster:
         return color_counts
 
     @staticmethod
-    def _sort_colors_by_count(color_counts: dict[Color, int]) -> list[Color]:
+    def _sort_colors_by_count(color_counts: dict[_Key, int]) -> list[_Key]:
         return sorted(color_counts, key=lambda key: color_counts[key], reverse=True)
+
+    @staticmethod
+    def _select_top_colors(
+        color_counts: dict[_Key, int], top_n: int | None
+    ) -> list[_Key]:
+        if top_n is None:
+            return SortedColorCluster._sort_colors_by_count(color_counts)
+        # Same order as the full sort, without sorting every color
+        return nlargest(top_n, color_counts, key=color_counts.__getitem__)
+
+
+class MedianCutColorCluster:
+    def __init__(
+        self,
+        color: IColor,
+        colors: int = 8,
+        bucket_bits: int = 5,
+        iterations: int = 3,
+        time_budget: float = 0.5,
+    ) -> None:
+        self.color = color
+        self.colors = colors
+        self.bucket_bits = bucket_bits
+        self.iterations = iterations
+        self.time_budget = time_budget
+
+    def get_palette(self) -> list[Color]:
+        return [color for color, _ in self.get_weighted_palette()]
+
+    def get_color_palette(self) -> ColorPalette:
+        weighted_palette = self.get_weighted_palette()
+        counts = array("Q", (weight for _, weight in weighted_palette))
+        return ColorPalette(
+            [color for color, _ in weighted_palette], counts, sum(counts)
+        )
+
+    def get_weighted_palette(self) -> list[tuple[Color, int]]:
+        buckets = self.get_buckets()
+        deadline = perf_counter() + self.time_budget
+
+        boxes = self._median_cut(buckets, self.colors, deadline)
+        centroids = self._refine_centroids(
+            buckets, list(map(self._get_centroid, boxes)), self.iterations, deadline
+        )
+        centroids.sort(key=lambda centroid: centroid[1], reverse=True)
+
+        palette = self.color.structure_packed_palette(
+            utils.pack_rgb_or_rgba(channels) for channels, _ in centroids
+        )
+        return list(zip(palette, (weight for _, weight in centroids)))
+
+    def get_buckets(self) -> list[_Bucket]:
+        # Memory is bounded by the bucket count, not by the distinct colors
+        packed_colors = self.color.get_packed_colors(self.bucket_bits)
+        bucket_counts = Counter(packed_colors)
+        channels = 3 + self.color.alpha
+
+        return [
+            (tuple(utils.unpack_rgb_or_rgba(bucket, 1)[:channels]), count)
+            for bucket, count in bucket_counts.items()
+        ]
+
+    @staticmethod
+    def _median_cut(
+        buckets: list[_Bucket], colors: int, deadline: float
+    ) -> list[list[_Bucket]]:
+        boxes = [buckets] if buckets else []
+
+        while len(boxes) < colors and perf_counter() < deadline:
+            splittable = [box for box in boxes if len(box) > 1]
+            if not splittable:
+                break
+
+            box = max(splittable, key=MedianCutColorCluster._get_widest_range)
+            channel = MedianCutColorCluster._get_widest_channel(box)
+            box.sort(key=lambda bucket: bucket[0][channel])
+
+            # Split at the weighted median, keeping both halves non-empty
+            half, total = sum(count for _, count in box) / 2, 0
+            for index, (_, count) in enumerate(box[:-1], 1):
+                total += count
+                if total >= half:
+                    break
+
+            boxes.remove(box)
+            boxes.extend([box[:index], box[index:]])
+        return boxes
+
+    @staticmethod
+    def _refine_centroids(
+        buckets: list[_Bucket],
+        centroids: list[tuple[_Channels, int]],
+        iterations: int,
+        deadline: float,
+    ) -> list[tuple[_Channels, int]]:
+        for _ in range(iterations):
+            if perf_counter() >= deadline:
+                break
+
+            clusters: list[list[_Bucket]] = [[] for _ in centroids]
+            for bucket in buckets:
+                distances = [
+                    sum((a - b) ** 2 for a, b in zip(bucket[0], centroid))
+                    for centroid, _ in centroids
+                ]
+                clusters[distances.index(min(distances))].append(bucket)
+
+            refined = [
+                MedianCutColorCluster._get_centroid(cluster)
+                for cluster in clusters
+                if cluster
+            ]
+            if refined == centroids:
+                break
+            centroids = refined
+        return centroids
+
+    @staticmethod
+    def _get_centroid(box: list[_Bucket]) -> tuple[_Channels, int]:
+        weight = sum(count for _, count in box)
+        channels = tuple(
+            round(sum(bucket[channel] * count for bucket, count in box) / weight)
+            for channel in range(len(box[0][0]))
+        )
+        return channels, weight
+
+    @staticmethod
+    def _get_channel_ranges(box: list[_Bucket]) -> list[int]:
+        return [
+            max(bucket[channel] for bucket, _ in box)
+            - min(bucket[channel] for bucket, _ in box)
+            for channel in range(len(box[0][0]))
+        ]
+
+    @staticmethod
+    def _get_widest_range(box: list[_Bucket]) -> int:
+        return max(MedianCutColorCluster._get_channel_ranges(box))
+
+    @staticmethod
+    def _get_widest_channel(box: list[_Bucket]) -> int:
+        ranges = MedianCutColorCluster._get_channel_ranges(box)
+        return ranges.index(max(ranges))
@@ -1,7 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import Iterator, Union
+from array import array
+from functools import cache
+from typing import Callable, Iterable, Iterator, Sequence, Union
 
 import PIL.Image
+from PIL import ImageCms
 
 from . import utils
 
@@ -10,14 +13,36 @@ _HSL = tuple[int, int, int]
 _HSLA = tuple[int, int, int, int]
 _RGBA = _HSLA
 _RGB = _HSL
+_HSV = _HSL
+_LAB = _HSL
 _HEX = str
 
 ColorIterator = Iterator[_HEX | _RGB | _RGBA | _HSL | _HSLA]
 Color = Union[_HEX | _RGB | _RGBA | _HSL | _HSLA]
 ColorBands = list[list[int]]
+PackedColors = Sequence[int]
+
+
+class ColorPalette:
+    __slots__ = ("colors", "counts", "total")
+
+    def __init__(self, colors: list[Color], counts: Sequence[int], total: int) -> None:
+        self.colors = colors
+        self.counts = counts if isinstance(counts, array) else array("Q", counts)
+        self.total = total
+
+    def __len__(self) -> int:
+        return len(self.colors)
+
+    @property
+    def proportions(self) -> list[float]:
+        return [count / self.total for count in self.counts] if self.total else []
 
 
 class IColor(ABC):
+    # Whether distinct packed colors always structure to distinct colors
+    lossless = True
+
     def __init__(self, image: PIL.Image.Image, alpha: bool = False) -> None:
         self.image = image
         self.alpha = 1 if alpha else 0
@@ -31,6 +56,20 @@ class IColor(ABC):
     def structure_palette(color_bands: ColorBands) -> ColorIterator:
         pass
 
+    @abstractmethod
+    def structure_packed_palette(self, packed_colors: Iterable[int]) -> ColorIterator:
+        pass
+
+    def get_packed_colors(self, bucket_bits: int = 8) -> PackedColors:
+        image = self.image.convert("RGBA")
+
+        # Pin the ignored band so colors differing only in alpha collapse
+        if not self.alpha:
+            image.putalpha(255)
+        if bucket_bits < 8:
+            image = image.point(utils.get_bucket_lut(bucket_bits) * 4)
+        return memoryview(image.tobytes()).cast("I")
+
 
 class HexRGB(IColor):
     def get_color_bands(self) -> ColorBands:
@@ -40,6 +79,14 @@ class HexRGB(IColor):
     def structure_palette(color_bands: ColorBands) -> Iterator[_HEX]:
         return map(lambda *RGB: utils.rgb_or_rgba_to_hex(RGB), *color_bands)
 
+    def structure_packed_palette(self, packed_colors: Iterable[int]) -> Iterator[_HEX]:
+        return map(
+            lambda color: utils.rgb_or_rgba_to_hex(
+                utils.unpack_rgb_or_rgba(color, self.alpha)
+            ),
+            packed_colors,
+        )
+
 
 class RGB(IColor):
     def get_color_bands(self) -> ColorBands:
@@ -48,3 +95,101 @@ class RGB(IColor):
     @staticmethod
     def structure_palette(color_bands: ColorBands) -> Iterator[_RGB | _RGBA]:
         return map(lambda *RGB: tuple(RGB), *color_bands)
+
+    def structure_packed_palette(
+        self, packed_colors: Iterable[int]
+    ) -> Iterator[_RGB | _RGBA]:
+        return map(
+            lambda color: tuple(utils.unpack_rgb_or_rgba(color, self.alpha)),
+            packed_colors,
+        )
+
+
+class HSL(IColor):
+    # No native mode, so only the deduplicated colors get converted
+    lossless = False
+
+    def get_color_bands(self) -> ColorBands:
+        return [self.image.getdata(band) for band in range(3 + self.alpha)]
+
+    @staticmethod
+    def structure_palette(color_bands: ColorBands) -> Iterator[_HSL | _HSLA]:
+        return map(lambda *RGB: utils.rgb_or_rgba_to_hsl(RGB), *color_bands)
+
+    def structure_packed_palette(
+        self, packed_colors: Iterable[int]
+    ) -> Iterator[_HSL | _HSLA]:
+        return map(
+            lambda color: utils.rgb_or_rgba_to_hsl(
+                utils.unpack_rgb_or_rgba(color, self.alpha)
+            ),
+            packed_colors,
+        )
+
+
+class HSV(IColor):
+    lossless = False
+
+    def get_color_bands(self) -> ColorBands:
+        return _get_converted_bands(self.image, _to_hsv, self.alpha)
+
+    @staticmethod
+    def structure_palette(color_bands: ColorBands) -> Iterator[_HSV | _HSLA]:
+        return map(lambda *HSV: utils.scale_hsv(HSV), *color_bands)
+
+    def structure_packed_palette(
+        self, packed_colors: Iterable[int]
+    ) -> Iterator[_HSV | _HSLA]:
+        image = _get_packed_image(packed_colors)
+        return self.structure_palette(_get_converted_bands(image, _to_hsv, self.alpha))
+
+
+class Lab(IColor):
+    # CIELAB under D50, L in 0-100 and a/b in -128-127
+    lossless = False
+
+    def get_color_bands(self) -> ColorBands:
+        return _get_converted_bands(self.image, _to_lab, self.alpha)
+
+    @staticmethod
+    def structure_palette(color_bands: ColorBands) -> Iterator[_LAB | _HSLA]:
+        return map(lambda *LAB: utils.scale_lab(LAB), *color_bands)
+
+    def structure_packed_palette(
+        self, packed_colors: Iterable[int]
+    ) -> Iterator[_LAB | _HSLA]:
+        image = _get_packed_image(packed_colors)
+        return self.structure_palette(_get_converted_bands(image, _to_lab, self.alpha))
+
+
+def _get_packed_image(packed_colors: Iterable[int]) -> PIL.Image.Image:
+    # One pixel per color, so Pillow converts them all in a single call
+    data = array("I", packed_colors)
+    return PIL.Image.frombytes("RGBA", (len(data), 1), data.tobytes())
+
+
+def _get_converted_bands(
+    image: PIL.Image.Image,
+    convert: Callable[[PIL.Image.Image], PIL.Image.Image],
+    alpha: int,
+) -> ColorBands:
+    converted = convert(image.convert("RGB"))
+    color_bands = [converted.getdata(band) for band in range(3)]
+    if alpha:
+        color_bands.append(image.getdata(3))
+    return color_bands
+
+
+def _to_hsv(image: PIL.Image.Image) -> PIL.Image.Image:
+    return image.convert("HSV")
+
+
+def _to_lab(image: PIL.Image.Image) -> PIL.Image.Image:
+    return ImageCms.applyTransform(image, _get_lab_transform())  # type: ignore
+
+
+@cache
+def _get_lab_transform() -> ImageCms.ImageCmsTransform:
+    return ImageCms.buildTransform(
+        ImageCms.createProfile("sRGB"), ImageCms.createProfile("LAB"), "RGB", "LAB"
+    )
@@ -1,10 +1,73 @@
 from __future__ import annotations
+import colorsys
 from binascii import hexlify
+from sys import byteorder
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from color.palette import _RGB, _RGBA, _HSLA, _HSL, _HEX
+    from color.palette import _RGB, _RGBA, _HSLA, _HSL, _HSV, _LAB, _HEX, Color
 
 
-def rgb_or_rgba_to_hex(color: _RGB | _RGBA) -> _HEX:
+def rgb_or_rgba_to_hex(color: _RGB | _RGBA | bytes) -> _HEX:
     return "#" + hexlify(bytearray(color)).decode("ascii")
+
+
+def unpack_rgb_or_rgba(packed_color: int, alpha: int = 0) -> bytes:
+    # Packed colors are the native-endian 32-bit words of RGBA raw data
+    return packed_color.to_bytes(4, byteorder)[: 3 + alpha]
+
+
+def pack_rgb_or_rgba(color: _RGB | _RGBA) -> int:
+    return int.from_bytes(bytes(color) + b"\xff" * (4 - len(color)), byteorder)
+
+
+def rgb_or_rgba_to_hsl(color: _RGB | _RGBA | bytes) -> _HSL | _HSLA:
+    # Degrees and percents, alpha stays 0-255
+    red, green, blue = (band / 255 for band in color[:3])
+    hue, lightness, saturation = colorsys.rgb_to_hls(red, green, blue)
+    return (
+        round(hue * 360) % 360,
+        round(saturation * 100),
+        round(lightness * 100),
+        *color[3:],
+    )
+
+
+def scale_hsv(color: tuple[int, ...]) -> _HSV | tuple[int, int, int, int]:
+    # Pillow's HSV bands are 0-255, scaled to degrees and percents
+    hue, saturation, value = color[:3]
+    return (
+        round(hue * 360 / 255) % 360,
+        round(saturation * 100 / 255),
+        round(value * 100 / 255),
+        *color[3:],
+    )
+
+
+def scale_lab(color: tuple[int, ...]) -> _LAB | tuple[int, int, int, int]:
+    # Pillow's LAB bands are L 0-255 and a/b offset by 128
+    lightness, a, b = color[:3]
+    return (round(lightness * 100 / 255), a - 128, b - 128, *color[3:])
+
+
+def get_bucket_lut(bucket_bits: int) -> list[int]:
+    # Spread the buckets over 0-255 so pure black, white and opacity survive
+    shift = 8 - bucket_bits
+    return [(value >> shift) * 255 // (255 >> shift) for value in range(256)]
+
+
+def get_ranking_divergence(
+    palette: list[Color], reference_palette: list[Color], top_n: int = 10
+) -> float:
+    # Normalized rank displacement of the reference top-N (0 same, 1 disjoint)
+    reference_top = reference_palette[:top_n]
+
+    if not reference_top:
+        return 0.0
+
+    ranks = {color: rank for rank, color in enumerate(palette[:top_n])}
+    displacement = sum(
+        abs(ranks.get(color, top_n) - rank) for rank, color in enumerate(reference_top)
+    )
+    max_displacement = sum(top_n - rank for rank in range(len(reference_top)))
+    return min(1.0, displacement / max_displacement)
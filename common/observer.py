@@ -0,0 +1,191 @@
+import os
+import threading
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import IO, Any, Callable, Iterator, NamedTuple
+
+from PIL.Image import Image
+
+
+class StageEvent(NamedTuple):
+    stage: str
+    duration: float
+    pixels: int
+    frames: int
+    bytes_written: int
+    memory_peak: int | None  # only while tracemalloc is tracing
+
+
+Observer = Callable[[StageEvent], None]
+
+_observers: list[Observer] = []
+_local = threading.local()
+
+
+def add_observer(observer: Observer) -> None:
+    _observers.append(observer)
+
+
+def remove_observer(observer: Observer) -> None:
+    _observers.remove(observer)
+
+
+@contextmanager
+def observing(observer: Observer) -> Iterator[Observer]:
+    add_observer(observer)
+    try:
+        yield observer
+    finally:
+        remove_observer(observer)
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        image: Image | None = None,
+        frames: int = 1,
+        output: Any = None,
+    ) -> None:
+        self.name = name
+        self.pixels = image.width * image.height if image is not None else 0
+        self.frames = frames
+        self.bytes_written = 0
+        self._output = output
+        self._memory_peak = 0
+
+    def __enter__(self) -> "Stage":
+        stack = _get_stack()
+        if tracemalloc.is_tracing():
+            # The peak is global, fold it into the outer stage before a reset
+            if stack:
+                stack[-1]._fold_memory_peak(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+
+        self._output_start = _get_output_position(self._output)
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        duration = perf_counter() - self._start
+        stack = _get_stack()
+        stack.pop()
+
+        memory_peak = None
+        if tracemalloc.is_tracing():
+            self._fold_memory_peak(tracemalloc.get_traced_memory()[1])
+            memory_peak = self._memory_peak
+            if stack:
+                stack[-1]._fold_memory_peak(memory_peak)
+
+        if self._output is not None:
+            self.bytes_written = _get_output_position(self._output) - self._output_start
+
+        event = StageEvent(
+            self.name,
+            duration,
+            self.pixels,
+            self.frames,
+            self.bytes_written,
+            memory_peak,
+        )
+        for observer in list(_observers):
+            observer(event)
+
+    def _fold_memory_peak(self, memory_peak: int) -> None:
+        self._memory_peak = max(self._memory_peak, memory_peak)
+
+
+class _NullStage:
+    # Shared by every stage while nothing observes, attributes set are ignored
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(
+    name: str, image: Image | None = None, frames: int = 1, output: Any = None
+) -> Stage | _NullStage:
+    if not _observers:
+        return _NULL_STAGE
+    return Stage(name, image, frames, output)
+
+
+def _get_stack() -> list[Stage]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _get_output_position(output: str | IO[bytes] | None) -> int:
+    if output is None:
+        return 0
+    if isinstance(output, (str, bytes, os.PathLike)):
+        return os.path.getsize(output) if os.path.exists(output) else 0
+    try:
+        return output.tell()
+    except (AttributeError, OSError):
+        return 0
+
+
+class HistogramExporter:
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self._buckets = sorted(buckets)
+        self._histograms: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: StageEvent) -> None:
+        with self._lock:
+            histogram = self._histograms.get(event.stage)
+            if histogram is None:
+                histogram = self._histograms[event.stage] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "counts": [0] * (len(self._buckets) + 1),
+                    "pixels": 0,
+                    "frames": 0,
+                    "bytes_written": 0,
+                    "memory_peak": None,
+                }
+
+            histogram["count"] += 1
+            histogram["sum"] += event.duration
+            histogram["counts"][bisect_left(self._buckets, event.duration)] += 1
+            histogram["pixels"] += event.pixels
+            histogram["frames"] += event.frames
+            histogram["bytes_written"] += event.bytes_written
+            if event.memory_peak is not None:
+                histogram["memory_peak"] = max(
+                    histogram["memory_peak"] or 0, event.memory_peak
+                )
+
+    def get_histograms(self) -> dict[str, dict[str, Any]]:
+        # Buckets are cumulative and keyed by upper bound, like Prometheus
+        with self._lock:
+            histograms = {}
+
+            for name, histogram in self._histograms.items():
+                bounds = [*map(str, self._buckets), "+Inf"]
+                cumulative, buckets = 0, {}
+                for bound, count in zip(bounds, histogram["counts"]):
+                    cumulative += count
+                    buckets[bound] = cumulative
+
+                histograms[name] = {
+                    key: value for key, value in histogram.items() if key != "counts"
+                }
+                histograms[name]["buckets"] = buckets
+            return histograms
@@ -2,41 +2,103 @@ from io import BytesIO
 
 from PIL import Image
 
-from color import cluster, palette
+from color import cache, cluster, palette
+from color.utils import get_ranking_divergence
 from example_settings import SAVE_OPTIONS, SUPPORTED_IMAGES
+from image import derivative
 from image.category import CategoryProxy
-from image.utils import bulk_resize
+from image.editor import LazyStaticEditor
+from image.profile import IStaticProfile
+from image.utils import bulk_resize, draft_to_pixel_budget
+
+
+def get_palette(image_name, pixel_budget=None, top_n=None, palette_cache=None):
+    if top_n is not None and top_n < 1:
+        raise ValueError(f"top_n must be at least 1, got {top_n}.")
+
+    # The key comes from the file bytes, so a hit skips decoding entirely
+    if palette_cache is not None:
+        key = cache.get_cache_key(
+            cache.get_file_digest(image_name),
+            cluster.SortedColorCluster,
+            palette.HexRGB,
+            False,
+            pixel_budget,
+        )
+        sorted_palette = palette_cache.get(key)
+
+        if sorted_palette is None:
+            _, sorted_palette = get_palette(image_name, pixel_budget)
+            palette_cache.set(key, sorted_palette)
 
+        sorted_palette = sorted_palette[:top_n]
+        return (sorted_palette[0], sorted_palette)
 
-def get_palette(image_name):
     with Image.open(image_name) as image:
+        if pixel_budget:
+            draft_to_pixel_budget(image, pixel_budget)
+
         category = CategoryProxy(image, SUPPORTED_IMAGES)
         profile = category.get_profile()
 
         if not profile:
             raise Exception(f"Unsupported image type: {image.format}/{image.mode}.")
 
-        cc_image = profile.get_color_clustering_image()
+        cc_image = profile.get_color_clustering_image(pixel_budget)
         color = palette.HexRGB(cc_image, alpha=False)
         color_cluster = cluster.SortedColorCluster(color)
 
-        sorted_palette = color_cluster.get_palette()
+        sorted_palette = color_cluster.get_palette(top_n)
         dominant_color = sorted_palette[0]
         return (dominant_color, sorted_palette)
 
 
-def resize(image_name):
-    def _resize_helper(editor):
-        return bulk_resize(
-            editor,
-            [
-                {
-                    "resize": {"size": size, "resample": 1, "reducing_gap": 3},
-                    "save": {"format": "JPEG", "optimize": True, "quality": 75},
-                }
-                for size in [(256, 256), (128, 128)]
-            ],
+def get_palette_divergence(image_name, pixel_budget, top_n=10):
+    # How far the budgeted ranking drifts from the full-resolution one,
+    # 0 when they match and 1 when they share no color
+    _, reference_palette = get_palette(image_name, top_n=top_n)
+    _, budget_palette = get_palette(image_name, pixel_budget, top_n)
+    return get_ranking_divergence(budget_palette, reference_palette, top_n)
+
+
+def resize(image_name, derivative_store=None):
+    resize_save_options = [
+        {
+            "resize": {"size": size, "resample": 1, "reducing_gap": 3},
+            "save": {"format": "JPEG", "optimize": True, "quality": 75},
+        }
+        for size in [(256, 256), (128, 128)]
+    ]
+
+    # Derivatives are keyed by the source bytes, a hit doesn't open the image.
+    # An animation is resized from its optimized image, so the optimize options
+    # are part of the key too
+    source_digest = None
+    options_digest = derivative.get_options_digest({"optimize": SAVE_OPTIONS})
+    if derivative_store is not None:
+        source_digest = cache.get_file_digest(image_name)
+        cached = derivative.get_cached(
+            derivative_store,
+            derivative.get_resize_keys(
+                resize_save_options, source_digest, options_digest, cascade=True
+            ),
         )
+        if cached is not None:
+            return cached
+
+    def _resize_helper(editor):
+        # Every size is saved as a JPEG, so an animation with alpha drops it too
+        editor.convert_mode("RGB")
+        if derivative_store is not None:
+            return derivative.bulk_resize(
+                editor,
+                resize_save_options,
+                source_digest,
+                derivative_store,
+                options_digest,
+                cascade=True,
+            )
+        return bulk_resize(editor, resize_save_options, cascade=True)
 
     original_img = Image.open(image_name)
     category = CategoryProxy(original_img, SUPPORTED_IMAGES)
@@ -47,12 +109,27 @@ def resize(image_name):
             f"Unsupported image type: {original_img.format}/{original_img.mode}."
         )
 
+    # Static images are converted and resized in one pass, skipping the
+    # encode/decode of the optimized image (every size is saved as a JPEG)
+    if isinstance(profile, IStaticProfile):
+        lazy_editor = LazyStaticEditor(original_img)
+
+        resized_gen = _resize_helper(lazy_editor)
+        resized = [next(resized_gen), next(resized_gen)]
+        original_img.close()
+        return resized
+
     editor = profile.get_editor()
 
     # Avoid format-related problems by resizing the optimized image
     if not profile.is_optimized():
         output = BytesIO()
-        profile.optimize(output, SAVE_OPTIONS)  # type: ignore
+        if derivative_store is not None:
+            derivative.optimize(
+                profile, output, SAVE_OPTIONS, source_digest, derivative_store
+            )
+        else:
+            profile.optimize(output, SAVE_OPTIONS)  # type: ignore
 
         original_img.close()
 
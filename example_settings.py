@@ -7,13 +7,31 @@ GIF_SAVE_OPTIONS = {
     "disposal": 2,
     "background": (0, 0, 0, 0),
     "save_all": True,
+    # One palette for all frames, "fastoctree", "mediancut" or "libimagequant"
+    # (if Pillow has it), None to let Pillow quantize each frame. A streamed
+    # save (stream=True) builds it from its first sample_frames frames only
+    "quantize": {"method": "fastoctree", "dither": False},
 }
 JPEG_SAVE_OPTIONS = {"format": "JPEG", "optimize": True, "quality": 75}
 PNG_SAVE_OPTIONS = {"format": "PNG", "optimize": True}
+WEBP_SAVE_OPTIONS = {
+    "format": "WEBP",
+    "save_all": True,
+    "lossless": False,
+    "quality": 80,
+    "method": 4,
+}
+# "GIF", "WEBP" or "SMALLEST" of both (GIF only if the time budget allows)
+ANIMATED_OUTPUT_OPTIONS = {"policy": "WEBP", "time_budget": 5.0}
+# Bytes of pixels a static optimize may hold, None for no limit
+MEMORY_OPTIONS = {"budget": None}
 SAVE_OPTIONS = {
     "GIF": GIF_SAVE_OPTIONS,
     "JPEG": JPEG_SAVE_OPTIONS,
     "PNG": PNG_SAVE_OPTIONS,
+    "WEBP": WEBP_SAVE_OPTIONS,
+    "ANIMATED": ANIMATED_OUTPUT_OPTIONS,
+    "MEMORY": MEMORY_OPTIONS,
 }
 
 STATIC_SUPPORTED_IMAGES = [
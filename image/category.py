@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 
 from PIL.Image import Image
 
+from image.probe import ImageProbe, get_probe
+
 from image.profile import (
     IOptimizableStaticProfile,
     IStaticProfile,
@@ -41,11 +43,13 @@ class CategoryProxy(ICategory):
     _category: ICategory
     _profile: Profile | None
 
+    def __init__(self, image: Image, supported_images: SupportedImages):
+        super().__init__(image, supported_images)
+        # Profiles and editors share the facts computed by the probe
+        self._probe: ImageProbe = get_probe(image)
+
     def _determine_category(self) -> ICategory:
-        if (
-            getattr(self._image, "is_animated", False) is False
-            and self._image.format != "GIF"
-        ):
+        if self._probe.is_animated is False and self._image.format != "GIF":
             return StaticCategory(self._image, self._supported_images)
         else:
             return AnimatedCategory(self._image, self._supported_images)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+from collections import OrderedDict
+from hashlib import blake2b
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import IO, TYPE_CHECKING, Any, Generator
+
+from image import utils
+
+if TYPE_CHECKING:
+    from image.editor import File, IEditor
+
+
+_TEMP_PREFIX = ".tmp-"
+
+
+def get_options_digest(options: Any) -> str:
+    # Sorted keys, so equal dicts hash the same whatever their order
+    canonical = json.dumps(options, sort_keys=True, separators=(",", ":"), default=repr)
+    return blake2b(canonical.encode(), digest_size=20).hexdigest()
+
+
+def get_derivative_key(source_digest: str, profile_name: str, options: Any) -> str:
+    return get_options_digest([source_digest, profile_name, options])
+
+
+class DerivativeStore:
+    # max_size is kept per store, from the files there when it was created and
+    # the ones it wrote since, other processes writing to the directory aren't
+    # counted until a store is created again
+    def __init__(self, directory: str, max_size: int = 1 << 30) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sizes
+
+    def get(self, key: str) -> IO[bytes] | None:
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            try:
+                file = open(self._get_path(key), "rb")
+            except FileNotFoundError:
+                # Evicted by another process sharing the directory
+                self._forget(key)
+                return None
+
+            self._sizes.move_to_end(key)
+            # The mtime keeps the LRU order for the next store on this directory
+            os.utime(file.fileno())
+            return file
+
+    def set(self, key: str, data: bytes | memoryview) -> None:
+        # Written aside and renamed, so readers never see a partial file
+        with NamedTemporaryFile(
+            dir=self.directory, prefix=_TEMP_PREFIX, delete=False
+        ) as file:
+            try:
+                file.write(data)
+            except BaseException:
+                os.remove(file.name)
+                raise
+        os.replace(file.name, self._get_path(key))
+
+        with self._lock:
+            self._forget(key)
+            self._sizes[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._sizes):
+                self._remove(key)
+
+    def _load(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(_TEMP_PREFIX):
+                # Left behind by a write that didn't finish
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._size += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and self._sizes:
+            self._remove(next(iter(self._sizes)))
+
+    def _remove(self, key: str) -> None:
+        self._forget(key)
+        try:
+            os.remove(self._get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _forget(self, key: str) -> None:
+        self._size -= self._sizes.pop(key, 0)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+
+def optimize(
+    profile: Any,
+    output: File,
+    save_options: dict[str, dict],
+    source_digest: str,
+    store: DerivativeStore,
+) -> None:
+    key = get_derivative_key(source_digest, profile.name, {"optimize": save_options})
+    cached = store.get(key)
+
+    if cached is None:
+        buffer = BytesIO()
+        profile.optimize(buffer, save_options)
+        store.set(key, buffer.getbuffer())
+        utils.write_output(output, buffer.getbuffer())
+        return
+
+    with cached:
+        _copy_output(cached, output)
+
+
+def get_resize_keys(
+    resize_save_options: list[dict],
+    source_digest: str,
+    profile_name: str = "",
+    cascade: bool = False,
+    cascade_min_scale: float = 2.0,
+) -> list[str]:
+    # Cascading changes the pixels, so it's part of the key
+    return [
+        get_derivative_key(
+            source_digest,
+            profile_name,
+            {
+                "resize": options["resize"],
+                "save": options["save"],
+                "cascade": cascade_min_scale if cascade else None,
+            },
+        )
+        for options in resize_save_options
+    ]
+
+
+def get_cached(store: DerivativeStore, keys: list[str]) -> list[IO[bytes]] | None:
+    # Hits are only served when the whole ladder is there, a partial one is
+    # redone since a cascade derives each size from the one before
+    cached = []
+    for key in keys:
+        file = store.get(key)
+        if file is None:
+            for file in cached:
+                file.close()
+            return None
+        cached.append(file)
+    return cached
+
+
+def bulk_resize(
+    editor: IEditor,
+    resize_save_options: list[dict],
+    source_digest: str,
+    store: DerivativeStore,
+    profile_name: str = "",
+    cascade: bool = False,
+    cascade_min_scale: float = 2.0,
+    single_pass: bool = False,
+) -> Generator[IO[bytes]]:
+    keys = get_resize_keys(
+        resize_save_options, source_digest, profile_name, cascade, cascade_min_scale
+    )
+    cached = get_cached(store, keys)
+
+    if cached is not None:
+        try:
+            while cached:
+                yield cached.pop(0)
+        finally:
+            # The ones not yielded yet if the caller stopped early
+            for file in cached:
+                file.close()
+        return
+
+    resized = utils.bulk_resize(
+        editor, resize_save_options, cascade, cascade_min_scale, single_pass
+    )
+    for key, output in zip(keys, resized):
+        store.set(key, output.getbuffer())
+        output.seek(0)
+        yield output
+
+
+def _copy_output(file: IO[bytes], output: File) -> None:
+    if hasattr(output, "write"):
+        shutil.copyfileobj(file, output)  # type: ignore
+        return
+
+    with open(output, "wb") as output_file:  # type: ignore
+        shutil.copyfileobj(file, output_file)
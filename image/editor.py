@@ -1,16 +1,31 @@
-from typing import Any, Literal, IO, Iterator
+from typing import Any, Callable, Literal, IO, Iterator
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Executor, Future
+from math import ceil
 
 from PIL._typing import StrOrBytesPath
 from PIL.Image import Image, Resampling
-from PIL import ImageSequence
-
-from image import utils
+from PIL import ImageMode, ImageSequence
 
+from common import observer
+from image import frames as frame_utils
+from image import quality, quantize, utils
+from image.probe import get_probe
 
 Resample = Resampling | Literal[0, 1, 2, 3, 4, 5] | None
 File = StrOrBytesPath | IO[bytes]
 
+# Decoded at least this many times the target size when resizing doesn't set
+# a reducing_gap, like Image.thumbnail
+DEFAULT_DECODE_GAP = 2.0
+
+_DRAFT_FORMATS = ("JPEG", "MPO")
+
+
+class MemoryBudgetError(Exception):
+    pass
+
 
 class IEditor(ABC):
     @property
@@ -24,7 +39,11 @@ class IEditor(ABC):
 
     @abstractmethod
     def resize(
-        self, size: tuple[int, int], resample: Resample, reducing_gap: int
+        self,
+        size: tuple[int, int],
+        resample: Resample,
+        reducing_gap: int,
+        cascade: bool = False,
     ) -> None:
         pass
 
@@ -32,33 +51,262 @@ class IEditor(ABC):
     def save(self, output: File, format: str, **extra_options: Any) -> None:
         pass
 
+    def can_cascade(self, size: tuple[int, int], min_scale: float) -> bool:
+        return False
+
+    def reset_cascade(self) -> None:
+        # Forgets the last resized image, so no later resize cascades from it
+        pass
+
+    def plan_decode(self, size: tuple[int, int], reducing_gap: float | None) -> None:
+        # Announces a size it will be resized to, before the 1st resize decodes.
+        # A JPEG is drafted in place, so it's only planned while nothing else
+        # has loaded the image, later the decode is already done at full size
+        pass
+
+    def bulk_save(self, outputs: list[File], resize_save_options: list[dict]) -> None:
+        for output, options in zip(outputs, resize_save_options):
+            self.resize(**options["resize"])
+            self.save(output, **options["save"])
+
 
 class StaticEditor(IEditor):
     def __init__(self, image: Image) -> None:
         self._original_image = self._processed_image = image
+        self._resized_image: Image | None = None
+        self._decoded: bool = False
+        self._memory_budget: int | None = None
+        self._decode_size: tuple[int, int] | None = None
 
     @property
     def actual_mode(self) -> str:
         return self._original_image.mode
 
+    def set_memory_budget(self, memory_budget: int | None) -> None:
+        # Bytes of pixels held at once, the decoded original included
+        self._memory_budget = memory_budget
+
+    def plan_decode(self, size: tuple[int, int], reducing_gap: float | None) -> None:
+        # The largest planned size wins, so no later size is upscaled
+        gap = reducing_gap or DEFAULT_DECODE_GAP
+        width, height = ceil(size[0] * gap), ceil(size[1] * gap)
+        if self._decode_size is not None:
+            width = max(width, self._decode_size[0])
+            height = max(height, self._decode_size[1])
+        self._decode_size = (width, height)
+
     def convert_mode(self, mode: str) -> None:
-        self._processed_image = self._original_image.convert(mode=mode)
+        # The full size is needed, so no smaller decode
+        self._decode_size = None
+        self._resized_image = None
+        image = self._get_original_image()
+        if self._memory_budget is not None:
+            self._reserve_memory(image, utils.get_mode_bytes(mode, image.size))
+        self._processed_image = _convert(image, mode)
 
     def resize(
-        self, size: tuple[int, int], resample: Resample, reducing_gap: int
+        self,
+        size: tuple[int, int],
+        resample: Resample,
+        reducing_gap: int,
+        cascade: bool = False,
     ) -> None:
-        self._processed_image = self._original_image.resize(
-            size=size, resample=resample, reducing_gap=reducing_gap
+        # Cascading derives the new size from the last resized image instead
+        image = (self._resized_image if cascade else None) or (
+            self._get_original_image()
+        )
+        self._processed_image = self._resized_image = (
+            _resize(image, size=size, resample=resample, reducing_gap=reducing_gap)
+            if self._memory_budget is None
+            else self._resize_in_strips(image, size, resample)
         )
 
+    def can_cascade(self, size: tuple[int, int], min_scale: float) -> bool:
+        if self._resized_image is None:
+            return False
+
+        width, height = self._resized_image.size
+        return width >= size[0] * min_scale and height >= size[1] * min_scale
+
+    def reset_cascade(self) -> None:
+        self._resized_image = None
+
+    def save(self, output: File, format: str, **extra_options: Any) -> None:
+        if self._processed_image is self._original_image:
+            self._get_original_image()
+        _encode(self._processed_image, output, format=format, **extra_options)
+
+    def _get_original_image(self) -> Image:
+        # Decoded once up front, so the other stages don't include it
+        if not self._decoded:
+            self._draft()
+            _decode(self._original_image)
+            self._decoded = True
+        return self._original_image
+
+    def _draft(self) -> None:
+        # A JPEG can be decoded once at a reduced DCT scale, the largest one that
+        # keeps the planned size. Over a memory budget, the smallest one that
+        # leaves half of it to the working copies, even if that's smaller
+        image = self._original_image
+
+        if image.format in _DRAFT_FORMATS:
+            scale = 1
+            if self._decode_size is not None:
+                scale = utils.get_draft_scale(image.size, self._decode_size)
+            if self._memory_budget is not None:
+                scale = max(
+                    scale,
+                    utils.get_memory_budget_scale(
+                        image.mode, image.size, self._memory_budget // 2
+                    ),
+                )
+            utils.draft_to_scale(image, scale)
+
+        if self._memory_budget is None:
+            return
+
+        memory_budget = self._memory_budget
+        image_bytes = utils.get_mode_bytes(image.mode, image.size)
+        if image_bytes > memory_budget:
+            raise MemoryBudgetError(
+                f"Decoding {image.width}x{image.height} {image.mode} needs"
+                f" {image_bytes} bytes, over the {memory_budget} bytes budget."
+            )
+
+    def _reserve_memory(self, image: Image, output_bytes: int) -> int:
+        # Earlier results are released first, the memory left is returned
+        memory_budget: int = self._memory_budget  # type: ignore
+        self._processed_image = self._original_image
+        if self._resized_image is not image:
+            self._resized_image = None
+
+        held = output_bytes + utils.get_mode_bytes(
+            self._original_image.mode, self._original_image.size
+        )
+        if image is not self._original_image:
+            held += utils.get_mode_bytes(image.mode, image.size)
+        if held > memory_budget:
+            raise MemoryBudgetError(
+                f"{held} bytes of pixels are over the {memory_budget} bytes budget."
+            )
+        return memory_budget - held
+
+    def _resize_in_strips(
+        self,
+        image: Image,
+        size: tuple[int, int],
+        resample: Resample,
+        mode: str | None = None,
+    ) -> Image:
+        # The full size intermediates of convert and resize are never made,
+        # reducing_gap is left out since the strips are already bounded
+        output_bytes = utils.get_mode_bytes(mode or image.mode, size)
+        strip_bytes = self._reserve_memory(image, output_bytes)
+        strip_rows = utils.get_strip_rows(image, size, resample, mode, strip_bytes)
+
+        if not strip_rows:
+            raise MemoryBudgetError(
+                f"Resizing {image.width}x{image.height} to {size[0]}x{size[1]}"
+                f" doesn't fit in the {self._memory_budget} bytes budget."
+            )
+        with observer.stage("resize", image):
+            return utils.resize_in_strips(image, size, resample, mode, strip_rows)
+
+
+class LazyStaticEditor(StaticEditor):
+    # Resizing these modes first would drop to NEAREST or lose precision
+    _RESIZE_FIRST_MODES = {"RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "LAB", "HSV"}
+
+    def __init__(self, image: Image) -> None:
+        super().__init__(image)
+        self._mode: str | None = None
+        self._resize_options: dict[str, Any] | None = None
+        self._cascade: bool = False
+        self._planned_image: Image | None = None
+
+    def convert_mode(self, mode: str) -> None:
+        self._mode = mode
+        self._planned_image = None
+        self._resized_image = None
+
+    def resize(
+        self,
+        size: tuple[int, int],
+        resample: Resample,
+        reducing_gap: int,
+        cascade: bool = False,
+    ) -> None:
+        self._resize_options = {
+            "size": size,
+            "resample": resample,
+            "reducing_gap": reducing_gap,
+        }
+        self._cascade = cascade
+        self._planned_image = None
+
     def save(self, output: File, format: str, **extra_options: Any) -> None:
-        self._processed_image.save(output, format=format, **extra_options)
+        if self._planned_image is None:
+            self._planned_image = self._run_plan()
+        _encode(self._planned_image, output, format=format, **extra_options)
+
+    def _run_plan(self) -> Image:
+        image = (self._cascade and self._resized_image) or self._get_original_image()
+        mode = self._mode if self._mode != image.mode else None
+
+        if not self._resize_options:
+            if mode and self._memory_budget is not None:
+                self._reserve_memory(image, utils.get_mode_bytes(mode, image.size))
+            return _convert(image, mode) if mode else image
+
+        if self._memory_budget is not None:
+            image = self._resize_in_strips(
+                image,
+                self._resize_options["size"],
+                self._resize_options["resample"],
+                mode,
+            )
+        elif mode and self._resize_first(image, mode):
+            image = _convert(_resize(image, **self._resize_options), mode)
+        else:
+            image = _resize(
+                _convert(image, mode) if mode else image, **self._resize_options
+            )
+        self._resized_image = image
+        return image
+
+    def _resize_first(self, image: Image, mode: str) -> bool:
+        # Converting fewer pixels is cheaper, if the modes resample the same.
+        # Resizing premultiplies alpha, which blackens the transparent pixels,
+        # so an alpha the conversion drops has to be dropped first
+        width, height = self._resize_options["size"]  # type: ignore
+        return (
+            width * height < image.width * image.height
+            and image.mode in self._RESIZE_FIRST_MODES
+            and mode in self._RESIZE_FIRST_MODES
+            and (
+                "A" not in ImageMode.getmode(image.mode).bands
+                or "A" in ImageMode.getmode(mode).bands
+            )
+        )
 
 
 class AnimatedEditor(IEditor):
+    # peak_held_bytes is the most frame pixels held at once, every frame when
+    # the encoder needs them all, one at a time when they're streamed
+    save_stats: dict[str, int]
+
     def __init__(self, image: Image) -> None:
         self._original_image: Image = image
-        self._processed_frames: Iterator = self._get_frames()
+        self._dedupe_threshold: float | None = None
+        self._max_fps: float | None = None
+        self._executor: Executor | None = None
+        self._window: int = 1
+        self._mode: str | None = None
+        # Copies, a multi-frame image saves all its frames if appended itself
+        self._processed_frames: Iterator = (
+            frame.copy() for frame in self._get_frames()
+        )
         self._actual_mode: str = self._find_actual_mode()
 
     @property
@@ -66,47 +314,339 @@ class AnimatedEditor(IEditor):
         return self._actual_mode
 
     def convert_mode(self, mode: str) -> None:
-        self._processed_frames = (
-            frame.convert(mode=mode) if frame.mode != self.actual_mode else frame.copy()
-            for frame in self._get_frames()
+        # Kept for the resizes after it, which convert the frames themselves
+        self._mode = mode
+        self._processed_frames = self._map_frames(
+            lambda frame: (
+                _convert(frame, mode)
+                if frame.mode != self.actual_mode
+                else frame.copy()
+            )
         )
 
+    def limit_frames(
+        self, dedupe_threshold: float | None = None, max_fps: float | None = None
+    ) -> None:
+        # Applies to the source frames, before any of them is converted or resized
+        self._dedupe_threshold = dedupe_threshold
+        self._max_fps = max_fps
+
+    def parallel_frames(
+        self, executor: Executor | None = None, window: int | None = None
+    ) -> None:
+        # Frames are still decoded in order on this thread, converting and
+        # resizing them runs on the executor, at most window frames ahead
+        self._executor = executor or frame_utils.get_default_executor()
+        self._window = window or frame_utils.get_default_window()
+
     def resize(
-        self, size: tuple[int, int], resample: Resample, reducing_gap: int
+        self,
+        size: tuple[int, int],
+        resample: Resample,
+        reducing_gap: int,
+        cascade: bool = False,
     ) -> None:
+        # Frames aren't kept between sizes, so they never cascade
         resize_options = {
             "size": size,
             "resample": resample,
             "reducing_gap": reducing_gap,
         }
-        self._processed_frames = (
-            (
-                frame.convert(self.actual_mode).resize(**resize_options)
-                if frame.mode != self.actual_mode
-                else frame.resize(**resize_options)
-            )
-            for frame in self._get_frames()
-        )
 
-    def save(self, output: File, format: str, **extra_options: Any) -> None:
-        first_frame = next(self._processed_frames)
+        mode = self._mode or self.actual_mode
+
+        def resize_frame(frame: Image) -> Image:
+            if frame.mode != mode:
+                with observer.stage("convert", frame):
+                    frame = frame.convert(mode)
+            return _resize(frame, **resize_options)
+
+        self._processed_frames = self._map_frames(resize_frame)
+
+    def save(
+        self,
+        output: File,
+        format: str,
+        stream: bool = False,
+        max_fps: float | None = None,
+        **extra_options: Any,
+    ) -> None:
+        if max_fps:
+            # _get_frames reads it on the 1st frame, so the frames it drops
+            # are never converted or resized
+            self._max_fps = min(max_fps, self._max_fps or max_fps)
+
+        self._save(output, format, stream, **extra_options)
+
+    def _save(
+        self, output: File, format: str, stream: bool, **extra_options: Any
+    ) -> None:
+        # Only GIF can be written frame by frame, other formats buffer them all
+        if stream and format.upper() == "GIF" and "save_all" in extra_options:
+            # Frames are processed as they're written, so this stage includes
+            # their own stages
+            with observer.stage("encode", self._original_image, output=output) as stage:
+                self.save_stats = utils.save_gif_stream(
+                    output, self._processed_frames, **extra_options
+                )
+                stage.frames = self.save_stats["frames"]
+            del self._processed_frames
+            return
+
+        quantize_options = extra_options.pop("quantize", None)
+        frames = [next(self._processed_frames)]
 
         # Prepare to save all frames (to save as an animated image)
         if "save_all" in extra_options:
-            extra_options.update(append_images=list(self._processed_frames))
+            frames.extend(self._processed_frames)
+        held_bytes = sum(map(utils.get_image_bytes, frames))
+        if quantize_options is not None and format.upper() == "GIF":
+            # The processed frames are still held while they're quantized
+            frames = quantize.quantize_frames(frames, **quantize_options)
+            held_bytes += sum(map(utils.get_image_bytes, frames))
+        first_frame = frames[0]
+        if "save_all" in extra_options:
+            extra_options.update(append_images=frames[1:])
+            _set_frame_durations(frames, format, extra_options)
 
         # Delete all the extra frames (to save as a static image)
         del self._processed_frames
 
-        first_frame.save(output, format=format, **extra_options)
+        self.save_stats = {"frames": len(frames), "peak_held_bytes": held_bytes}
+        extra_options = quality.resolve_save_options(
+            first_frame, {"format": format, **extra_options}
+        )
+        # Only the encoder, the frames were processed and quantized before
+        with observer.stage("encode", first_frame, len(frames), output):
+            first_frame.save(output, **extra_options)
+
+    def bulk_save(self, outputs: list[File], resize_save_options: list[dict]) -> None:
+        targets = [
+            _FrameTarget(output, window=self._window, **options["save"])
+            for output, options in zip(outputs, resize_save_options)
+        ]
+
+        # Decode and convert every frame once, then fan it out to all sizes.
+        # Targets are saved once they need no more frames, so a static one
+        # doesn't hold its frame until the animated ones are done
+        open_targets = list(zip(targets, resize_save_options))
+        stats: list[dict[str, int]] = []
+        mode = self._mode or self.actual_mode
+        for frame in self._get_frames():
+            if not open_targets:
+                break
+            duration = frame_utils.get_duration(frame)
+
+            # Frames over a target's frame rate are never resized for it
+            frame_targets = [
+                (target, options["resize"])
+                for target, options in open_targets
+                if target.starts_frame(duration)
+            ]
+            if not frame_targets:
+                continue
+
+            futures: list[Future] = [Future() for _ in frame_targets]
+            resize_options = [options for _, options in frame_targets]
+            if self._executor is None:
+                _resize_frame(frame, mode, resize_options, futures)
+            else:
+                # The sequence reuses one image for every frame
+                self._executor.submit(
+                    _resize_frame,
+                    frame.copy(),
+                    mode,
+                    resize_options,
+                    futures,
+                )
+            for (target, _), future in zip(frame_targets, futures):
+                target.add(future)
+
+            for item in [item for item in open_targets if not item[0].needs_frames]:
+                stats.append(item[0].close())
+                open_targets.remove(item)
+
+        stats.extend(target.close() for target, _ in open_targets)
+        self.save_stats = {
+            "frames": max(
+                (target_stats["frames"] for target_stats in stats), default=0
+            ),
+            "peak_held_bytes": sum(
+                target_stats["peak_held_bytes"] for target_stats in stats
+            ),
+        }
 
     def _find_actual_mode(self) -> str:
+        image_probe = get_probe(self._original_image)
+
         if self._original_image.mode == "RGBA":
-            return (
-                "RGBA" if utils.has_translucent_alpha(self._original_image) else "RGB"
+            return "RGBA" if image_probe.has_translucent_alpha else "RGB"
+        return "RGB" if not image_probe.has_transparency else "RGBA"
+
+    def _get_frames(self) -> Iterator[Image]:
+        frames: Iterator[Image] = self._decode_frames()
+
+        # Limits are read on the 1st frame, so they also apply to the pipelines
+        # set up before limit_frames was called
+        if self._dedupe_threshold is not None or self._max_fps:
+            # Merged frames get a new duration, so they can't share the sequence
+            frames = (frame.copy() for frame in frames)
+        if self._dedupe_threshold is not None:
+            frames = frame_utils.dedupe_frames(frames, self._dedupe_threshold)
+        if self._max_fps:
+            frames = frame_utils.cap_frame_rate(frames, self._max_fps)
+        yield from frames
+
+    def _map_frames(self, process: Callable[[Image], Image]) -> Iterator[Image]:
+        frames = self._get_frames()
+        if self._executor is None:
+            yield from map(process, frames)
+            return
+
+        # The sequence reuses one image for every frame, unless limits copied them
+        if self._dedupe_threshold is None and not self._max_fps:
+            frames = (frame.copy() for frame in frames)
+        yield from frame_utils.map_ordered(
+            process, frames, self._executor, self._window
+        )
+
+    def _decode_frames(self) -> Iterator[Image]:
+        for frame in ImageSequence.Iterator(self._original_image):
+            _decode(frame)
+            yield frame
+
+
+class _FrameTarget:
+    def __init__(
+        self,
+        output: File,
+        format: str,
+        stream: bool = False,
+        max_fps: float | None = None,
+        window: int = 1,
+        **extra_options: Any,
+    ) -> None:
+        self._output = output
+        self._format = format
+        self._quantize_options = (
+            extra_options.pop("quantize", None) if format.upper() == "GIF" else None
+        )
+        self._extra_options = extra_options
+        self._animated = "save_all" in extra_options
+        self._frames: list[Image] = []
+        # Frames being resized and the duration merged into each, the last one
+        # is held back until the next frame starts
+        self._pending: deque[list] = deque()
+        self._window = window
+        self._frame_rate_cap = frame_utils.FrameRateCap(max_fps)
+        self._writer = (
+            utils.GifStreamWriter(output, self._quantize_options, **extra_options)
+            if stream and format.upper() == "GIF" and self._animated
+            else None
+        )
+
+    @property
+    def needs_frames(self) -> bool:
+        # A static output only needs the 1st frame
+        return self._animated or (not self._frames and not self._pending)
+
+    def starts_frame(self, duration: int) -> bool:
+        if self._frame_rate_cap.starts_frame(duration):
+            return True
+
+        self._pending[-1][1] += duration
+        return False
+
+    def add(self, frame: "Future[Image]") -> None:
+        self._pending.append([frame, 0])
+        while len(self._pending) > max(1, self._window):
+            self._flush()
+
+    def close(self) -> dict[str, int]:
+        while self._pending:
+            self._flush()
+        if self._writer:
+            return self._writer.close()
+        if not self._frames:
+            raise ValueError(f"No frames were added to the {self._format} output.")
+
+        held_bytes = sum(map(utils.get_image_bytes, self._frames))
+        if self._quantize_options is not None:
+            # The processed frames are still held while they're quantized
+            self._frames = quantize.quantize_frames(
+                self._frames, **self._quantize_options
             )
-        has_transparency = "transparency" in self._original_image.info
-        return "RGB" if not has_transparency else "RGBA"
+            held_bytes += sum(map(utils.get_image_bytes, self._frames))
+        first_frame, *extra_frames = self._frames
+        if self._animated:
+            self._extra_options.update(append_images=extra_frames)
+            _set_frame_durations(self._frames, self._format, self._extra_options)
+        save_options = quality.resolve_save_options(
+            first_frame, {"format": self._format, **self._extra_options}
+        )
+        with observer.stage("encode", first_frame, len(self._frames), self._output):
+            first_frame.save(self._output, **save_options)
+
+        stats = {"frames": len(self._frames), "peak_held_bytes": held_bytes}
+        # Pillow's encoders take every frame at once, they're only released
+        # once saved
+        self._frames = []
+        self._extra_options.pop("append_images", None)
+        return stats
+
+    def _flush(self) -> None:
+        future, duration = self._pending.popleft()
+        frame = future.result()
+        if duration:
+            frame_utils.add_duration(frame, duration)
+
+        if self._writer:
+            with observer.stage("encode", frame, output=self._output):
+                self._writer.write(frame)
+        else:
+            self._frames.append(frame)
+
+
+def _resize_frame(
+    frame: Image, mode: str, resize_options: list[dict], futures: list[Future]
+) -> None:
+    # Converted once for all its sizes, each result goes to its own future
+    try:
+        if frame.mode != mode:
+            frame = _convert(frame, mode)
+        for options, future in zip(resize_options, futures):
+            future.set_result(_resize(frame, **options))
+    except BaseException as error:
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+
+def _decode(image: Image) -> None:
+    # Pillow decodes on first access, loading here times the decode on its own
+    with observer.stage("decode", image):
+        image.load()
+
+
+def _convert(image: Image, mode: str) -> Image:
+    with observer.stage("convert", image):
+        return image.convert(mode=mode)
+
+
+def _resize(image: Image, **resize_options: Any) -> Image:
+    with observer.stage("resize", image):
+        return image.resize(**resize_options)
+
+
+def _encode(image: Image, output: File, **save_options: Any) -> None:
+    save_options = quality.resolve_save_options(image, save_options)
+    with observer.stage("encode", image, output=output):
+        image.save(output, **save_options)
+
 
-    def _get_frames(self) -> ImageSequence.Iterator:
-        return ImageSequence.Iterator(self._original_image)
+def _set_frame_durations(
+    frames: list[Image], format: str, save_options: dict[str, Any]
+) -> None:
+    # GIF reads each frame's own duration, WebP only the 1st one's
+    if format.upper() == "WEBP" and "duration" not in save_options:
+        save_options["duration"] = [frame.info.get("duration", 0) for frame in frames]
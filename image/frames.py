@@ -0,0 +1,130 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from PIL import ImageChops, ImageStat
+from PIL.Image import Image, Resampling
+
+
+_Item = TypeVar("_Item")
+_Result = TypeVar("_Result")
+
+SIGNATURE_SIZE = (32, 32)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def get_duration(frame: Image) -> int:
+    return frame.info.get("duration", 0)
+
+
+def add_duration(frame: Image, duration: int) -> None:
+    frame.info["duration"] = get_duration(frame) + duration
+
+
+def get_signature(frame: Image) -> Image:
+    # Palette frames resize with NEAREST, so they're only sampled, not averaged.
+    # A GIF's 1st frame is P and the next ones RGB(A), so all get the same mode
+    signature = frame.resize(SIGNATURE_SIZE, Resampling.BOX)
+    return signature if signature.mode == "RGBA" else signature.convert("RGBA")
+
+
+def is_similar(signature: Image, other: Image, threshold: float) -> bool:
+    difference = ImageChops.difference(signature, other)
+    # The mean difference of the worst band, in 0-255 levels
+    return max(ImageStat.Stat(difference).mean) <= threshold
+
+
+def dedupe_frames(frames: Iterable[Image], threshold: float = 0.0) -> Iterator[Image]:
+    # Compared with the 1st frame of a run, so a slow fade still moves on
+    pending: Image | None = None
+    pending_signature: Image | None = None
+
+    for frame in frames:
+        signature = get_signature(frame)
+
+        if pending is not None and is_similar(
+            pending_signature, signature, threshold  # type: ignore
+        ):
+            add_duration(pending, get_duration(frame))
+            continue
+
+        if pending is not None:
+            yield pending
+        pending, pending_signature = frame, signature
+
+    if pending is not None:
+        yield pending
+
+
+class FrameRateCap:
+    def __init__(self, max_fps: float | None) -> None:
+        self._interval = 1000 / max_fps if max_fps else 0
+        self._duration: int | None = None
+
+    def starts_frame(self, duration: int) -> bool:
+        # False when the frame is merged into the one before it
+        if self._duration is not None and self._duration < self._interval:
+            self._duration += duration
+            return False
+
+        self._duration = duration
+        return True
+
+
+def cap_frame_rate(frames: Iterable[Image], max_fps: float) -> Iterator[Image]:
+    frame_rate_cap = FrameRateCap(max_fps)
+    pending: Image | None = None
+
+    for frame in frames:
+        duration = get_duration(frame)
+
+        if not frame_rate_cap.starts_frame(duration):
+            add_duration(pending, duration)  # type: ignore
+            continue
+
+        if pending is not None:
+            yield pending
+        pending = frame
+
+    if pending is not None:
+        yield pending
+
+
+def get_default_executor() -> ThreadPoolExecutor:
+    # Shared by every editor, Pillow releases the GIL in convert and resize
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(os.cpu_count(), thread_name_prefix="frames")
+        return _executor
+
+
+def get_default_window() -> int:
+    return 2 * (os.cpu_count() or 1)
+
+
+def map_ordered(
+    func: Callable[[_Item], _Result],
+    items: Iterable[_Item],
+    executor: Executor,
+    window: int,
+) -> Iterator[_Result]:
+    # Items are pulled in order on this thread, at most window of them are
+    # processed ahead of the one yielded
+    pending: deque[Future] = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # The consumer stopped early, e.g. a static output only takes 1 frame
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,46 @@
+from functools import cached_property
+from weakref import finalize, ref
+
+from PIL.Image import Image
+
+from image import utils
+
+
+class ImageProbe:
+    def __init__(self, image: Image) -> None:
+        # A strong reference would keep the image alive through _probes
+        self._image_ref = ref(image)
+
+    @property
+    def _image(self) -> Image:
+        return self._image_ref()  # type: ignore
+
+    @cached_property
+    def has_translucent_alpha(self) -> bool:
+        return utils.has_translucent_alpha(self._image)
+
+    @cached_property
+    def has_transparency(self) -> bool:
+        return "transparency" in self._image.info
+
+    @cached_property
+    def is_animated(self) -> bool:
+        # Pillow only seeks to the 2nd frame, unless n_frames is already known
+        return getattr(self._image, "is_animated", False)
+
+    @cached_property
+    def n_frames(self) -> int:
+        return getattr(self._image, "n_frames", 1)
+
+
+# Images aren't hashable, so probes are kept by id until the image is gone
+_probes: dict[int, ImageProbe] = {}
+
+
+def get_probe(image: Image) -> ImageProbe:
+    image_id = id(image)
+
+    if image_id not in _probes:
+        _probes[image_id] = ImageProbe(image)
+        finalize(image, _probes.pop, image_id, None)
+    return _probes[image_id]
@@ -1,9 +1,29 @@
 from abc import ABC, abstractmethod
+from functools import wraps
+from io import BytesIO
+from time import perf_counter
+from typing import Any, Callable
 
 from PIL.Image import Image
 
+from common import observer
 from image import editor
 from image import utils
+from image.probe import get_probe
+
+
+ANIMATED_TIME_BUDGET = 5.0
+
+_Optimize = Callable[[Any, editor.File, dict[str, dict]], None]
+
+
+def _observe_optimize(optimize: _Optimize) -> _Optimize:
+    @wraps(optimize)
+    def wrapper(self, output: editor.File, save_options: dict[str, dict]) -> None:
+        with observer.stage("optimize", self._image, output=output):
+            optimize(self, output, save_options)
+
+    return wrapper
 
 
 class IStaticProfile(ABC):
@@ -22,8 +42,16 @@ class IStaticProfile(ABC):
             self._editor = editor.StaticEditor(self._image)
         return self._editor
 
-    def get_color_clustering_image(self) -> Image:
-        return self._image
+    def get_color_clustering_image(self, pixel_budget: int | None = None) -> Image:
+        if not pixel_budget:
+            return self._image
+        return utils.reduce_to_pixel_budget(self._image, pixel_budget)
+
+    def _set_memory_budget(self, save_options: dict[str, dict]) -> None:
+        # The "MEMORY" options cap the pixels held, huge JPEGs decode smaller
+        self.get_editor().set_memory_budget(
+            save_options.get("MEMORY", {}).get("budget")
+        )
 
 
 class IOptimizableStaticProfile(IStaticProfile):
@@ -45,8 +73,9 @@ class StaticWebpRgbProfile(IOptimizableStaticProfile):
     def is_optimized(self) -> bool:
         return False
 
+    @_observe_optimize
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
-        self.get_editor()
+        self._set_memory_budget(save_options)
         self._editor.save(output, **save_options["JPEG"])
 
 
@@ -56,10 +85,11 @@ class StaticWebpRgbaProfile(IOptimizableStaticProfile):
     def is_optimized(self) -> bool:
         return False
 
+    @_observe_optimize
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
-        self.get_editor()
+        self._set_memory_budget(save_options)
 
-        if not utils.has_translucent_alpha(self._image):
+        if not get_probe(self._image).has_translucent_alpha:
             self._editor.convert_mode("RGB")
             self._editor.save(output, **save_options["JPEG"])
         else:
@@ -72,8 +102,9 @@ class StaticPngRgbProfile(IOptimizableStaticProfile):
     def is_optimized(self) -> bool:
         return False
 
+    @_observe_optimize
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
-        self.get_editor()
+        self._set_memory_budget(save_options)
         self._editor.save(output, **save_options["JPEG"])
 
 
@@ -81,10 +112,11 @@ class StaticPngRgbaProfile(IOptimizableStaticProfile):
     name = "PNG_RGBA"
 
     def is_optimized(self) -> bool:
-        return utils.has_translucent_alpha(self._image)
+        return get_probe(self._image).has_translucent_alpha
 
+    @_observe_optimize
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
-        self.get_editor()
+        self._set_memory_budget(save_options)
 
         self._editor.convert_mode("RGB")
         self._editor.save(output, **save_options["JPEG"])
@@ -106,10 +138,14 @@ class IAnimatedProfile(ABC):
             self._editor = editor.AnimatedEditor(self._image)
         return self._editor
 
-    def get_color_clustering_image(self) -> Image:
+    def get_color_clustering_image(self, pixel_budget: int | None = None) -> Image:
         self.get_editor()
         # only the 1st frame in its actual mode
-        return self._image.convert(self._editor.actual_mode)
+        image = self._image.convert(self._editor.actual_mode)
+
+        if not pixel_budget:
+            return image
+        return utils.reduce_to_pixel_budget(image, pixel_budget)
 
 
 class IOptimizableAnimatedProfile(IAnimatedProfile):
@@ -117,17 +153,44 @@ class IOptimizableAnimatedProfile(IAnimatedProfile):
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
         pass
 
+    def _save_animated(
+        self, output: editor.File, save_options: dict[str, dict]
+    ) -> None:
+        # The "ANIMATED" options pick the output format, GIF if there are none
+        output_options = save_options.get("ANIMATED", {})
+        policy = output_options.get("policy", "GIF")
+
+        if policy != "SMALLEST":
+            self._editor.save(output, **save_options[policy])
+            return
+
+        start = perf_counter()
+        smallest = BytesIO()
+        self._editor.save(smallest, **save_options["WEBP"])
+        elapsed = perf_counter() - start
+
+        # Quantizing every frame, GIF is assumed to take at least as long
+        time_budget = output_options.get("time_budget", ANIMATED_TIME_BUDGET)
+        if elapsed * 2 <= time_budget:
+            gif = BytesIO()
+            editor.AnimatedEditor(self._image).save(gif, **save_options["GIF"])
+            if gif.getbuffer().nbytes < smallest.getbuffer().nbytes:
+                smallest = gif
+
+        utils.write_output(output, smallest.getbuffer())
+
 
 class AnimatedGifPProfile(IOptimizableAnimatedProfile):
     name = "GIF_P"
 
     def is_optimized(self) -> bool:
-        return getattr(self._image, "is_animated", False)
+        return get_probe(self._image).is_animated
 
+    @_observe_optimize
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
         self.get_editor()
 
-        if not "transparency" in self._image.info:
+        if not get_probe(self._image).has_transparency:
             self._editor.save(output, **save_options["JPEG"])
         else:
             self._editor.save(output, **save_options["PNG"])
@@ -139,9 +202,10 @@ class AnimatedWebpRgbaProfile(IOptimizableAnimatedProfile):
     def is_optimized(self) -> bool:
         return False
 
+    @_observe_optimize
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
         self.get_editor()
-        self._editor.save(output, **save_options["GIF"])
+        self._save_animated(output, save_options)
 
 
 class AnimatedWebpRgbProfile(IOptimizableAnimatedProfile):
@@ -150,6 +214,7 @@ class AnimatedWebpRgbProfile(IOptimizableAnimatedProfile):
     def is_optimized(self) -> bool:
         return False
 
+    @_observe_optimize
     def optimize(self, output: editor.File, save_options: dict[str, dict]) -> None:
         self.get_editor()
-        self._editor.save(output, **save_options["GIF"])
+        self._save_animated(output, save_options)
@@ -0,0 +1,217 @@
+import math
+from collections import OrderedDict
+from hashlib import blake2b
+from io import BytesIO
+from threading import Lock
+from typing import Any, Callable
+
+import PIL.Image
+from PIL import ImageChops, ImageStat
+
+
+PROBE_PIXEL_BUDGET = 256_000
+PROBE_TILE_SIZE = 64
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+
+# Save options that turn a JPEG save into a quality search
+SEARCH_OPTIONS = ("target_size", "min_psnr")
+
+
+class QualityCache:
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self._qualities: OrderedDict[tuple, int] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: tuple) -> int | None:
+        with self._lock:
+            if key not in self._qualities:
+                return None
+            self._qualities.move_to_end(key)
+            return self._qualities[key]
+
+    def set(self, key: tuple, quality: int) -> None:
+        with self._lock:
+            self._qualities[key] = quality
+            self._qualities.move_to_end(key)
+            if len(self._qualities) > self.max_size:
+                self._qualities.popitem(last=False)
+
+
+default_cache = QualityCache()
+
+
+def resolve_save_options(image: PIL.Image.Image, save_options: dict[str, Any]) -> dict:
+    # Replaces target_size / min_psnr with the quality found for this image
+    if not any(option in save_options for option in SEARCH_OPTIONS):
+        return save_options
+
+    save_options = dict(save_options)
+    target_size = save_options.pop("target_size", None)
+    min_psnr = save_options.pop("min_psnr", None)
+    cache = save_options.pop("quality_cache", default_cache)
+
+    if save_options.get("format", "").upper() not in ("JPEG", "JPG"):
+        return save_options
+
+    save_options["quality"] = find_jpeg_quality(
+        image,
+        target_size,
+        min_psnr,
+        save_options={
+            key: value
+            for key, value in save_options.items()
+            if key not in ("format", "quality")
+        },
+        cache=cache,
+    )
+    return save_options
+
+
+def find_jpeg_quality(
+    image: PIL.Image.Image,
+    target_size: int | None = None,
+    min_psnr: float | None = None,
+    min_quality: int = MIN_QUALITY,
+    max_quality: int = MAX_QUALITY,
+    probe_pixel_budget: int = PROBE_PIXEL_BUDGET,
+    save_options: dict[str, Any] | None = None,
+    cache: QualityCache | None = default_cache,
+) -> int:
+    save_options = save_options or {}
+    probe = get_probe_image(image, probe_pixel_budget)
+
+    key = None
+    if cache is not None:
+        key = (
+            get_probe_digest(probe),
+            image.size,
+            target_size,
+            min_psnr,
+            min_quality,
+            max_quality,
+            repr(sorted(save_options.items())),
+        )
+        quality = cache.get(key)
+        if quality is not None:
+            return quality
+
+    # The probe keeps the image's texture, so bytes scale with the pixels
+    scale = image.width * image.height / (probe.width * probe.height)
+    quality = max_quality
+
+    if min_psnr is not None:
+        # The lowest quality that still looks close enough
+        quality = max_quality - _bisect(
+            lambda quality: get_psnr(probe, _encode(probe, quality, save_options))
+            >= min_psnr,
+            max_quality - min_quality,
+            lambda step: max_quality - step,
+        )
+    if target_size is not None:
+        # The highest quality that fits, it wins over min_psnr
+        size_quality = min_quality + _bisect(
+            lambda quality: len(_encode(probe, quality, save_options).getbuffer())
+            * scale
+            <= target_size,
+            max_quality - min_quality,
+            lambda step: min_quality + step,
+        )
+        if probe is not image:
+            size_quality = _fit_target_size(
+                image, size_quality, target_size, min_quality, save_options
+            )
+        quality = min(quality, size_quality)
+
+    if cache is not None:
+        cache.set(key, quality)  # type: ignore
+    return quality
+
+
+def get_probe_image(
+    image: PIL.Image.Image, pixel_budget: int = PROBE_PIXEL_BUDGET
+) -> PIL.Image.Image:
+    # A mosaic of tiles from across the image, downscaling would smooth out
+    # the noise that drives the JPEG size and make it look cheaper
+    if image.width * image.height <= pixel_budget:
+        return image
+
+    tile_width = min(PROBE_TILE_SIZE, image.width)
+    tile_height = min(PROBE_TILE_SIZE, image.height)
+    tiles = max(1, pixel_budget // (tile_width * tile_height))
+    columns = max(1, min(image.width // tile_width, math.isqrt(tiles)))
+    rows = max(1, min(image.height // tile_height, tiles // columns))
+
+    probe = PIL.Image.new(image.mode, (columns * tile_width, rows * tile_height))
+    for row in range(rows):
+        top = _get_tile_offset(row, rows, image.height - tile_height)
+        for column in range(columns):
+            left = _get_tile_offset(column, columns, image.width - tile_width)
+            tile = image.crop((left, top, left + tile_width, top + tile_height))
+            probe.paste(tile, (column * tile_width, row * tile_height))
+    return probe
+
+
+def get_probe_digest(probe: PIL.Image.Image) -> str:
+    digest = blake2b(digest_size=20)
+    digest.update(f"{probe.mode}:{probe.width}x{probe.height}".encode())
+    digest.update(probe.tobytes())
+    return digest.hexdigest()
+
+
+def get_psnr(reference: PIL.Image.Image, encoded: BytesIO) -> float:
+    with PIL.Image.open(encoded) as decoded:
+        difference = ImageChops.difference(reference, decoded.convert(reference.mode))
+
+    squared = [rms**2 for rms in ImageStat.Stat(difference).rms]
+    mse = sum(squared) / len(squared)
+    return math.inf if mse == 0 else 10 * math.log10(255**2 / mse)
+
+
+def _encode(
+    image: PIL.Image.Image, quality: int, save_options: dict[str, Any]
+) -> BytesIO:
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=quality, **save_options)
+    return output
+
+
+def _fit_target_size(
+    image: PIL.Image.Image,
+    quality: int,
+    target_size: int,
+    min_quality: int,
+    save_options: dict[str, Any],
+) -> int:
+    # The probe only estimates the size, the full encode has to fit
+    def fits(quality: int) -> bool:
+        return len(_encode(image, quality, save_options).getbuffer()) <= target_size
+
+    if quality <= min_quality or fits(quality):
+        return quality
+    return min_quality + _bisect(
+        fits, quality - 1 - min_quality, lambda step: min_quality + step
+    )
+
+
+def _bisect(
+    accept: Callable[[int], bool], steps: int, get_quality: Callable[[int], int]
+) -> int:
+    # The most steps away from the start whose quality is still accepted,
+    # 0 when even the start isn't
+    low, high, best = 1, steps, 0
+
+    while low <= high:
+        middle = (low + high) // 2
+        if accept(get_quality(middle)):
+            best, low = middle, middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def _get_tile_offset(index: int, count: int, max_offset: int) -> int:
+    # Tiles spread evenly, aligned to the 8 px blocks of the encoder
+    offset = max_offset * index // max(1, count - 1) if count > 1 else max_offset // 2
+    return offset - offset % 8
@@ -0,0 +1,130 @@
+from typing import Sequence
+
+import PIL.Image
+from PIL import features
+from PIL.Image import Dither, Image, Quantize
+
+from common import observer
+
+
+METHODS = {
+    "fastoctree": Quantize.FASTOCTREE,
+    "mediancut": Quantize.MEDIANCUT,
+    "libimagequant": Quantize.LIBIMAGEQUANT,
+}
+SAMPLE_FRAMES = 8
+SAMPLE_PIXEL_BUDGET = 64_000
+
+# Pixels below this alpha get the transparent index, GIF has no translucency
+_TRANSPARENT_LUT = [255] * 128 + [0] * 128
+
+
+def get_method(name: str) -> Quantize:
+    if name.lower() not in METHODS:
+        raise ValueError(f"Unknown quantize method: {name}")
+
+    method = METHODS[name.lower()]
+    # Only there when Pillow was built with it
+    if method == Quantize.LIBIMAGEQUANT and not features.check_feature("libimagequant"):
+        return Quantize.FASTOCTREE
+    return method
+
+
+def get_sample(frames: Sequence[Image], count: int) -> list[Image]:
+    # Evenly spaced from the 1st to the last frame, so a late scene still gets
+    # its colors
+    if len(frames) <= count:
+        return list(frames)
+    if count < 2:
+        return list(frames[:count])
+    last = len(frames) - 1
+    return [frames[round(index * last / (count - 1))] for index in range(count)]
+
+
+class GlobalPalette:
+    def __init__(
+        self,
+        method: str = "fastoctree",
+        colors: int = 256,
+        dither: bool = False,
+        sample_frames: int = SAMPLE_FRAMES,
+        sample_pixel_budget: int = SAMPLE_PIXEL_BUDGET,
+    ) -> None:
+        self.method = get_method(method)
+        self.colors = colors
+        self.dither = Dither.FLOYDSTEINBERG if dither else Dither.NONE
+        self.sample_frames = sample_frames
+        self.sample_pixel_budget = sample_pixel_budget
+        self.transparency: int | None = None
+        self._palette_image: Image | None = None
+        self._palette: list[int] = []
+
+    @property
+    def is_built(self) -> bool:
+        return self._palette_image is not None
+
+    def build(self, frames: Sequence[Image]) -> None:
+        with observer.stage("quantize", frames[0], len(frames)):
+            tiles = [
+                self._get_tile(frame)
+                for frame in get_sample(frames, self.sample_frames)
+            ]
+            mosaic = PIL.Image.new(
+                "RGB",
+                (sum(tile.width for tile in tiles), max(tile.height for tile in tiles)),
+            )
+            left = 0
+            for tile in tiles:
+                mosaic.paste(tile, (left, 0))
+                left += tile.width
+
+            # One index is kept back for the transparent pixels
+            transparent = any(_has_transparency(frame) for frame in frames)
+            self._palette_image = mosaic.quantize(
+                self.colors - transparent, self.method
+            )
+            self._palette = self._palette_image.getpalette() or []
+            if transparent:
+                self.transparency = len(self._palette) // 3
+                self._palette += [0, 0, 0]
+
+    def remap(self, frame: Image) -> Image:
+        with observer.stage("quantize", frame):
+            rgb = frame if frame.mode == "RGB" else frame.convert("RGB")
+            remapped = rgb.quantize(palette=self._palette_image, dither=self.dither)
+            if self.transparency is None:
+                return remapped
+
+            # Added after the remap, so no opaque pixel gets the transparent index.
+            # Only a frame that uses it says so, an opaque one stays opaque
+            remapped.putpalette(self._palette)
+            if _has_transparency(frame):
+                alpha = frame if frame.mode == "RGBA" else frame.convert("RGBA")
+                mask = alpha.getchannel("A").point(_TRANSPARENT_LUT)
+                remapped.paste(self.transparency, mask=mask)
+                remapped.info["transparency"] = self.transparency
+            return remapped
+
+    def _get_tile(self, frame: Image) -> Image:
+        tile = frame if frame.mode == "RGB" else frame.convert("RGB")
+        if tile.width * tile.height <= self.sample_pixel_budget:
+            return tile
+
+        scale = (self.sample_pixel_budget / (tile.width * tile.height)) ** 0.5
+        size = max(1, int(tile.width * scale)), max(1, int(tile.height * scale))
+        return tile.resize(size, PIL.Image.Resampling.BOX)
+
+
+def quantize_frames(frames: list[Image], **options: object) -> list[Image]:
+    # One palette for all of them, so the colors don't flicker between frames
+    palette = GlobalPalette(**options)  # type: ignore
+    palette.build(frames)
+    return [palette.remap(frame) for frame in frames]
+
+
+def _has_transparency(frame: Image) -> bool:
+    # From the pixels, an alpha band or a transparent color may go unused
+    if frame.mode not in ("RGBA", "LA", "PA") and "transparency" not in frame.info:
+        return False
+    alpha = frame if frame.mode == "RGBA" else frame.convert("RGBA")
+    return alpha.getchannel("A").getextrema()[0] < 128
@@ -0,0 +1,205 @@
+import os
+import shutil
+from abc import ABC, abstractmethod
+from io import BytesIO, RawIOBase
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile, mkdtemp
+from typing import IO, Any, Generic, TypeVar
+
+
+_Output = TypeVar("_Output")
+
+
+class IOutputSink(ABC, Generic[_Output]):
+    def begin(self) -> None:
+        pass
+
+    @abstractmethod
+    def open(self) -> IO[bytes]:
+        pass
+
+    @abstractmethod
+    def finish(self, output: IO[bytes]) -> _Output:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "IOutputSink[_Output]":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class BytesIOSink(IOutputSink[BytesIO]):
+    def open(self) -> BytesIO:
+        return BytesIO()
+
+    def finish(self, output: IO[bytes]) -> BytesIO:
+        return output  # type: ignore
+
+
+class BufferSink(IOutputSink[memoryview]):
+    # Results are views of buffers reused by the next bulk_resize with this sink,
+    # which releases them, so a stale view raises instead of changing under you
+    def __init__(self, size_hint: int = 64 * 1024) -> None:
+        self._size_hint = size_hint
+        self._buffers: list[bytearray] = []
+        self._writers: list[BufferWriter] = []
+        self._views: list[memoryview] = []
+
+    def begin(self) -> None:
+        self._release_views()
+        self._writers.clear()
+
+    def open(self) -> "BufferWriter":
+        if len(self._writers) == len(self._buffers):
+            self._buffers.append(bytearray(self._size_hint))
+        writer = BufferWriter(self._buffers[len(self._writers)])
+        self._writers.append(writer)
+        return writer
+
+    def finish(self, output: IO[bytes]) -> memoryview:
+        writer: BufferWriter = output  # type: ignore
+        # The writer may have outgrown its buffer, the bigger one gets reused
+        self._buffers[self._writers.index(writer)] = writer.buffer
+        view = writer.getbuffer()
+        self._views.append(view)
+        return view
+
+    def close(self) -> None:
+        self._release_views()
+
+    def _release_views(self) -> None:
+        for view in self._views:
+            try:
+                view.release()
+            except BufferError:
+                pass
+        self._views.clear()
+
+        for index, buffer in enumerate(self._buffers):
+            try:
+                # Resizing fails while anything still exports the buffer
+                buffer.append(0)
+                buffer.pop()
+            except BufferError:
+                # So it's left to whoever holds it, not overwritten
+                self._buffers[index] = bytearray(self._size_hint)
+
+
+class SpooledSink(IOutputSink[SpooledTemporaryFile]):
+    # Small outputs stay in memory, fileno() moves one to disk for sendfile
+    def __init__(self, max_size: int = 1024 * 1024) -> None:
+        self._max_size = max_size
+        self._files: list[SpooledTemporaryFile] = []
+
+    def open(self) -> SpooledTemporaryFile:
+        file = SpooledTemporaryFile(self._max_size)
+        self._files.append(file)
+        return file
+
+    def finish(self, output: IO[bytes]) -> SpooledTemporaryFile:
+        output.seek(0)
+        return output  # type: ignore
+
+    def close(self) -> None:
+        for file in self._files:
+            file.close()
+        self._files.clear()
+
+
+class DirectorySink(IOutputSink[str]):
+    def __init__(self, directory: str | None = None, suffix: str = "") -> None:
+        self._own_directory = directory is None
+        self._directory = directory or mkdtemp()
+        self._suffix = suffix
+        self._paths: list[str] = []
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def open(self) -> IO[bytes]:
+        file = NamedTemporaryFile(
+            dir=self._directory, suffix=self._suffix, delete=False
+        )
+        self._paths.append(file.name)
+        return file
+
+    def finish(self, output: IO[bytes]) -> str:
+        output.close()
+        return output.name  # type: ignore
+
+    def close(self) -> None:
+        if self._own_directory:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        else:
+            for path in self._paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        self._paths.clear()
+
+
+class NamedTemporaryFileSink(IOutputSink[str]):
+    # The caller owns the files and removes them
+    def open(self) -> IO[bytes]:
+        return NamedTemporaryFile(delete=False)
+
+    def finish(self, output: IO[bytes]) -> str:
+        output.close()
+        return output.name  # type: ignore
+
+
+class BufferWriter(RawIOBase):
+    def __init__(self, buffer: bytearray) -> None:
+        self.buffer = buffer
+        self._position = 0
+        self._size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        data = memoryview(data).cast("B")
+        end = self._position + len(data)
+
+        if end > len(self.buffer):
+            self._grow(end)
+        self.buffer[self._position : end] = data
+        self._position = end
+        self._size = max(self._size, end)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        elif whence != os.SEEK_SET:
+            raise ValueError(f"Invalid whence: {whence}")
+        if offset < 0:
+            raise ValueError(f"Negative seek position: {offset}")
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+    def getbuffer(self) -> memoryview:
+        return memoryview(self.buffer)[: self._size]
+
+    def getvalue(self) -> bytes:
+        return bytes(self.getbuffer())
+
+    def _grow(self, size: int) -> None:
+        # Doubling keeps the number of reallocations logarithmic
+        capacity = max(size, len(self.buffer) * 2)
+        try:
+            self.buffer.extend(bytes(capacity - len(self.buffer)))
+        except BufferError:
+            # A previous result still views this buffer, so it can't resize
+            self.buffer = self.buffer + bytes(capacity - len(self.buffer))
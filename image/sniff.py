@@ -0,0 +1,217 @@
+from typing import IO, Callable
+
+from PIL import GifImagePlugin, Image
+
+from image.category import CategoryProxy, Profile, SupportedImages
+
+
+HEADER_SIZE = 4096
+
+Sniffed = tuple[str, str, bool]  # format, mode, is_animated
+
+_PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+_JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def read_header(source: str | IO[bytes], size: int = HEADER_SIZE) -> bytes:
+    if isinstance(source, str):
+        with open(source, "rb") as file:
+            return file.read(size)
+
+    position = source.tell()
+    header = source.read(size)
+    source.seek(position)
+    return header
+
+
+def is_known_format(header: bytes) -> bool:
+    return header[:3] == b"\xff\xd8\xff" or _get_sniffer(header) is not None
+
+
+def sniff_header(header: bytes) -> Sniffed | None:
+    # None means the header alone can't tell, not that the image is invalid
+    if header[:3] == b"\xff\xd8\xff":
+        return _sniff_jpeg(header)
+
+    sniffer = _get_sniffer(header)
+    return sniffer(header) if sniffer else None
+
+
+def get_format_mode(sniffed: Sniffed) -> tuple[str, str]:
+    format, mode, is_animated = sniffed
+    # Same rule as CategoryProxy, a GIF is always in the animated category
+    category = "ANIMATED" if is_animated or format == "GIF" else "STATIC"
+    return category, "_".join([format, mode])
+
+
+def get_profile_class(
+    source: str | IO[bytes], supported_images: SupportedImages
+) -> type[Profile] | None:
+    header = read_header(source)
+
+    if not is_known_format(header):
+        return None
+
+    sniffed = sniff_header(header)
+    if sniffed is None:
+        return _get_decoded_profile_class(source, supported_images)
+
+    category, format_mode = get_format_mode(sniffed)
+    return supported_images[category].get(format_mode)
+
+
+def _get_decoded_profile_class(
+    source: str | IO[bytes], supported_images: SupportedImages
+) -> type[Profile] | None:
+    with Image.open(source) as image:
+        profile = CategoryProxy(image, supported_images).get_profile()
+        return type(profile) if profile else None
+
+
+def _get_sniffer(header: bytes) -> Callable[[bytes], Sniffed | None] | None:
+    if header[:8] == b"\x89PNG\r\n\x1a\n":
+        return _sniff_png
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return _sniff_gif
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return _sniff_webp
+    return None
+
+
+def _sniff_jpeg(header: bytes) -> Sniffed | None:
+    offset = 2
+
+    while offset + 4 <= len(header):
+        if header[offset] != 0xFF:
+            return None
+
+        marker = header[offset + 1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # markers without length
+            offset += 2
+            continue
+
+        if marker in _JPEG_SOF_MARKERS:
+            if offset + 10 > len(header):
+                return None
+            mode = _JPEG_MODES.get(header[offset + 9])
+            return ("JPEG", mode, False) if mode else None
+        if marker == 0xDA:  # a scan before the frame header
+            return None
+        if marker == 0xE2 and header[offset + 4 : offset + 8] == b"MPF\x00":
+            # Multi-picture, Pillow opens it as an animated MPO
+            return None
+
+        offset += 2 + int.from_bytes(header[offset + 2 : offset + 4], "big")
+    return None
+
+
+def _sniff_png(header: bytes) -> Sniffed | None:
+    if header[12:16] != b"IHDR" or len(header) < 26:
+        return None
+
+    bit_depth, color_type = header[24], header[25]
+    mode = _PNG_MODES.get(color_type)
+    if mode is None:
+        return None
+    if color_type == 0 and bit_depth in (1, 16):
+        mode = "1" if bit_depth == 1 else "I;16"
+
+    # APNG declares its frame count (acTL) before the first IDAT
+    offset = 8
+    while offset + 8 <= len(header):
+        length = int.from_bytes(header[offset : offset + 4], "big")
+        chunk_type = header[offset + 4 : offset + 8]
+
+        if chunk_type == b"IDAT":
+            return "PNG", mode, False
+        if chunk_type == b"acTL":
+            if offset + 12 > len(header):
+                return None
+            n_frames = int.from_bytes(header[offset + 8 : offset + 12], "big")
+            return "PNG", mode, n_frames > 1
+
+        offset += 12 + length
+    return None
+
+
+def _sniff_gif(header: bytes) -> Sniffed | None:
+    if len(header) < 13:
+        return None
+    if GifImagePlugin.LOADING_STRATEGY == GifImagePlugin.LoadingStrategy.RGB_ALWAYS:
+        return None
+
+    flags = header[10]
+    offset = 13
+    has_palette = False
+
+    if flags & 0x80:
+        palette_size = 3 << ((flags & 7) + 1)
+        palette = header[offset : offset + palette_size]
+        if len(palette) < palette_size:
+            return None
+        # Pillow drops a global palette that's only a grayscale ramp
+        has_palette = palette != bytes(index // 3 for index in range(palette_size))
+        offset += palette_size
+
+    frames = _count_gif_frames(header, offset)
+    if frames is None:
+        return None
+
+    n_frames, local_palette = frames
+    mode = "P" if has_palette or local_palette else "L"
+    return "GIF", mode, n_frames > 1
+
+
+def _count_gif_frames(header: bytes, offset: int) -> tuple[int, bool] | None:
+    # Walks the blocks up to the 2nd image descriptor, or the end of the header
+    n_frames = 0
+    local_palette = False
+
+    while offset < len(header):
+        block = header[offset]
+
+        if block == 0x3B:  # trailer
+            return (n_frames, local_palette) if n_frames else None
+        if block == 0x21:  # extension
+            offset = _skip_gif_sub_blocks(header, offset + 2)
+        elif block == 0x2C:  # image descriptor
+            n_frames += 1
+            if n_frames > 1:
+                return n_frames, local_palette
+            if offset + 10 > len(header):
+                return None
+
+            flags = header[offset + 9]
+            local_palette = bool(flags & 0x80)
+            offset += 10
+            if flags & 0x80:
+                offset += 3 << ((flags & 7) + 1)
+            offset = _skip_gif_sub_blocks(header, offset + 1)
+        else:
+            return None
+    # Ran out of header, the category of a GIF doesn't depend on the count
+    return (n_frames, local_palette) if n_frames else None
+
+
+def _skip_gif_sub_blocks(header: bytes, offset: int) -> int:
+    while offset < len(header) and header[offset]:
+        offset += header[offset] + 1
+    return offset + 1
+
+
+def _sniff_webp(header: bytes) -> Sniffed | None:
+    chunk_type = header[12:16]
+
+    if chunk_type == b"VP8 ":
+        return "WEBP", "RGB", False
+    if chunk_type == b"VP8L" and len(header) >= 25 and header[20] == 0x2F:
+        has_alpha = (int.from_bytes(header[21:25], "little") >> 28) & 1
+        return "WEBP", "RGBA" if has_alpha else "RGB", False
+    if chunk_type == b"VP8X" and len(header) >= 21:
+        flags = header[20]
+        return "WEBP", "RGBA" if flags & 0x10 else "RGB", bool(flags & 0x02)
+    return None
@@ -1,38 +1,404 @@
 from __future__ import annotations
-from tempfile import NamedTemporaryFile
-from io import BytesIO
+from math import ceil, floor, sqrt
 
 import PIL.Image
+from PIL import GifImagePlugin
 
-from typing import TYPE_CHECKING, Generator
+from typing import TYPE_CHECKING, Any, Callable, Generator, Iterable, Iterator, TypeVar
+
+from common import observer
+from image.quantize import GlobalPalette
+from image.sink import BytesIOSink, IOutputSink, NamedTemporaryFileSink
 
 
 if TYPE_CHECKING:
-    from image.editor import IEditor
+    from image.editor import IEditor, File
+
+
+_Output = TypeVar("_Output")
+
+
+_ALPHA_STRIP_ROWS = 256
+
+# The scales a JPEG can be decoded at, by DCT scaling
+_DRAFT_SCALES = (1, 2, 4, 8)
+
+# Source pixels each side of a sample that the filters read, before scaling
+_FILTER_SUPPORT = {
+    PIL.Image.Resampling.NEAREST: 0.0,
+    PIL.Image.Resampling.BOX: 0.5,
+    PIL.Image.Resampling.BILINEAR: 1.0,
+    PIL.Image.Resampling.HAMMING: 1.0,
+    PIL.Image.Resampling.BICUBIC: 2.0,
+    PIL.Image.Resampling.LANCZOS: 3.0,
+}
 
 
 def has_translucent_alpha(image: PIL.Image.Image) -> bool:
-    bands_min_max = image.getextrema()
+    if image.mode != "RGBA":
+        return False
+
+    with observer.stage("has_translucent_alpha", image):
+        # Only the alpha band is copied, its strips stop at the 1st translucent
+        # pixel
+        alpha = image.getchannel("A")
+        for top in range(0, alpha.height, _ALPHA_STRIP_ROWS):
+            bottom = min(top + _ALPHA_STRIP_ROWS, alpha.height)
+            if alpha.crop((0, top, alpha.width, bottom)).getextrema()[0] < 255:
+                return True
+        return False
+
+
+def get_image_bytes(image: PIL.Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def get_mode_bytes(mode: str, size: tuple[int, int]) -> int:
+    # As Pillow holds them, multi-band pixels are padded to 4 bytes
+    return size[0] * size[1] * _get_pixel_size(mode)
+
+
+def _get_pixel_size(mode: str) -> int:
+    if PIL.Image.getmodebands(mode) > 1 or mode in ("I", "F"):
+        return 4
+    return 2 if mode.startswith("I;16") else 1
+
+
+class GifStreamWriter:
+    def __init__(
+        self,
+        output: File,
+        quantize: dict[str, Any] | None = None,
+        **save_options: Any,
+    ) -> None:
+        self.stats = {"frames": 0, "peak_held_bytes": 0}
+        self._save_options = save_options
+        self._palette = GlobalPalette(**quantize) if quantize is not None else None
+        self._sample: list[PIL.Image.Image] = []
+        self._output = output
+        self._fp = (
+            output if hasattr(output, "write") else open(output, "wb")  # type: ignore
+        )
+
+    def write(self, frame: PIL.Image.Image) -> None:
+        self.stats["peak_held_bytes"] = max(
+            self.stats["peak_held_bytes"],
+            get_image_bytes(frame) + sum(map(get_image_bytes, self._sample)),
+        )
+        if self._palette is None:
+            self._write(frame)
+            return
+        if self._palette.is_built:
+            self._write(self._palette.remap(frame))
+            return
+
+        # Only the 1st sample_frames frames are known when the palette is built,
+        # a later scene gets the nearest of their colors, and is only
+        # transparent if they are. Frames are held until there are enough
+        self._sample.append(frame)
+        if len(self._sample) >= self._palette.sample_frames:
+            self._write_sample()
+
+    def close(self, finish: bool = True) -> dict[str, int]:
+        # Without finish the file is only closed, e.g. when a frame failed
+        try:
+            if finish:
+                if self._sample:
+                    self._write_sample()
+                if not self.stats["frames"]:
+                    raise ValueError("A GIF needs at least one frame.")
+                self._fp.write(b";")
+        finally:
+            if self._fp is not self._output:
+                self._fp.close()
+        return self.stats
+
+    def _write_sample(self) -> None:
+        self._palette.build(self._sample)  # type: ignore
+        for frame in self._sample:
+            self._write(self._palette.remap(frame))  # type: ignore
+        self._sample.clear()
+
+    def _write(self, frame: PIL.Image.Image) -> None:
+        duration = self._save_options.get("duration")
+        frame_duration = (
+            duration[self.stats["frames"]]
+            if isinstance(duration, (list, tuple))
+            else duration or frame.info.get("duration", 0)
+        )
+        gif_frame = _to_gif_mode(frame)
+        info = {
+            "loop": self._save_options.get("loop", 0),
+            "duration": frame_duration,
+            "optimize": self._save_options.get("optimize", False),
+        }
+        if "background" in self._save_options:
+            info["background"] = self._save_options["background"]
+        if "transparency" in gif_frame.info:
+            info["transparency"] = gif_frame.info["transparency"]
+
+        # getheader also normalizes the palette of the frame in-place, with
+        # optimize it drops the unused colors and moves the transparent index
+        header, _ = GifImagePlugin.getheader(gif_frame, info=info)
+        if not self.stats["frames"]:
+            self._fp.write(b"".join(header))
+
+        params = {
+            "duration": frame_duration,
+            "disposal": self._save_options.get("disposal", 0),
+            "include_color_table": True,
+        }
+        if "transparency" in info:
+            params["transparency"] = info["transparency"]
+        self._fp.write(b"".join(GifImagePlugin.getdata(gif_frame, **params)))
+        self.stats["frames"] += 1
+
+
+def write_output(output: File, data: bytes | memoryview) -> None:
+    if hasattr(output, "write"):
+        output.write(data)  # type: ignore
+        return
+
+    with open(output, "wb") as file:  # type: ignore
+        file.write(data)
+
+
+def save_gif_stream(
+    output: File, frames: Iterable[PIL.Image.Image], **save_options: Any
+) -> dict[str, int]:
+    # Frames are encoded as they come, so only one of them is held at a time
+    writer = GifStreamWriter(output, **save_options)
+    try:
+        for frame in frames:
+            writer.write(frame)
+    except BaseException:
+        writer.close(finish=False)
+        raise
+    return writer.close()
+
+
+def _to_gif_mode(image: PIL.Image.Image) -> PIL.Image.Image:
+    if image.mode in ("1", "L", "P"):
+        return image.copy()
+
+    image = image.convert("P", palette=PIL.Image.Palette.ADAPTIVE)
+    if image.palette and image.palette.mode == "RGBA":
+        for rgba, index in image.palette.colors.items():
+            if rgba[3] == 0:
+                image.info["transparency"] = index
+                break
+    return image
+
+
+def get_pixel_budget_size(size: tuple[int, int], pixel_budget: int) -> tuple[int, int]:
+    width, height = size
+    scale = min(1.0, sqrt(pixel_budget / (width * height)))
+    return max(1, int(width * scale)), max(1, int(height * scale))
 
-    if isinstance(bands_min_max[0], tuple) and len(bands_min_max) == 4:  # RGBA
-        return bands_min_max[3][0] < 255
-    return False
 
+def draft_to_pixel_budget(image: PIL.Image.Image, pixel_budget: int) -> None:
+    # DCT scaling only applies to JPEGs that weren't loaded yet, and it's in-place
+    image.draft(None, get_pixel_budget_size(image.size, pixel_budget))
+
+
+def reduce_to_pixel_budget(
+    image: PIL.Image.Image, pixel_budget: int
+) -> PIL.Image.Image:
+    width, height = image.size
+
+    if width * height <= pixel_budget:
+        return image
+
+    factor = ceil(sqrt(width * height / pixel_budget))
+    while ceil(width / factor) * ceil(height / factor) > pixel_budget:
+        factor += 1
+    return image.reduce(factor)
+
+
+def get_draft_scale(size: tuple[int, int], min_size: tuple[int, int]) -> int:
+    # The largest DCT scale that still decodes to at least min_size
+    width, height = size
+    return max(
+        scale
+        for scale in _DRAFT_SCALES
+        if scale == 1
+        or (ceil(width / scale) >= min_size[0] and ceil(height / scale) >= min_size[1])
+    )
+
+
+def get_memory_budget_scale(
+    mode: str, size: tuple[int, int], memory_budget: int
+) -> int:
+    # The smallest DCT scale that fits, or the largest one if none does
+    width, height = size
+    for scale in _DRAFT_SCALES:
+        scaled_size = (ceil(width / scale), ceil(height / scale))
+        if get_mode_bytes(mode, scaled_size) <= memory_budget:
+            break
+    return scale
+
+
+def draft_to_scale(image: PIL.Image.Image, scale: int) -> None:
+    # Like draft_to_pixel_budget, a no-op unless it's a JPEG that wasn't loaded
+    if scale > 1:
+        width, height = image.size
+        image.draft(None, (max(1, width // scale), max(1, height // scale)))
+
+
+def get_strip_rows(
+    image: PIL.Image.Image,
+    size: tuple[int, int],
+    resample: int | None,
+    mode: str | None,
+    max_strip_bytes: int,
+) -> int:
+    # Output rows per strip, counting the source crop, its conversion and the
+    # horizontal pass Pillow makes before the vertical one (0 if none fits)
+    scale = image.height / size[1]
+    row_bytes = image.width * _get_pixel_size(image.mode) + (
+        image.width + size[0]
+    ) * _get_pixel_size(mode or image.mode)
+    source_rows = max_strip_bytes // row_bytes - 2 * _get_strip_margin(
+        image, size, resample
+    )
+    return max(0, min(size[1], floor(source_rows / scale)))
+
+
+def resize_in_strips(
+    image: PIL.Image.Image,
+    size: tuple[int, int],
+    resample: int | None,
+    mode: str | None,
+    strip_rows: int,
+) -> PIL.Image.Image:
+    # Each strip is cropped with the rows its filter reads around it and resized
+    # from the same source coordinates, so it matches a resize of the whole
+    # image up to rounding (NEAREST and BOX may pick the next row on a tie)
+    resample = PIL.Image.Resampling.BICUBIC if resample is None else resample
+    scale = image.height / size[1]
+    margin = _get_strip_margin(image, size, resample)
+    output = PIL.Image.new(mode or image.mode, size)
+
+    for top in range(0, size[1], strip_rows):
+        bottom = min(top + strip_rows, size[1])
+        source_top = max(0, floor(top * scale) - margin)
+        source_bottom = min(image.height, ceil(bottom * scale) + margin)
+
+        strip = (
+            image
+            if source_bottom - source_top == image.height
+            else image.crop((0, source_top, image.width, source_bottom))
+        )
+        if mode and mode != strip.mode:
+            strip = strip.convert(mode)
+        box = (
+            0,
+            top * image.height / size[1] - source_top,
+            image.width,
+            bottom * image.height / size[1] - source_top,
+        )
+        output.paste(strip.resize((size[0], bottom - top), resample, box), (0, top))
+    return output
+
+
+def _get_strip_margin(
+    image: PIL.Image.Image, size: tuple[int, int], resample: int | None
+) -> int:
+    support = _FILTER_SUPPORT.get(resample, 3.0)  # type: ignore
+    return ceil(support * max(1.0, image.height / size[1])) + 1
+
+
+def bulk_resize(
+    editor: IEditor,
+    resize_save_options: list[dict],
+    cascade: bool = False,
+    cascade_min_scale: float = 2.0,
+    single_pass: bool = False,
+    sink: IOutputSink[_Output] | None = None,
+) -> Generator[_Output]:
+    output_sink: IOutputSink = sink or BytesIOSink()
+    output_sink.begin()
+
+    # Every size is known up front, so the editor decodes for the largest one
+    for options in resize_save_options:
+        editor.plan_decode(
+            options["resize"]["size"], options["resize"].get("reducing_gap")
+        )
+
+    def _save(options: dict) -> _Output:
+        output = output_sink.open()
+        editor.save(output, **options["save"])
+        return output_sink.finish(output)
+
+    if single_pass:
+        outputs = [output_sink.open() for _ in resize_save_options]
+        editor.bulk_save(outputs, resize_save_options)  # type: ignore
+        for output in outputs:
+            yield output_sink.finish(output)
+        return
+
+    if cascade:
+        yield from _cascade_resize(
+            editor, resize_save_options, cascade_min_scale, _save
+        )
+        return
 
-def bulk_resize(editor: IEditor, resize_save_options: list[dict]) -> Generator[BytesIO]:
     for options in resize_save_options:
         editor.resize(**options["resize"])
-        result = BytesIO()
-        editor.save(result, **options["save"])
-        yield result
+        yield _save(options)
 
 
 def bulk_resize_tempfile(
-    editor: IEditor, resize_save_options: list[dict]
+    editor: IEditor,
+    resize_save_options: list[dict],
+    cascade: bool = False,
+    cascade_min_scale: float = 2.0,
+    single_pass: bool = False,
 ) -> Generator[str]:
-    for options in resize_save_options:
-        editor.resize(**options["resize"])
-        tempfile = NamedTemporaryFile(delete=False)
-        editor.save(tempfile, **options["save"])
-        tempfile.close()
-        yield tempfile.name
+    # Left for the caller to delete, a DirectorySink cleans up after itself
+    yield from bulk_resize(
+        editor,
+        resize_save_options,
+        cascade,
+        cascade_min_scale,
+        single_pass,
+        sink=NamedTemporaryFileSink(),
+    )
+
+
+def _cascade_resize(
+    editor: IEditor,
+    resize_save_options: list[dict],
+    min_scale: float,
+    save: Callable[[dict], _Output],
+) -> Iterator[_Output]:
+    # Largest first, so each size can be derived from the previous one
+    order = sorted(
+        range(len(resize_save_options)),
+        key=lambda index: _get_area(resize_save_options[index]["resize"]["size"]),
+        reverse=True,
+    )
+    # Only the outputs done ahead of their turn are held, none when the sizes
+    # are given largest first
+    results: dict[int, _Output] = {}
+    next_index = 0
+
+    editor.reset_cascade()
+    try:
+        for index in order:
+            options = resize_save_options[index]
+            size = options["resize"]["size"]
+            # Only cascade while the downscale ratio keeps the quality
+            cascade = editor.can_cascade(size, min_scale)
+            editor.resize(**options["resize"], cascade=cascade)
+            results[index] = save(options)
+
+            while next_index in results:
+                yield results.pop(next_index)
+                next_index += 1
+    finally:
+        editor.reset_cascade()
+
+
+def _get_area(size: tuple[int, int]) -> int:
+    return size[0] * size[1]
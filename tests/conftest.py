@@ -20,6 +20,7 @@ SAVE_OPTIONS = {
     },
     "JPEG": {"format": "JPEG", "optimize": True, "quality": 75},
     "PNG": {"format": "PNG", "optimize": True},
+    "WEBP": {"format": "WEBP", "save_all": True, "quality": 80, "method": 4},
 }
 
 
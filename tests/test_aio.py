@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import aio
+
+
+@pytest.fixture
+def image_name(tmp_path):
+    path = tmp_path / "image.png"
+    Image.new("RGB", (512, 512), (255, 0, 0)).save(path)
+    return str(path)
+
+
+def test_get_palette_and_resize(image_name):
+    async def main():
+        async with aio.AsyncImageService(max_concurrency=2) as service:
+            return await asyncio.gather(
+                service.get_palette(image_name, top_n=1), service.resize(image_name)
+            )
+
+    (dominant_color, sorted_palette), resized = asyncio.run(main())
+
+    assert dominant_color == "#ff0000"
+    assert sorted_palette == ["#ff0000"]
+    with Image.open(resized[1]) as image:
+        assert image.size == (128, 128)
+
+
+def test_queue_full():
+    event = threading.Event()
+
+    async def main():
+        async with aio.AsyncImageService(max_concurrency=1, max_queue=1) as service:
+            running = asyncio.ensure_future(service.run(event.wait))
+            queued = asyncio.ensure_future(service.run(event.wait))
+            await asyncio.sleep(0.01)
+            assert (service.in_flight, service.waiting) == (1, 1)
+
+            with pytest.raises(aio.QueueFullError):
+                await service.run(event.wait)
+
+            event.set()
+            await asyncio.gather(running, queued)
+            assert (service.in_flight, service.waiting) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_timeout_keeps_slot_until_done():
+    event = threading.Event()
+
+    async def main():
+        async with aio.AsyncImageService(max_concurrency=1) as service:
+            with pytest.raises(asyncio.TimeoutError):
+                await service.run(event.wait, timeout=0.01)
+            # The job is still running in its thread
+            assert service.in_flight == 1
+
+            event.set()
+            assert await service.run(sum, [1, 2], timeout=1) == 3
+            assert service.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_cancel_queued():
+    event = threading.Event()
+
+    async def main():
+        async with aio.AsyncImageService(max_concurrency=1) as service:
+            running = asyncio.ensure_future(service.run(event.wait))
+            queued = asyncio.ensure_future(service.run(BytesIO))
+            await asyncio.sleep(0.01)
+
+            queued.cancel()
+            await asyncio.sleep(0)
+            assert service.waiting == 0
+
+            event.set()
+            await running
+
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from PIL import Image
+
+import batch
+
+
+_process_image = batch.process_image
+
+
+def _process_or_crash(source, **process_options):
+    # Kills its worker like a segfault in a decoder would
+    if source.endswith("c.png"):
+        os._exit(1)
+    return _process_image(source, **process_options)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    Image.new("RGB", (64, 32), (255, 0, 0)).save(tmp_path / "a.jpg")
+    Image.new("RGBA", (32, 64), (0, 255, 0, 255)).save(tmp_path / "b.png")
+    (tmp_path / "c.png").write_bytes(b"not an image")
+    (tmp_path / "notes.txt").write_text("ignored")
+    return tmp_path
+
+
+def test_iter_sources(sources, tmp_path):
+    paths = list(batch.iter_sources(str(sources)))
+    assert [path.rsplit("/", 1)[1] for path in paths] == ["a.jpg", "b.png", "c.png"]
+
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("\n".join(paths[:2]) + "\n\n")
+    assert list(batch.iter_sources(str(manifest))) == paths[:2]
+
+
+def test_process_image(sources, tmp_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    result = batch.process_image(str(sources / "b.png"), str(output_dir))
+
+    assert result["dominant_color"] == "#00ff00"
+    assert result["outputs"] == [
+        str(output_dir / "b_256x256.jpg"),
+        str(output_dir / "b_128x128.jpg"),
+    ]
+    with Image.open(result["outputs"][1]) as image:
+        assert image.size == (128, 128)
+
+
+def test_process_image_drafts_jpeg(mocker, tmp_path):
+    Image.new("RGB", (2048, 2048), (0, 0, 255)).save(tmp_path / "big.jpg")
+    open_image = mocker.spy(batch.Image, "open")
+
+    result = batch.process_image(str(tmp_path / "big.jpg"), sizes=[(256, 256)])
+
+    assert result["dominant_color"] == "#0000fe"
+    # Drafted for the resize, the palette only loads it afterwards
+    assert open_image.spy_return.size == (1024, 1024)
+
+
+def test_process_image_translucent_animation(tmp_path):
+    frames = [Image.new("RGBA", (64, 32), (255, 0, 0, alpha)) for alpha in (128, 255)]
+    frames[1].putpixel((0, 0), (0, 0, 255, 200))
+    frames[0].save(tmp_path / "a.webp", save_all=True, append_images=frames[1:])
+
+    result = batch.process_image(str(tmp_path / "a.webp"))
+
+    assert "error" not in result
+    assert len(result["outputs"]) == 2
+
+
+def test_process_image_error(sources):
+    result = batch.process_image(str(sources / "c.png"))
+    assert result["error"].startswith("UnidentifiedImageError")
+
+
+def test_process_image_unsupported_mode(tmp_path):
+    Image.new("L", (8, 8)).save(tmp_path / "gray.png")
+    result = batch.process_image(str(tmp_path / "gray.png"))
+
+    assert result["error"] == "Exception: Unsupported image type: PNG/L."
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_run_batch(sources, ordered):
+    results = list(
+        batch.run_batch(
+            batch.iter_sources(str(sources)),
+            workers=2,
+            ordered=ordered,
+            max_in_flight=2,
+            sizes=[(16, 16)],
+        )
+    )
+    by_source = {result["source"].rsplit("/", 1)[1]: result for result in results}
+
+    if ordered:
+        assert list(by_source) == ["a.jpg", "b.png", "c.png"]
+    assert by_source["a.jpg"]["dominant_color"] == "#fe0000"
+    assert len(by_source["b.png"]["outputs"]) == 1
+    assert "error" in by_source["c.png"]
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_run_batch_crashed_worker(mocker, sources, ordered):
+    mocker.patch("batch.process_image", _process_or_crash)
+    paths = [str(sources / name) for name in ["a.jpg", "c.png", "b.png", "a.jpg"]]
+
+    results = list(
+        batch.run_batch(
+            paths, workers=2, ordered=ordered, max_in_flight=2, sizes=[(16, 16)]
+        )
+    )
+
+    errors = [result["source"] for result in results if "error" in result]
+    assert errors == [paths[1]]
+    assert len(results) == 4
+
+
+def test_parse_size():
+    assert batch.parse_size("256x128") == (256, 128)
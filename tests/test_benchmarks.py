@@ -0,0 +1,59 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from benchmarks import inputs, runner
+from example_settings import SUPPORTED_IMAGES
+from image.category import CategoryProxy
+
+
+@pytest.mark.parametrize(
+    "category, format_mode",
+    [
+        *(("STATIC", format_mode) for format_mode in inputs.STATIC_INPUTS),
+        *(("ANIMATED", format_mode) for format_mode in inputs.ANIMATED_INPUTS),
+    ],
+)
+def test_make_input(category, format_mode):
+    data = inputs.make_input(category, format_mode, (64, 32), frames=3)
+
+    with Image.open(BytesIO(data)) as image:
+        profile = CategoryProxy(image, SUPPORTED_IMAGES).get_profile()
+        assert profile.name == format_mode  # type: ignore
+        assert image.size == (64, 32)
+
+
+def test_get_cases():
+    cases = runner.get_cases([(64, 32)], [2, 4], ["palette", "optimize"])
+    names = [runner.get_case_name(case) for case in cases]
+
+    assert "STATIC/PNG_RGB/64x32/optimize" in names
+    assert "ANIMATED/WEBP_RGB/64x32/4f/palette" in names
+    # Nothing to optimize for a JPEG or an animated GIF
+    assert "STATIC/JPEG_RGB/64x32/optimize" not in names
+    assert "ANIMATED/GIF_P/64x32/2f/optimize" not in names
+    assert len(names) == len(set(names))
+
+
+def test_compare():
+    baseline = {"results": {"a": {"wall": 1.0}, "b": {"wall": 2.0}}}
+    results = {
+        "results": {"a": {"wall": 1.1}, "b": {"wall": 3.0}, "c": {"wall": 9.0}}
+    }
+
+    assert runner.compare(results, baseline, 0.2) == [
+        "b: wall 2.0000 -> 3.0000 (+50%)"
+    ]
+    assert len(runner.compare(results, baseline, 0.05)) == 2
+
+
+@pytest.mark.parametrize("platform, max_rss_kb", [["linux", 2048], ["darwin", 2]])
+def test_get_max_rss(mocker, platform, max_rss_kb):
+    mocker.patch("benchmarks.runner.sys.platform", platform)
+    mocker.patch(
+        "benchmarks.runner.resource.getrusage",
+        return_value=mocker.Mock(ru_maxrss=2048),
+    )
+
+    assert runner._get_max_rss() == max_rss_kb
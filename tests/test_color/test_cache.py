@@ -0,0 +1,90 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from color import cache, cluster, palette
+
+
+def test_get_file_digest(tmp_path):
+    path = tmp_path / "image.bin"
+    path.write_bytes(b"wallpaper")
+    file = BytesIO(b"xwallpaper")
+    file.seek(1)
+
+    assert cache.get_file_digest(path) == cache.get_file_digest(file)
+    assert file.tell() == 1
+
+
+def test_get_image_digest():
+    image = Image.new("RGB", (2, 2), (1, 2, 3))
+
+    assert cache.get_image_digest(image) == cache.get_image_digest(image.copy())
+    assert cache.get_image_digest(image) != cache.get_image_digest(
+        image.convert("RGBA")
+    )
+
+
+def test_get_cache_key():
+    key = cache.get_cache_key(
+        "abc", cluster.SortedColorCluster, palette.HexRGB, False, 256
+    )
+    assert key == "abc:SortedColorCluster:HexRGB:0:256"
+
+
+class TestPaletteCache:
+    def test_lru_eviction(self):
+        palette_cache = cache.PaletteCache(max_size=2)
+        palette_cache.set("a", ["#000000"])
+        palette_cache.set("b", ["#111111"])
+        palette_cache.get("a")
+        palette_cache.set("c", ["#222222"])
+
+        assert palette_cache.get("a") == ["#000000"]
+        assert palette_cache.get("b") is None
+        assert palette_cache.get("c") == ["#222222"]
+
+    def test_get_copy(self):
+        palette_cache = cache.PaletteCache()
+        palette = ["#000000"]
+        palette_cache.set("a", palette)
+
+        palette.append("#111111")
+        palette_cache.get("a").append("#222222")
+
+        assert palette_cache.get("a") == ["#000000"]
+
+    def test_persistence(self, tmp_path):
+        path = str(tmp_path / "palettes")
+
+        with cache.PaletteCache(path=path) as palette_cache:
+            palette_cache.set("a", [(1, 2, 3)])
+
+        with cache.PaletteCache(path=path) as palette_cache:
+            assert palette_cache.get("a") == [(1, 2, 3)]
+
+
+class TestCachedColorCluster:
+    @pytest.fixture
+    def color_cluster(self):
+        image = Image.new("RGB", (2, 1))
+        image.putdata([(1, 2, 3), (4, 5, 6)])
+        return cluster.SortedColorCluster(palette.HexRGB(image))
+
+    def test_get_palette(self, mocker, color_cluster):
+        get_palette = mocker.spy(color_cluster, "get_palette")
+        cached_cluster = cache.CachedColorCluster(color_cluster, cache.PaletteCache())
+
+        assert cached_cluster.get_palette() == ["#010203", "#040506"]
+        assert cached_cluster.get_palette(top_n=1) == ["#010203"]
+        get_palette.assert_called_once()
+
+    def test_get_palette_key(self, mocker):
+        palette_cache = cache.PaletteCache()
+        palette_cache.set("key", ["#ffffff"])
+        color_cluster = mocker.Mock()
+
+        cached_cluster = cache.CachedColorCluster(color_cluster, palette_cache, "key")
+
+        assert cached_cluster.get_palette() == ["#ffffff"]
+        color_cluster.get_palette.assert_not_called()
@@ -1,13 +1,145 @@
-from color import cluster
+import pytest
+from PIL import Image
+
+from color import cluster, palette, utils
 
 
 def test_sorted_color_cluster(mocker):
+    color = mocker.Mock(
+        get_packed_colors=lambda: [3, 3, 3, 1, 2, 1],
+        structure_packed_palette=lambda colors: map(
+            {1: "red", 2: "white", 3: "blue"}.get, colors
+        ),
+    )
+
+    color_cluster = cluster.SortedColorCluster(color)
+    palette = color_cluster.get_palette()
+
+    assert palette == ["blue", "red", "white"]
+
+
+class TestSortedColorClusterTopN:
+    @pytest.fixture
+    def color(self, mocker):
+        return mocker.Mock(
+            get_packed_colors=lambda: [3, 1, 2, 3, 1, 3],
+            structure_packed_palette=lambda colors: map(
+                {1: "red", 2: "white", 3: "blue"}.get, colors
+            ),
+        )
+
+    @pytest.mark.parametrize(
+        "top_n, palette",
+        [[None, ["blue", "red", "white"]], [2, ["blue", "red"]], [0, []]],
+    )
+    def test_get_palette(self, color, top_n, palette):
+        color_cluster = cluster.SortedColorCluster(color)
+        assert color_cluster.get_palette(top_n) == palette
+
+    def test_get_dominant_color(self, color):
+        color_cluster = cluster.SortedColorCluster(color)
+        assert color_cluster.get_dominant_color() == "blue"
+
+    def test_get_color_palette(self, color):
+        color_cluster = cluster.SortedColorCluster(color)
+        color_palette = color_cluster.get_color_palette(top_n=2)
+
+        assert color_palette.colors == ["blue", "red"]
+        assert list(color_palette.counts) == [3, 2]
+        assert color_palette.proportions == [0.5, 2 / 6]
+
+
+def test_sorted_color_cluster_reference(mocker):
     color = mocker.Mock(
         get_color_bands=lambda: [],
         structure_palette=lambda _: ["blue", "blue", "blue", "red", "white", "red"],
     )
 
     color_cluster = cluster.SortedColorCluster(color)
-    palette = color_cluster.get_palette()
+    palette = color_cluster.get_reference_palette()
 
     assert palette == ["blue", "red", "white"]
+
+
+@pytest.mark.parametrize(
+    "color_class", [palette.HexRGB, palette.RGB, palette.HSL, palette.HSV, palette.Lab]
+)
+@pytest.mark.parametrize(
+    "mode, alpha", [["RGB", False], ["RGBA", False], ["RGBA", True]]
+)
+def test_sorted_color_cluster_matches_reference(color_class, mode, alpha):
+    image = Image.new(mode, (4, 4))
+    image.putdata([(i % 3 * 100, i % 5 * 50, 7, 255 - i % 2) for i in range(16)])
+    color_cluster = cluster.SortedColorCluster(color_class(image, alpha))
+
+    assert color_cluster.get_palette() == color_cluster.get_reference_palette()
+
+
+@pytest.mark.parametrize("color_class", [palette.HSL, palette.HSV, palette.Lab])
+def test_sorted_color_cluster_merges_rounded_colors(color_class):
+    # Distinct RGB colors that round to the same converted color
+    image = Image.new("RGB", (4, 1))
+    image.putdata([(0, 0, 0), (1, 1, 1), (1, 1, 1), (2, 2, 2)])
+    color_cluster = cluster.SortedColorCluster(color_class(image))
+    color_palette = color_cluster.get_color_palette()
+
+    assert color_palette.colors == color_cluster.get_reference_palette()
+    assert len(set(color_palette.colors)) == len(color_palette)
+    assert sum(color_palette.counts) == color_palette.total == 4
+    assert color_cluster.get_palette(top_n=1) == color_palette.colors[:1]
+
+
+class TestMedianCutColorCluster:
+    @pytest.fixture
+    def image(self):
+        image = Image.new("RGBA", (10, 10), (255, 0, 0, 255))
+        image.paste((0, 0, 255, 0), (0, 0, 3, 10))
+        image.paste((0, 255, 0, 255), (3, 0, 4, 10))
+        return image
+
+    def test_get_weighted_palette(self, image):
+        color_cluster = cluster.MedianCutColorCluster(palette.HexRGB(image))
+
+        assert color_cluster.get_weighted_palette() == [
+            ("#ff0000", 60),
+            ("#0000ff", 30),
+            ("#00ff00", 10),
+        ]
+
+    def test_get_weighted_palette_alpha(self, image):
+        color = palette.RGB(image, alpha=True)
+        color_cluster = cluster.MedianCutColorCluster(color)
+
+        assert color_cluster.get_weighted_palette() == [
+            ((255, 0, 0, 255), 60),
+            ((0, 0, 255, 0), 30),
+            ((0, 255, 0, 255), 10),
+        ]
+
+    def test_get_color_palette(self, image):
+        color_cluster = cluster.MedianCutColorCluster(palette.HexRGB(image))
+        color_palette = color_cluster.get_color_palette()
+
+        assert color_palette.colors == ["#ff0000", "#0000ff", "#00ff00"]
+        assert list(color_palette.counts) == [60, 30, 10]
+        assert color_palette.proportions == [0.6, 0.3, 0.1]
+
+    def test_get_palette_colors(self, image):
+        color = palette.RGB(image)
+        color_cluster = cluster.MedianCutColorCluster(color, colors=2, iterations=0)
+
+        assert color_cluster.get_palette() == [(255, 0, 0), (0, 64, 191)]
+
+    def test_get_palette_time_budget(self, image):
+        color = palette.RGB(image)
+        color_cluster = cluster.MedianCutColorCluster(color, time_budget=0)
+
+        assert color_cluster.get_weighted_palette() == [((153, 26, 76), 100)]
+
+    def test_get_buckets(self, mocker):
+        packed_colors = [utils.pack_rgb_or_rgba(color) for color in [(1, 2, 3)] * 2]
+        packed_colors.append(utils.pack_rgb_or_rgba((4, 5, 6)))
+        color = mocker.Mock(alpha=0, get_packed_colors=lambda _: packed_colors)
+        color_cluster = cluster.MedianCutColorCluster(color)
+
+        assert color_cluster.get_buckets() == [((1, 2, 3), 2), ((4, 5, 6), 1)]
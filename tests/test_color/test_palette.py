@@ -1,4 +1,5 @@
 import pytest
+from PIL import Image
 
 from color import palette
 
@@ -34,3 +35,72 @@ class TestRGB:
         color = palette.RGB(mocker.Mock(), alpha)
         p = list(color.structure_palette(rgba_bands[: 3 + 1 if alpha else 3]))
         assert p == [(1, 1, 1, 1), (2, 2, 2, 2)] if alpha else [(1, 1, 1), (2, 2, 2)]
+
+
+@pytest.mark.parametrize(
+    "color_class, alpha, structured_palette",
+    [
+        [palette.HexRGB, False, ["#010203", "#0a0b0c"]],
+        [palette.HexRGB, True, ["#01020304", "#0a0b0c0d"]],
+        [palette.RGB, False, [(1, 2, 3), (10, 11, 12)]],
+        [palette.RGB, True, [(1, 2, 3, 4), (10, 11, 12, 13)]],
+        [palette.HSL, False, [(210, 50, 1), (210, 9, 4)]],
+        [palette.HSL, True, [(210, 50, 1, 4), (210, 9, 4, 13)]],
+        [palette.HSV, False, [(209, 67, 1), (209, 16, 5)]],
+        [palette.HSV, True, [(209, 67, 1, 4), (209, 16, 5, 13)]],
+        [palette.Lab, False, [(0, 0, 0), (3, 0, -1)]],
+        [palette.Lab, True, [(0, 0, 0, 4), (3, 0, -1, 13)]],
+    ],
+)
+def test_packed_palette(color_class, alpha, structured_palette):
+    image = Image.new("RGBA", (2, 1))
+    image.putdata([(1, 2, 3, 4), (10, 11, 12, 13)])
+    color = color_class(image, alpha)
+
+    packed_colors = color.get_packed_colors()
+
+    assert len(packed_colors) == 2
+    assert list(color.structure_packed_palette(packed_colors)) == structured_palette
+
+
+def test_packed_palette_buckets():
+    image = Image.new("RGB", (2, 1))
+    image.putdata([(1, 2, 3), (6, 5, 4)])
+    color = palette.RGB(image)
+
+    packed_colors = color.get_packed_colors(bucket_bits=5)
+
+    assert list(color.structure_packed_palette(packed_colors)) == [(0, 0, 0)] * 2
+
+
+@pytest.mark.parametrize(
+    "color_class, structured_palette",
+    [
+        [palette.HSL, [(0, 100, 50), (120, 100, 50), (0, 0, 100)]],
+        [palette.HSV, [(0, 100, 100), (120, 100, 100), (0, 0, 100)]],
+        [palette.Lab, [(54, 81, 70), (88, -79, 81), (100, 0, 0)]],
+    ],
+)
+def test_converted_palette(color_class, structured_palette):
+    image = Image.new("RGB", (3, 1))
+    image.putdata([(255, 0, 0), (0, 255, 0), (255, 255, 255)])
+    color = color_class(image)
+
+    packed_colors = color.get_packed_colors()
+
+    assert list(color.structure_packed_palette(packed_colors)) == structured_palette
+    assert list(color.structure_palette(color.get_color_bands())) == (
+        structured_palette
+    )
+
+
+class TestColorPalette:
+    def test_counts(self):
+        color_palette = palette.ColorPalette(["#ffffff", "#000000"], [3, 1], 4)
+
+        assert len(color_palette) == 2
+        assert color_palette.counts.typecode == "Q"
+        assert color_palette.proportions == [0.75, 0.25]
+
+    def test_empty(self):
+        assert palette.ColorPalette([], [], 0).proportions == []
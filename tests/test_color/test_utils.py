@@ -1,6 +1,59 @@
+import sys
+
+import pytest
+
 from color import utils
 
 
 def test_rgb_or_rgba_to_hex():
     assert utils.rgb_or_rgba_to_hex((66, 135, 245)) == "#4287f5"
     assert utils.rgb_or_rgba_to_hex((4, 1, 255, 100)) == "#0401ff64"
+
+
+def test_unpack_rgb_or_rgba():
+    packed_color = int.from_bytes(bytes([4, 1, 255, 100]), sys.byteorder)
+
+    assert utils.unpack_rgb_or_rgba(packed_color) == bytes([4, 1, 255])
+    assert utils.unpack_rgb_or_rgba(packed_color, 1) == bytes([4, 1, 255, 100])
+
+
+def test_rgb_or_rgba_to_hsl():
+    assert utils.rgb_or_rgba_to_hsl((255, 0, 0)) == (0, 100, 50)
+    assert utils.rgb_or_rgba_to_hsl((0, 0, 255, 100)) == (240, 100, 50, 100)
+
+
+def test_scale_hsv():
+    assert utils.scale_hsv((170, 255, 0)) == (240, 100, 0)
+    assert utils.scale_hsv((255, 0, 255, 100)) == (0, 0, 100, 100)
+
+
+def test_scale_lab():
+    assert utils.scale_lab((255, 128, 128)) == (100, 0, 0)
+    assert utils.scale_lab((0, 0, 255, 100)) == (0, -128, 127, 100)
+
+
+@pytest.mark.parametrize(
+    "palette, divergence",
+    [
+        [["a", "b", "c"], 0.0],
+        [["b", "a", "c"], 2 / 6],
+        [["x", "y", "z"], 1.0],
+    ],
+)
+def test_get_ranking_divergence(palette, divergence):
+    reference_palette = ["a", "b", "c"]
+    assert utils.get_ranking_divergence(palette, reference_palette, 3) == divergence
+
+
+def test_pack_rgb_or_rgba():
+    packed_color = utils.pack_rgb_or_rgba((4, 1, 255))
+
+    assert utils.unpack_rgb_or_rgba(packed_color, 1) == bytes([4, 1, 255, 255])
+
+
+def test_get_bucket_lut():
+    lut = utils.get_bucket_lut(1)
+
+    assert len(lut) == 256
+    assert lut[0] == lut[127] == 0
+    assert lut[128] == lut[255] == 255
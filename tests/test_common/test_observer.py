@@ -0,0 +1,94 @@
+import tracemalloc
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from color import cluster, palette
+from common import observer
+from image import editor
+
+
+@pytest.fixture
+def events():
+    events = []
+    with observer.observing(events.append):
+        yield events
+
+
+def test_stage_without_observers():
+    with observer.stage("resize") as stage:
+        stage.pixels = 10
+    assert stage is observer.stage("convert")
+
+
+def test_stage(events):
+    image = Image.new("RGB", (4, 2))
+    output = BytesIO(b"12")
+    output.seek(2)
+
+    with observer.stage("encode", image, frames=3, output=output):
+        output.write(b"3456")
+
+    [event] = events
+    assert event.stage == "encode"
+    assert event.duration >= 0
+    assert (event.pixels, event.frames, event.bytes_written) == (8, 3, 4)
+    assert event.memory_peak is None
+
+
+def test_stage_memory_peak(events):
+    tracemalloc.start()
+    try:
+        with observer.stage("outer"):
+            with observer.stage("inner"):
+                data = bytearray(1_000_000)
+            del data
+    finally:
+        tracemalloc.stop()
+
+    inner, outer = events
+    assert inner.memory_peak >= 1_000_000
+    assert outer.memory_peak >= inner.memory_peak
+
+
+def test_editor_stages(events):
+    image = Image.new("RGBA", (32, 16))
+    _editor = editor.StaticEditor(image)
+    _editor.convert_mode("RGB")
+    _editor.resize((8, 4), 1, 3)
+    output = BytesIO()
+    _editor.save(output, format="PNG")
+
+    assert [event.stage for event in events] == [
+        "decode",
+        "convert",
+        "resize",
+        "encode",
+    ]
+    assert [event.pixels for event in events] == [512, 512, 512, 32]
+    assert events[-1].bytes_written == len(output.getvalue())
+
+
+def test_palette_count_stage(events):
+    image = Image.new("RGB", (4, 4), (255, 0, 0))
+    cluster.SortedColorCluster(palette.HexRGB(image)).get_palette()
+
+    [event] = events
+    assert (event.stage, event.pixels) == ("palette_count", 16)
+
+
+def test_histogram_exporter():
+    exporter = observer.HistogramExporter(buckets=(0.01, 0.1))
+    for duration in [0.005, 0.05, 0.05, 1.0]:
+        exporter(observer.StageEvent("resize", duration, 100, 1, 10, None))
+    exporter(observer.StageEvent("encode", 0.01, 100, 2, 0, 2048))
+
+    histograms = exporter.get_histograms()
+    assert histograms["resize"]["count"] == 4
+    assert histograms["resize"]["sum"] == pytest.approx(1.105)
+    assert histograms["resize"]["buckets"] == {"0.01": 1, "0.1": 3, "+Inf": 4}
+    assert histograms["resize"]["bytes_written"] == 40
+    assert histograms["resize"]["memory_peak"] is None
+    assert histograms["encode"]["buckets"] == {"0.01": 1, "0.1": 1, "+Inf": 1}
+    assert histograms["encode"]["memory_peak"] == 2048
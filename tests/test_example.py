@@ -0,0 +1,32 @@
+import copy
+
+import pytest
+from PIL import Image
+
+import example
+from image import derivative
+
+
+@pytest.fixture
+def animation(tmp_path):
+    frames = [Image.new("RGB", (64, 32), (index * 60, 0, 0)) for index in range(3)]
+    path = tmp_path / "a.gif"
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=50)
+    return str(path)
+
+
+def test_resize_derivative_store(mocker, tmp_path, animation):
+    store = derivative.DerivativeStore(str(tmp_path / "derivatives"))
+    example.resize(animation, store)
+    open_image = mocker.spy(example.Image, "open")
+
+    for file in example.resize(animation, store):
+        file.close()
+    open_image.assert_not_called()
+
+    # The ladder comes from the optimized image, new optimize options miss
+    save_options = copy.deepcopy(example.SAVE_OPTIONS)
+    save_options["JPEG"]["quality"] = 50
+    mocker.patch.object(example, "SAVE_OPTIONS", save_options)
+    example.resize(animation, store)
+    open_image.assert_called()
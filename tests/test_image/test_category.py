@@ -1,6 +1,6 @@
 import pytest
 
-from image import category
+from image import category, probe
 
 
 def test_static_category(mocker):
@@ -63,3 +63,9 @@ class TestImageCategoryProxy:
 
         assert _profile is proxy._image_profile
         assert _profile_2 is _profile
+
+    def test_probe(self, mocker):
+        image = mocker.Mock()
+        proxy = category.CategoryProxy(image, {})
+
+        assert proxy._probe is probe.get_probe(image)
@@ -0,0 +1,164 @@
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from image import derivative
+from image.editor import StaticEditor
+
+
+@pytest.fixture
+def resize_save_options():
+    return [
+        {
+            "resize": {"size": size, "resample": 1, "reducing_gap": 3},
+            "save": {"format": "PNG"},
+        }
+        for size in [(64, 32), (16, 8)]
+    ]
+
+
+@pytest.fixture
+def image():
+    return Image.linear_gradient("L").convert("RGB").resize((128, 64))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return derivative.DerivativeStore(str(tmp_path / "derivatives"))
+
+
+def test_get_options_digest():
+    digest = derivative.get_options_digest({"a": 1, "b": (2, 3)})
+
+    assert digest == derivative.get_options_digest({"b": [2, 3], "a": 1})
+    assert digest != derivative.get_options_digest({"a": 1, "b": (3, 2)})
+
+
+def test_get_derivative_key():
+    key = derivative.get_derivative_key("digest", "PNG_RGB", {"a": 1})
+
+    assert key != derivative.get_derivative_key("other", "PNG_RGB", {"a": 1})
+    assert key != derivative.get_derivative_key("digest", "PNG_RGBA", {"a": 1})
+
+
+class TestDerivativeStore:
+    def test_get_set(self, store):
+        assert store.get("key") is None
+
+        store.set("key", b"data")
+
+        with store.get("key") as file:
+            assert file.read() == b"data"
+        assert store.size == 4
+        assert os.listdir(store.directory) == ["key"]
+
+    def test_lru_eviction(self, tmp_path):
+        store = derivative.DerivativeStore(str(tmp_path), max_size=8)
+        store.set("a", b"aaa")
+        store.set("b", b"bbb")
+        store.get("a").close()
+
+        store.set("c", b"ccc")
+
+        assert "a" in store and "c" in store and "b" not in store
+        assert store.size == 6
+        assert sorted(os.listdir(tmp_path)) == ["a", "c"]
+
+    def test_load(self, tmp_path):
+        store = derivative.DerivativeStore(str(tmp_path))
+        store.set("a", b"aaa")
+        (tmp_path / ".tmp-partial").write_bytes(b"x")
+
+        store = derivative.DerivativeStore(str(tmp_path))
+
+        assert len(store) == 1 and store.size == 3
+        assert os.listdir(tmp_path) == ["a"]
+
+    def test_get_removed(self, store):
+        store.set("key", b"data")
+        os.remove(os.path.join(store.directory, "key"))
+
+        assert store.get("key") is None
+        assert store.size == 0
+
+
+def test_optimize(mocker, store):
+    profile = mocker.Mock()
+    profile.name = "PNG_RGB"
+    profile.optimize.side_effect = lambda output, _: output.write(b"optimized")
+
+    for _ in range(2):
+        output = BytesIO()
+        derivative.optimize(profile, output, {"PNG": {}}, "digest", store)
+        assert output.getvalue() == b"optimized"
+
+    profile.optimize.assert_called_once()
+
+
+def test_bulk_resize(mocker, store, image, resize_save_options):
+    bulk_resize = mocker.spy(derivative.utils, "bulk_resize")
+
+    outputs = [
+        list(
+            derivative.bulk_resize(
+                StaticEditor(image), resize_save_options, "digest", store, "PNG_RGB"
+            )
+        )
+        for _ in range(2)
+    ]
+
+    bulk_resize.assert_called_once()
+    with Image.open(outputs[1][1]) as resized_image:
+        assert resized_image.size == (16, 8)
+    for resized, cached in zip(*outputs):
+        resized.seek(0)
+        cached.seek(0)
+        assert resized.read() == cached.read()
+        cached.close()
+
+
+def test_bulk_resize_stopped_early(mocker, store, image, resize_save_options):
+    list(derivative.bulk_resize(StaticEditor(image), resize_save_options, "d", store))
+    get = mocker.spy(store, "get")
+
+    resized = derivative.bulk_resize(
+        StaticEditor(image), resize_save_options, "d", store
+    )
+    next(resized).close()
+    resized.close()
+
+    assert [file.closed for file in get.spy_return_list] == [True, True]
+
+
+def test_get_cached_partial(mocker, store):
+    store.set("a", b"a")
+    get = mocker.spy(store, "get")
+
+    assert derivative.get_cached(store, ["a", "b"]) is None
+    assert get.spy_return_list[0].closed
+
+
+def test_bulk_resize_partial_hit(mocker, store, image, resize_save_options):
+    list(derivative.bulk_resize(StaticEditor(image), resize_save_options, "d", store))
+    store.clear()
+    bulk_resize = mocker.spy(derivative.utils, "bulk_resize")
+
+    resized = list(
+        derivative.bulk_resize(StaticEditor(image), resize_save_options, "d", store)
+    )
+
+    bulk_resize.assert_called_once()
+    assert len(resized) == 2 and len(store) == 2
+
+
+def test_bulk_resize_cascade_key(store, image, resize_save_options):
+    list(derivative.bulk_resize(StaticEditor(image), resize_save_options, "d", store))
+    list(
+        derivative.bulk_resize(
+            StaticEditor(image), resize_save_options, "d", store, cascade=True
+        )
+    )
+
+    assert len(store) == 4
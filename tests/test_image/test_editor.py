@@ -1,6 +1,12 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
 import pytest
+from PIL import Image, ImageSequence
 
-from image import editor
+from common import observer
+from image import editor, quality
 
 
 class TestStaticImageEditor:
@@ -24,6 +30,33 @@ class TestStaticImageEditor:
 
         image.resize.assert_called_with(**editor_options["resize"])
 
+    def test_resize_cascade(self, mocker, editor_options):
+        image = mocker.Mock()
+        _editor = editor.StaticEditor(image)
+        _editor.resize(**editor_options["resize"])
+        _editor.resize(**editor_options["resize"], cascade=True)
+
+        image.resize.assert_called_once_with(**editor_options["resize"])
+        image.resize().resize.assert_called_with(**editor_options["resize"])
+
+    @pytest.mark.parametrize(
+        "resized_size, can_cascade",
+        [[None, False], [(511, 600), False], [(512, 512), True]],
+    )
+    def test_can_cascade(self, mocker, resized_size, can_cascade):
+        _editor = editor.StaticEditor(mocker.Mock())
+        if resized_size:
+            _editor._resized_image = mocker.Mock(size=resized_size)
+
+        assert _editor.can_cascade((256, 256), 2) is can_cascade
+
+    def test_convert_mode_resets_cascade(self):
+        _editor = editor.StaticEditor(Image.new("RGB", (64, 32)))
+        _editor.resize((32, 16), 1, 2)
+        _editor.convert_mode("L")
+
+        assert not _editor.can_cascade((8, 4), 2)
+
     def test_save(self, mocker, editor_options):
         fp = mocker.Mock()
 
@@ -33,21 +66,219 @@ class TestStaticImageEditor:
 
         edited_image.save.assert_called_with(fp, **editor_options["save"])
 
+    def test_bulk_save(self, mocker, editor_options):
+        _editor = editor.StaticEditor(mocker.Mock())
+        resize = mocker.patch.object(_editor, "resize")
+        save = mocker.patch.object(_editor, "save")
+        outputs = [mocker.Mock(), mocker.Mock()]
+
+        _editor.bulk_save(outputs, [editor_options, editor_options])
+
+        resize.assert_called_with(**editor_options["resize"])
+        save.assert_called_with(outputs[1], **editor_options["save"])
+        assert save.call_count == 2
+
+
+class TestLazyStaticEditor:
+    def test_convert_mode_then_resize(self):
+        _editor = editor.LazyStaticEditor(Image.new("RGBA", (64, 32)))
+        _editor.convert_mode("RGB")
+        _editor.resize((16, 8), 1, 2)
+        output = BytesIO()
+        _editor.save(output, format="PNG")
+
+        with Image.open(output) as image:
+            assert (image.mode, image.size) == ("RGB", (16, 8))
+
+    @pytest.mark.parametrize(
+        "mode, converted_mode, size, resized_first",
+        [
+            ["CMYK", "RGB", (16, 8), True],
+            ["RGB", "RGBA", (16, 8), True],
+            ["RGBA", "RGB", (16, 8), False],
+            ["CMYK", "RGB", (128, 64), False],
+            ["P", "RGB", (16, 8), False],
+        ],
+    )
+    def test_plan(self, mocker, mode, converted_mode, size, resized_first):
+        image = mocker.Mock(mode=mode, width=64, height=32)
+        _editor = editor.LazyStaticEditor(image)
+        _editor.convert_mode(converted_mode)
+        _editor.resize(size, 1, 2)
+
+        image.convert.assert_not_called()
+        image.resize.assert_not_called()
+        _editor.save(mocker.Mock(), format="JPEG")
+
+        if resized_first:
+            image.resize.assert_called_with(size=size, resample=1, reducing_gap=2)
+            image.resize().convert.assert_called_with(mode=converted_mode)
+        else:
+            image.convert.assert_called_with(mode=converted_mode)
+            image.convert().resize.assert_called_with(
+                size=size, resample=1, reducing_gap=2
+            )
+
+    @pytest.mark.parametrize("size", [(16, 16), (128, 128)])
+    def test_transparent_color(self, size):
+        # The color under a transparent pixel is kept, as by an eager convert
+        image = Image.new("RGBA", (64, 64), (0, 0, 255, 255))
+        image.paste((255, 0, 0, 0), (0, 0, 32, 64))
+        _editor = editor.LazyStaticEditor(image)
+        _editor.convert_mode("RGB")
+        _editor.resize(size, 1, 2)
+
+        assert _editor._run_plan().getpixel((0, 0)) == (255, 0, 0)
+
+    def test_save_runs_plan_once(self, mocker):
+        image = mocker.Mock(mode="RGB", width=64, height=32)
+        _editor = editor.LazyStaticEditor(image)
+        _editor.resize((16, 8), 1, 2)
+        _editor.save(mocker.Mock(), format="JPEG")
+        _editor.save(mocker.Mock(), format="PNG")
+
+        image.resize.assert_called_once()
+        image.convert.assert_not_called()
+
+    def test_resize_cascade(self):
+        _editor = editor.LazyStaticEditor(Image.new("RGB", (64, 32)))
+        _editor.resize((32, 16), 1, 2)
+        _editor.save(BytesIO(), format="PNG")
+        resized_image = _editor._resized_image
+
+        assert _editor.can_cascade((16, 8), 2)
+        _editor.resize((16, 8), 1, 2, cascade=True)
+        assert _editor._run_plan().size == (16, 8)
+        assert _editor._resized_image is not resized_image
+
+
+class TestStaticEditorDecodePlan:
+    @pytest.fixture
+    def jpeg(self):
+        output = BytesIO()
+        image = Image.effect_mandelbrot((1024, 768), (-2, -1.5, 1, 1.5), 64)
+        image.convert("RGB").save(output, format="JPEG", quality=90)
+        return output
+
+    def test_resize_drafts(self, jpeg):
+        image = Image.open(jpeg)
+        _editor = editor.StaticEditor(image)
+        _editor.plan_decode((64, 48), None)
+        _editor.resize((64, 48), 1, None)
+
+        assert image.size == (128, 96)
+        assert _editor._processed_image.size == (64, 48)
+
+    def test_resize_unplanned(self, jpeg):
+        image = Image.open(jpeg)
+        _editor = editor.StaticEditor(image)
+        _editor.resize((64, 48), 1, None)
+
+        assert image.size == (1024, 768)
+
+    def test_resize_quality(self, jpeg):
+        _editor = editor.StaticEditor(Image.open(jpeg))
+        _editor.plan_decode((128, 96), None)
+        _editor.resize((128, 96), 1, None)
+        output = BytesIO()
+        _editor.save(output, format="PNG")
+
+        with Image.open(jpeg) as image:
+            expected = image.resize((128, 96), 1)
+        assert quality.get_psnr(expected, output) >= 40
+
+    def test_plan_decode_largest(self, jpeg):
+        image = Image.open(jpeg)
+        _editor = editor.StaticEditor(image)
+        _editor.plan_decode((256, 192), 2)
+        _editor.plan_decode((64, 48), 2)
+        _editor.resize((64, 48), 1, 2)
+
+        assert image.size == (512, 384)
+
+    def test_convert_mode_full_decode(self, jpeg):
+        image = Image.open(jpeg)
+        _editor = editor.StaticEditor(image)
+        _editor.plan_decode((64, 48), 2)
+        _editor.convert_mode("L")
+
+        assert image.size == (1024, 768)
+
+
+class TestStaticEditorMemoryBudget:
+    @pytest.fixture
+    def jpeg(self):
+        output = BytesIO()
+        Image.linear_gradient("L").resize((512, 256)).save(output, format="JPEG")
+        return Image.open(output)
+
+    def test_resize_in_strips(self, mocker):
+        image = Image.linear_gradient("L").convert("RGB").resize((256, 128))
+        resize_in_strips = mocker.spy(editor.utils, "resize_in_strips")
+        _editor = editor.StaticEditor(image)
+        _editor.set_memory_budget(200_000)
+
+        _editor.resize((64, 32), 2, 2)
+
+        assert resize_in_strips.call_args.args[-1] < 32
+        assert _editor._processed_image.size == (64, 32)
+
+    def test_draft(self, jpeg):
+        _editor = editor.StaticEditor(jpeg)
+        _editor.set_memory_budget(20_000)
+        _editor.resize((32, 16), 2, 2)
+
+        assert jpeg.size == (128, 64)
+        assert _editor._processed_image.size == (32, 16)
+
+    def test_refuse_resize(self, jpeg):
+        _editor = editor.StaticEditor(jpeg)
+        _editor.set_memory_budget(10_000)
+
+        with pytest.raises(editor.MemoryBudgetError):
+            _editor.resize((256, 128), 2, 2)
+
+    def test_refuse_decode(self):
+        _editor = editor.StaticEditor(Image.new("RGB", (512, 256)))
+        _editor.set_memory_budget(150_000)
+
+        with pytest.raises(editor.MemoryBudgetError):
+            _editor.resize((256, 128), 2, 2)
+
+    def test_refuse_convert(self):
+        _editor = editor.StaticEditor(Image.new("L", (100, 100)))
+        _editor.set_memory_budget(30_000)
+
+        with pytest.raises(editor.MemoryBudgetError):
+            _editor.convert_mode("RGB")
+
+    def test_lazy_convert_mode_then_resize(self):
+        _editor = editor.LazyStaticEditor(Image.new("RGBA", (256, 128)))
+        _editor.set_memory_budget(400_000)
+        _editor.convert_mode("RGB")
+        _editor.resize((64, 32), 1, 2)
+
+        assert _editor._run_plan().mode == "RGB"
+        assert _editor._run_plan().size == (64, 32)
+
 
 class TestAnimatedImageEditor:
     @pytest.mark.parametrize(
-        "mode, _info, extrema, _actual_mode",
+        "mode, _info, alpha, _actual_mode",
         [
-            ["P", {}, 0, "RGB"],
-            ["P", {"transparency": 1}, 0, "RGBA"],
-            ["RGBA", {}, [(), (), (), (255, 255)], "RGB"],
-            ["RGBA", {}, [(), (), (), (0, 255)], "RGBA"],
+            ["P", {}, None, "RGB"],
+            ["P", {"transparency": 1}, None, "RGBA"],
+            ["RGBA", {}, 255, "RGB"],
+            ["RGBA", {}, 0, "RGBA"],
         ],
     )
-    def test_actual_mode(self, mocker, mode, _info, extrema, _actual_mode):
-        _editor = editor.AnimatedEditor(
-            mocker.Mock(mode=mode, getextrema=lambda: extrema, info=_info)
+    def test_actual_mode(self, mocker, mode, _info, alpha, _actual_mode):
+        image = (
+            mocker.Mock(mode=mode, info=_info)
+            if alpha is None
+            else Image.new(mode, (2, 2), (0, 0, 0, alpha))
         )
+        _editor = editor.AnimatedEditor(image)
         assert _editor.actual_mode == _actual_mode
 
     def test_convert_mode(self, mocker):
@@ -93,7 +324,12 @@ class TestAnimatedImageEditor:
 
     def test_save(self, mocker, editor_options):
         editor_options["save"].update({"save_all": True})
-        image_1, image_2 = mocker.Mock(), mocker.Mock()
+        image_1, image_2 = [
+            mocker.Mock(
+                width=2, height=2, getbands=lambda: "RGB", info={"duration": 40}
+            )
+            for _ in range(2)
+        ]
         mocker.patch("image.editor.AnimatedEditor._find_actual_mode", lambda _: "RGB")
         mocker.patch("image.editor.AnimatedEditor.convert_mode")
         output = mocker.Mock()
@@ -102,5 +338,388 @@ class TestAnimatedImageEditor:
         _editor._processed_frames = (_ for _ in [image_1, image_2])
         _editor.save(output, **editor_options["save"])
 
-        editor_options["save"].update({"append_images": [image_2]})
+        # WebP only reads the 1st frame's duration, so they're all passed
+        editor_options["save"].update(
+            {"append_images": [image_2], "duration": [40, 40]}
+        )
         image_1.save.assert_called_with(output, **editor_options["save"])
+        assert _editor.save_stats == {"frames": 2, "peak_held_bytes": 24}
+
+    def test_save_stream(self, mocker):
+        save_gif_stream = mocker.patch("image.utils.save_gif_stream")
+        mocker.patch("image.editor.AnimatedEditor._find_actual_mode", lambda _: "RGB")
+        frames = (_ for _ in [mocker.Mock()])
+        output = mocker.Mock()
+
+        _editor = editor.AnimatedEditor(mocker.Mock())
+        _editor._processed_frames = frames
+        _editor.save(output, format="GIF", stream=True, save_all=True, loop=0)
+
+        save_gif_stream.assert_called_with(output, frames, save_all=True, loop=0)
+        assert _editor.save_stats is save_gif_stream.return_value
+
+    def test_convert_mode_then_resize(self):
+        frames = [Image.new("RGBA", (64, 32), (255, 0, 0, 128)) for _ in range(2)]
+        frames[1].putpixel((0, 0), (0, 0, 255, 200))
+        source = BytesIO()
+        frames[0].save(source, format="WEBP", save_all=True, append_images=frames[1:])
+        _editor = editor.AnimatedEditor(Image.open(source))
+        _editor.convert_mode("RGB")
+        _editor.resize((32, 16), 1, 2)
+
+        assert {frame.mode for frame in _editor._processed_frames} == {"RGB"}
+
+
+class TestAnimatedEditorBulkSave:
+    @pytest.fixture
+    def image(self):
+        frames = [Image.new("RGB", (64, 32), (index * 60, 0, 0)) for index in range(4)]
+        output = BytesIO()
+        frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:])
+        return Image.open(output)
+
+    def test_bulk_save(self, mocker, image):
+        _editor = editor.AnimatedEditor(image)
+        get_frames = mocker.spy(_editor, "_get_frames")
+        outputs = [BytesIO() for _ in range(3)]
+        resize_save_options = [
+            {
+                "resize": {"size": (32, 16), "resample": 1, "reducing_gap": 2},
+                "save": {"format": "GIF", "save_all": True},
+            },
+            {
+                "resize": {"size": (16, 8), "resample": 1, "reducing_gap": 2},
+                "save": {"format": "GIF", "save_all": True, "stream": True},
+            },
+            {
+                "resize": {"size": (8, 4), "resample": 1, "reducing_gap": 2},
+                "save": {"format": "PNG"},
+            },
+        ]
+
+        _editor.bulk_save(outputs, resize_save_options)
+
+        get_frames.assert_called_once()
+        for output, size, n_frames in zip(
+            outputs, [(32, 16), (16, 8), (8, 4)], [4, 4, 1]
+        ):
+            with Image.open(output) as resized:
+                assert resized.size == size
+                assert getattr(resized, "n_frames", 1) == n_frames
+        assert _editor.save_stats["frames"] == 4
+
+    def test_bulk_save_static_first(self, mocker, image):
+        _editor = editor.AnimatedEditor(image)
+        outputs = [BytesIO(), BytesIO()]
+        written = []
+        get_frames = _editor._get_frames
+
+        def _get_frames():
+            for frame in get_frames():
+                written.append(len(outputs[1].getvalue()))
+                yield frame
+
+        mocker.patch.object(_editor, "_get_frames", _get_frames)
+        _editor.bulk_save(
+            outputs,
+            [
+                {
+                    "resize": {"size": (32, 16), "resample": 1, "reducing_gap": 2},
+                    "save": {"format": "GIF", "save_all": True},
+                },
+                {
+                    "resize": {"size": (8, 4), "resample": 1, "reducing_gap": 2},
+                    "save": {"format": "PNG"},
+                },
+            ],
+        )
+
+        # The static output is saved before the 2nd frame is decoded
+        assert written[0] == 0 and written[1] > 0
+
+    def test_close_without_frames(self):
+        with pytest.raises(ValueError):
+            editor._FrameTarget(BytesIO(), "GIF", save_all=True).close()
+
+
+class TestAnimatedEditorFrameLimits:
+    @pytest.fixture
+    def image(self):
+        # Near duplicates, encoders already merge the identical ones
+        colors = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (255, 0, 0), (0, 255, 0)]
+        frames = [Image.new("RGB", (64, 32), color) for color in colors]
+        output = BytesIO()
+        frames[0].save(
+            output, format="GIF", save_all=True, append_images=frames[1:], duration=20
+        )
+        return Image.open(output)
+
+    def _get_durations(self, output):
+        durations = []
+        with Image.open(output) as image:
+            for index in range(getattr(image, "n_frames", 1)):
+                image.seek(index)
+                image.load()
+                durations.append(image.info["duration"])
+        return durations
+
+    def test_limit_frames(self, image):
+        _editor = editor.AnimatedEditor(image)
+        _editor.resize((32, 16), 1, 2)
+        _editor.limit_frames(dedupe_threshold=3)
+        output = BytesIO()
+        _editor.save(output, format="WEBP", save_all=True, lossless=True)
+
+        assert self._get_durations(output) == [60, 20, 20]
+
+    def test_save_max_fps(self, image):
+        _editor = editor.AnimatedEditor(image)
+        output = BytesIO()
+        _editor.save(output, format="WEBP", save_all=True, max_fps=25, lossless=True)
+
+        assert self._get_durations(output) == [40, 40, 20]
+
+    def test_save_max_fps_resize(self, mocker, image):
+        _editor = editor.AnimatedEditor(image)
+        _editor.resize((32, 16), 1, 2)
+        resize = mocker.spy(editor, "_resize")
+        output = BytesIO()
+        _editor.save(output, format="WEBP", save_all=True, max_fps=25, lossless=True)
+
+        assert self._get_durations(output) == [40, 40, 20]
+        # The dropped frames are never resized
+        assert resize.call_count == 3
+
+    def test_bulk_save_max_fps(self, mocker, image):
+        _editor = editor.AnimatedEditor(image)
+        resize = mocker.spy(editor, "_resize")
+        outputs = [BytesIO(), BytesIO()]
+        resize_save_options = [
+            {
+                "resize": {"size": (32, 16), "resample": 1, "reducing_gap": 2},
+                "save": {"format": "WEBP", "save_all": True, "lossless": True},
+            },
+            {
+                "resize": {"size": (16, 8), "resample": 1, "reducing_gap": 2},
+                "save": {
+                    "format": "WEBP",
+                    "save_all": True,
+                    "lossless": True,
+                    "max_fps": 25,
+                },
+            },
+        ]
+
+        _editor.bulk_save(outputs, resize_save_options)
+
+        assert list(map(self._get_durations, outputs)) == [[20] * 5, [40, 40, 20]]
+        # Frames dropped for the 2nd size are never resized for it
+        assert resize.call_count == 8
+
+
+class TestAnimatedEditorParallelFrames:
+    @pytest.fixture
+    def executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            yield executor
+
+    @pytest.fixture
+    def data(self):
+        frames = [
+            Image.effect_mandelbrot((64, 32), (-2, -1, 1, 1), index * 10 + 10)
+            for index in range(6)
+        ]
+        output = BytesIO()
+        frames[0].save(
+            output, format="GIF", save_all=True, append_images=frames[1:], duration=20
+        )
+        return output.getvalue()
+
+    def _save(self, data, executor, **save_options):
+        _editor = editor.AnimatedEditor(Image.open(BytesIO(data)))
+        if executor:
+            _editor.parallel_frames(executor, window=2)
+        _editor.resize((32, 16), 1, 2)
+        output = BytesIO()
+        _editor.save(output, format="WEBP", lossless=True, **save_options)
+        return output.getvalue()
+
+    @pytest.mark.parametrize("save_all", [True, False])
+    def test_save(self, data, executor, save_all):
+        options = {"save_all": True} if save_all else {}
+
+        assert self._save(data, executor, **options) == self._save(
+            data, None, **options
+        )
+
+    def test_convert_mode(self, data, executor):
+        modes = []
+        for parallel in [True, False]:
+            _editor = editor.AnimatedEditor(Image.open(BytesIO(data)))
+            if parallel:
+                _editor.parallel_frames(executor, window=2)
+            _editor.convert_mode("RGBA")
+            modes.append([frame.mode for frame in _editor._processed_frames])
+
+        assert modes[0] == modes[1]
+        assert len(modes[0]) == 6
+
+    def _bulk_save(self, data, executor):
+        _editor = editor.AnimatedEditor(Image.open(BytesIO(data)))
+        if executor:
+            _editor.parallel_frames(executor, window=2)
+        outputs = [BytesIO(), BytesIO(), BytesIO()]
+        _editor.bulk_save(
+            outputs,
+            [
+                {
+                    "resize": {"size": (32, 16), "resample": 1, "reducing_gap": 2},
+                    "save": {"format": "GIF", "save_all": True},
+                },
+                {
+                    "resize": {"size": (16, 8), "resample": 1, "reducing_gap": 2},
+                    "save": {"format": "GIF", "save_all": True, "max_fps": 25},
+                },
+                {
+                    "resize": {"size": (8, 4), "resample": 1, "reducing_gap": 2},
+                    "save": {"format": "PNG"},
+                },
+            ],
+        )
+        return [output.getvalue() for output in outputs]
+
+    def test_bulk_save(self, data, executor):
+        assert self._bulk_save(data, executor) == self._bulk_save(data, None)
+
+    def test_bulk_save_error(self, mocker, data, executor):
+        mocker.patch("image.editor._resize", side_effect=ValueError)
+        _editor = editor.AnimatedEditor(Image.open(BytesIO(data)))
+        _editor.parallel_frames(executor, window=2)
+
+        with pytest.raises(ValueError):
+            _editor.bulk_save(
+                [BytesIO()],
+                [
+                    {
+                        "resize": {"size": (8, 4), "resample": 1, "reducing_gap": 2},
+                        "save": {"format": "GIF", "save_all": True},
+                    }
+                ],
+            )
+
+
+class TestAnimatedEditorQuantize:
+    @pytest.fixture
+    def image(self):
+        frames = [Image.new("RGB", (64, 32), (index * 60, 0, 0)) for index in range(4)]
+        output = BytesIO()
+        frames[0].save(output, format="GIF", save_all=True, append_images=frames[1:])
+        return Image.open(output)
+
+    def _get_colors(self, output):
+        with Image.open(output) as image:
+            return [
+                frame.convert("RGB").getpixel((0, 0))
+                for frame in ImageSequence.Iterator(image)
+            ]
+
+    @pytest.mark.parametrize("stream", [True, False])
+    def test_save(self, image, stream):
+        events = []
+        output = BytesIO()
+        with observer.observing(events.append):
+            editor.AnimatedEditor(image).save(
+                output,
+                format="GIF",
+                stream=stream,
+                save_all=True,
+                quantize={"method": "fastoctree"},
+            )
+
+        assert self._get_colors(output) == [(index * 60, 0, 0) for index in range(4)]
+        # The palette is built once, then each frame is remapped to it
+        stages = [event.stage for event in events]
+        assert stages.count("quantize") == 5
+
+    @pytest.mark.parametrize("stream", [True, False])
+    def test_save_opaque_round_trip(self, stream):
+        # Translucent but above the GIF cut-off, so nothing becomes transparent
+        frames = [Image.effect_noise((64, 32), 64).convert("RGBA") for _ in range(3)]
+        frames[1].putalpha(200)
+        source = BytesIO()
+        frames[0].save(source, format="WEBP", save_all=True, append_images=frames[1:])
+        output = BytesIO()
+
+        editor.AnimatedEditor(Image.open(source)).save(
+            output,
+            format="GIF",
+            stream=stream,
+            save_all=True,
+            quantize={"method": "fastoctree"},
+        )
+
+        assert editor.AnimatedEditor(Image.open(output)).actual_mode == "RGB"
+
+    def test_save_encode_stage(self, mocker, image):
+        quantize_frames = editor.quantize.quantize_frames
+
+        def slow_quantize_frames(frames, **options):
+            time.sleep(0.05)
+            return quantize_frames(frames, **options)
+
+        mocker.patch("image.editor.quantize.quantize_frames", slow_quantize_frames)
+        events = []
+        with observer.observing(events.append):
+            editor.AnimatedEditor(image).save(
+                BytesIO(), format="GIF", save_all=True, quantize={}
+            )
+
+        # Quantizing is timed on its own, not as part of the encode
+        [encode] = [event for event in events if event.stage == "encode"]
+        assert (encode.frames, encode.duration < 0.05) == (4, True)
+
+    def test_save_stats(self, mocker, image):
+        quantize_frames = mocker.spy(editor.quantize, "quantize_frames")
+        _editor = editor.AnimatedEditor(image)
+        _editor.save(BytesIO(), format="GIF", save_all=True, quantize={})
+
+        # The processed frames and the P frames they're quantized to, at once
+        frames = quantize_frames.call_args.args[0] + quantize_frames.spy_return
+        assert _editor.save_stats["peak_held_bytes"] == sum(
+            map(editor.utils.get_image_bytes, frames)
+        )
+        assert {frame.mode for frame in quantize_frames.call_args.args[0]} != {"P"}
+
+    def test_save_webp_ignores_quantize(self, mocker, image):
+        quantize_frames = mocker.spy(editor.quantize, "quantize_frames")
+
+        editor.AnimatedEditor(image).save(
+            BytesIO(), format="WEBP", save_all=True, quantize={}
+        )
+
+        quantize_frames.assert_not_called()
+
+    def test_bulk_save(self, mocker, image):
+        quantize_frames = mocker.spy(editor.quantize, "quantize_frames")
+        outputs = [BytesIO(), BytesIO()]
+        save_options = {"format": "GIF", "save_all": True, "quantize": {}}
+
+        editor.AnimatedEditor(image).bulk_save(
+            outputs,
+            [
+                {
+                    "resize": {"size": (32, 16), "resample": 1, "reducing_gap": 2},
+                    "save": save_options,
+                },
+                {
+                    "resize": {"size": (16, 8), "resample": 1, "reducing_gap": 2},
+                    "save": {**save_options, "stream": True},
+                },
+            ],
+        )
+
+        quantize_frames.assert_called_once()
+        for output in outputs:
+            assert self._get_colors(output) == [
+                (index * 60, 0, 0) for index in range(4)
+            ]
@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import pytest
+from PIL import Image
+
+from image import frames
+
+
+def _make_frames(colors, duration=20):
+    result = []
+    for color in colors:
+        frame = Image.new("RGB", (64, 32), color)
+        frame.info["duration"] = duration
+        result.append(frame)
+    return result
+
+
+def _get_summary(result):
+    return [(frame.getpixel((0, 0)), frames.get_duration(frame)) for frame in result]
+
+
+def test_dedupe_frames():
+    red, blue = (255, 0, 0), (0, 0, 255)
+    result = frames.dedupe_frames(_make_frames([red, red, blue, red, red, red]))
+
+    assert _get_summary(result) == [(red, 40), (blue, 20), (red, 60)]
+
+
+def test_dedupe_frames_threshold():
+    colors = [(100, 0, 0), (102, 0, 0), (104, 0, 0), (120, 0, 0)]
+
+    assert len(list(frames.dedupe_frames(_make_frames(colors)))) == 4
+    # Compared with the 1st frame of a run, not the previous one
+    assert _get_summary(frames.dedupe_frames(_make_frames(colors), 3)) == [
+        ((100, 0, 0), 40),
+        ((104, 0, 0), 20),
+        ((120, 0, 0), 20),
+    ]
+
+
+def test_cap_frame_rate():
+    colors = [(index, 0, 0) for index in range(7)]
+    result = frames.cap_frame_rate(_make_frames(colors, duration=20), max_fps=20)
+
+    # 50 fps down to 20, so 2.5 source frames per output frame
+    assert _get_summary(result) == [((0, 0, 0), 60), ((3, 0, 0), 60), ((6, 0, 0), 20)]
+
+
+def test_frame_rate_cap():
+    frame_rate_cap = frames.FrameRateCap(max_fps=10)
+    assert [frame_rate_cap.starts_frame(40) for _ in range(6)] == [
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+    ]
+    assert all(map(frames.FrameRateCap(None).starts_frame, [10, 10, 10]))
+
+
+def test_map_ordered():
+    in_flight, peak, lock = [0], [0], Lock()
+
+    def square(value):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.001 * (value % 3))
+        with lock:
+            in_flight[0] -= 1
+        return value * value
+
+    with ThreadPoolExecutor(4) as executor:
+        result = list(frames.map_ordered(square, range(20), executor, 3))
+
+    assert result == [value * value for value in range(20)]
+    assert peak[0] <= 3
+
+
+def test_map_ordered_early_stop():
+    pulled = []
+
+    def items():
+        for value in range(100):
+            pulled.append(value)
+            yield value
+
+    with ThreadPoolExecutor(1) as executor:
+        mapped = frames.map_ordered(lambda value: value, items(), executor, 4)
+        assert next(mapped) == 0
+        mapped.close()
+
+    assert len(pulled) == 4
+
+
+def test_map_ordered_error():
+    def fail(value):
+        raise ValueError(value)
+
+    with ThreadPoolExecutor(2) as executor, pytest.raises(ValueError):
+        list(frames.map_ordered(fail, range(3), executor, 2))
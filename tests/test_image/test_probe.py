@@ -0,0 +1,54 @@
+import gc
+
+from PIL import Image
+
+from image import probe
+
+
+def test_get_probe():
+    image = Image.new("RGB", (2, 2))
+    image_probe = probe.get_probe(image)
+
+    assert probe.get_probe(image) is image_probe
+    assert probe.get_probe(image.copy()) is not image_probe
+
+
+def test_get_probe_released():
+    image = Image.new("RGB", (2, 2))
+    image_id = id(image)
+    probe.get_probe(image)
+
+    del image
+    gc.collect()
+
+    assert image_id not in probe._probes
+
+
+def test_has_translucent_alpha_computed_once(mocker):
+    has_translucent_alpha = mocker.patch(
+        "image.utils.has_translucent_alpha", return_value=True
+    )
+    image = Image.new("RGBA", (2, 2))
+    image_probe = probe.ImageProbe(image)
+
+    assert image_probe.has_translucent_alpha is True
+    assert image_probe.has_translucent_alpha is True
+    has_translucent_alpha.assert_called_once()
+
+
+def test_facts(mocker):
+    image = mocker.Mock(info={"transparency": 0}, is_animated=True, n_frames=3)
+    image_probe = probe.ImageProbe(image)
+
+    assert image_probe.has_transparency is True
+    assert image_probe.is_animated is True
+    assert image_probe.n_frames == 3
+
+
+def test_static_facts():
+    image = Image.new("RGB", (2, 2))
+    image_probe = probe.ImageProbe(image)
+
+    assert image_probe.has_transparency is False
+    assert image_probe.is_animated is False
+    assert image_probe.n_frames == 1
@@ -1,4 +1,7 @@
+from io import BytesIO
+
 import pytest
+from PIL import Image
 
 from tests.conftest import SAVE_OPTIONS
 from image import profile
@@ -24,6 +27,14 @@ class TestStaticJpegRgbProfile:
 
         assert image == _profile._image
 
+    def test_get_color_clustering_image_pixel_budget(self, mocker):
+        reduce = mocker.patch("image.utils.reduce_to_pixel_budget")
+        _profile = profile.StaticJpegRgbProfile(mocker.Mock())
+        image = _profile.get_color_clustering_image(256_000)
+
+        assert image is reduce.return_value
+        reduce.assert_called_with(_profile._image, 256_000)
+
 
 class TestStaticWebpRgbProfile:
     def test_name(self):
@@ -51,14 +62,11 @@ class TestStaticWebpRgbaProfile:
         assert profile.StaticWebpRgbaProfile(mocker.Mock()).is_optimized() is False
 
     @pytest.mark.parametrize(
-        "extrema, save_options",
-        [
-            [((0, 255), (0, 255), (0, 255), (255, 255)), SAVE_OPTIONS["JPEG"]],
-            [((0, 255), (0, 255), (0, 255), (0, 255)), SAVE_OPTIONS["PNG"]],
-        ],
+        "alpha, save_options",
+        [[255, SAVE_OPTIONS["JPEG"]], [0, SAVE_OPTIONS["PNG"]]],
     )
-    def test_optimize(self, mocker, extrema, save_options):
-        image = mocker.Mock(getextrema=lambda: extrema)
+    def test_optimize(self, mocker, alpha, save_options):
+        image = Image.new("RGBA", (2, 2), (0, 0, 0, alpha))
         output = mocker.Mock()
 
         _profile = profile.StaticWebpRgbaProfile(image)
@@ -97,14 +105,11 @@ class TestStaticPngRgbaProfile:
         assert profile.StaticPngRgbaProfile.name == "PNG_RGBA"
 
     @pytest.mark.parametrize(
-        "extrema, is_translucent",
-        [
-            [((0, 255), (0, 255), (0, 255), (255, 255)), False],
-            [((0, 255), (0, 255), (0, 255), (0, 255)), True],
-        ],
+        "alpha, is_translucent",
+        [[255, False], [0, True]],
     )
-    def test_is_optimized(self, mocker, extrema, is_translucent):
-        image = mocker.Mock(getextrema=lambda: extrema)
+    def test_is_optimized(self, alpha, is_translucent):
+        image = Image.new("RGBA", (2, 2), (0, 0, 0, alpha))
         is_optimized = profile.StaticPngRgbaProfile(image).is_optimized()
 
         assert is_optimized == is_translucent
@@ -120,6 +125,16 @@ class TestStaticPngRgbaProfile:
         editor.convert_mode.assert_called_with("RGB")
         editor.save.assert_called_with(output, **SAVE_OPTIONS["JPEG"])
 
+    def test_optimize_memory_budget(self, mocker):
+        output = mocker.Mock()
+
+        _profile = profile.StaticPngRgbaProfile(mocker.Mock())
+        editor = _profile._editor = mocker.Mock()
+        _profile.optimize(output, {**SAVE_OPTIONS, "MEMORY": {"budget": 1024}})
+
+        editor.set_memory_budget.assert_called_with(1024)
+        editor.save.assert_called_with(output, **SAVE_OPTIONS["JPEG"])
+
 
 class TestAnimatedGifPProfile:
     def test_name(self):
@@ -167,6 +182,17 @@ class TestAnimatedGifPProfile:
         assert ccimage
         image.convert.assert_called_with(editor.actual_mode)
 
+    def test_get_color_clustering_image_pixel_budget(self, mocker):
+        reduce = mocker.patch("image.utils.reduce_to_pixel_budget")
+        image = mocker.Mock()
+
+        _profile = profile.AnimatedGifPProfile(image)
+        _profile._editor = mocker.Mock()
+        ccimage = _profile.get_color_clustering_image(256_000)
+
+        assert ccimage is reduce.return_value
+        reduce.assert_called_with(image.convert.return_value, 256_000)
+
 
 class TestAnimatedWebpRgbaProfile:
     def test_name(self):
@@ -204,3 +230,38 @@ class TestAnimatedWebpRgbProfile:
         _profile.optimize(output, SAVE_OPTIONS)
 
         editor.save.assert_called_with(output, **SAVE_OPTIONS["GIF"])
+
+    def test_optimize_webp_policy(self, mocker):
+        output = mocker.Mock()
+        save_options = {**SAVE_OPTIONS, "ANIMATED": {"policy": "WEBP"}}
+
+        _profile = profile.AnimatedWebpRgbProfile(mocker.Mock())
+        editor = _profile._editor = mocker.Mock()
+        _profile.optimize(output, save_options)
+
+        editor.save.assert_called_with(output, **SAVE_OPTIONS["WEBP"])
+
+    @pytest.mark.parametrize("time_budget", [60, 0])
+    def test_optimize_smallest_policy(self, mocker, time_budget):
+        frames = [
+            Image.effect_noise((64, 32), 32 + index).convert("RGB")
+            for index in range(3)
+        ]
+        source = BytesIO()
+        frames[0].save(source, format="WEBP", save_all=True, append_images=frames[1:])
+        animated_editor = mocker.spy(profile.editor, "AnimatedEditor")
+        save_options = {
+            **SAVE_OPTIONS,
+            "ANIMATED": {"policy": "SMALLEST", "time_budget": time_budget},
+        }
+        output = BytesIO()
+
+        with Image.open(source) as image:
+            profile.AnimatedWebpRgbProfile(image).optimize(output, save_options)
+
+        # GIF is only tried when the time budget allows it
+        assert animated_editor.call_count == (2 if time_budget else 1)
+        with Image.open(output) as optimized:
+            # Noise quantizes badly, so the WebP is the smaller one
+            assert optimized.format == "WEBP"
+            assert optimized.n_frames == 3
@@ -0,0 +1,129 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from image import editor, quality
+
+
+@pytest.fixture
+def noisy_image():
+    return Image.merge(
+        "RGB",
+        [
+            Image.linear_gradient("L").resize((640, 480)),
+            Image.effect_noise((640, 480), 48),
+            Image.linear_gradient("L").rotate(90).resize((640, 480)),
+        ],
+    )
+
+
+def _get_jpeg_size(image, **save_options):
+    output = BytesIO()
+    image.save(output, format="JPEG", **save_options)
+    return len(output.getvalue())
+
+
+def test_find_jpeg_quality_target_size(noisy_image):
+    target_size = 60_000
+    jpeg_quality = quality.find_jpeg_quality(
+        noisy_image, target_size=target_size, probe_pixel_budget=64_000, cache=None
+    )
+
+    assert quality.MIN_QUALITY < jpeg_quality < quality.MAX_QUALITY
+    assert _get_jpeg_size(noisy_image, quality=jpeg_quality) <= target_size
+    assert _get_jpeg_size(noisy_image, quality=jpeg_quality + 5) > target_size
+
+
+def test_find_jpeg_quality_target_size_checked(mocker, noisy_image):
+    # A probe that looks cheaper than the image, the full encode steps it down
+    mocker.patch(
+        "image.quality.get_probe_image",
+        return_value=Image.new("RGB", (160, 120), (40, 80, 120)),
+    )
+    target_size = 60_000
+    jpeg_quality = quality.find_jpeg_quality(
+        noisy_image, target_size=target_size, cache=None
+    )
+
+    assert _get_jpeg_size(noisy_image, quality=jpeg_quality) <= target_size
+    assert _get_jpeg_size(noisy_image, quality=jpeg_quality + 1) > target_size
+
+
+def test_find_jpeg_quality_min_psnr(noisy_image):
+    jpeg_quality = quality.find_jpeg_quality(
+        noisy_image, min_psnr=20, probe_pixel_budget=640 * 480, cache=None
+    )
+
+    def get_psnr(jpeg_quality):
+        output = BytesIO()
+        noisy_image.save(output, format="JPEG", quality=jpeg_quality)
+        return quality.get_psnr(noisy_image, output)
+
+    assert quality.MIN_QUALITY < jpeg_quality < quality.MAX_QUALITY
+    assert get_psnr(jpeg_quality) >= 20
+    assert get_psnr(quality.MIN_QUALITY) < 20
+
+
+def test_find_jpeg_quality_flat():
+    image = Image.new("RGB", (256, 256), (40, 80, 120))
+    assert quality.find_jpeg_quality(image, target_size=10_000, cache=None) == 95
+
+
+def test_find_jpeg_quality_cache(mocker, noisy_image):
+    cache = quality.QualityCache()
+    jpeg_quality = quality.find_jpeg_quality(
+        noisy_image, target_size=60_000, cache=cache
+    )
+    encode = mocker.spy(quality, "_encode")
+
+    assert (
+        quality.find_jpeg_quality(noisy_image, target_size=60_000, cache=cache)
+        == jpeg_quality
+    )
+    encode.assert_not_called()
+
+
+def test_quality_cache_eviction():
+    cache = quality.QualityCache(max_size=2)
+    cache.set(("a",), 1)
+    cache.set(("b",), 2)
+    cache.get(("a",))
+    cache.set(("c",), 3)
+
+    assert cache.get(("b",)) is None
+    assert (cache.get(("a",)), cache.get(("c",))) == (1, 3)
+
+
+def test_get_probe_image(noisy_image):
+    probe = quality.get_probe_image(noisy_image, pixel_budget=64_000)
+
+    assert probe.mode == noisy_image.mode
+    assert probe.width * probe.height <= 64_000
+    assert probe.width % quality.PROBE_TILE_SIZE == 0
+    assert quality.get_probe_image(probe, pixel_budget=64_000) is probe
+
+
+def test_resolve_save_options(mocker):
+    image = Image.new("RGB", (8, 8))
+    find_jpeg_quality = mocker.patch("image.quality.find_jpeg_quality", return_value=42)
+    save_options = {"format": "JPEG", "optimize": True, "quality": 75}
+
+    assert quality.resolve_save_options(image, save_options) is save_options
+    assert quality.resolve_save_options(
+        image, {**save_options, "target_size": 1000}
+    ) == {"format": "JPEG", "optimize": True, "quality": 42}
+    find_jpeg_quality.assert_called_once_with(
+        image, 1000, None, save_options={"optimize": True}, cache=quality.default_cache
+    )
+    # Only JPEG searches, the other formats just drop the options
+    assert quality.resolve_save_options(image, {"format": "PNG", "min_psnr": 40}) == {
+        "format": "PNG"
+    }
+
+
+def test_editor_save_target_size(noisy_image):
+    output = BytesIO()
+    editor.StaticEditor(noisy_image).save(output, format="JPEG", target_size=60_000)
+
+    assert len(output.getvalue()) <= 60_000
@@ -0,0 +1,89 @@
+import pytest
+from PIL import Image
+
+from image import quantize
+
+
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (0, 0, 0)]
+
+
+def _make_frames(mode="RGB"):
+    result = []
+    for index, color in enumerate(COLORS):
+        frame = Image.new("RGB", (16, 8), color).convert(mode)
+        frame.info["duration"] = (index + 1) * 10
+        result.append(frame)
+    return result
+
+
+def test_get_method():
+    assert quantize.get_method("MedianCut") == Image.Quantize.MEDIANCUT
+
+    with pytest.raises(ValueError):
+        quantize.get_method("neuquant")
+
+
+def test_get_method_libimagequant_missing(mocker):
+    mocker.patch("image.quantize.features.check_feature", return_value=False)
+
+    assert quantize.get_method("libimagequant") == Image.Quantize.FASTOCTREE
+
+
+def test_get_sample():
+    assert quantize.get_sample(list(range(10)), 4) == [0, 3, 6, 9]
+    assert quantize.get_sample(list(range(3)), 8) == [0, 1, 2]
+    assert quantize.get_sample(list(range(10)), 5)[-1] == 9
+
+
+def test_quantize_frames_late_colors():
+    # A scene that only starts in the last frame
+    frames = [Image.new("RGB", (16, 8), (255, 0, 0)) for _ in range(9)]
+    frames.append(Image.new("RGB", (16, 8), (0, 255, 0)))
+
+    result = quantize.quantize_frames(frames, sample_frames=5)
+
+    assert result[-1].convert("RGB").getpixel((0, 0)) == (0, 255, 0)
+
+
+@pytest.mark.parametrize("method", ["fastoctree", "mediancut"])
+def test_quantize_frames(method):
+    result = quantize.quantize_frames(_make_frames(), method=method)
+
+    assert [frame.mode for frame in result] == ["P"] * 4
+    assert all(frame.getpalette() == result[0].getpalette() for frame in result)
+    assert [frame.convert("RGB").getpixel((0, 0)) for frame in result] == COLORS
+    assert [frame.info["duration"] for frame in result] == [10, 20, 30, 40]
+
+
+def test_quantize_frames_transparency():
+    frames = _make_frames("RGBA")
+    frames[0].putpixel((0, 0), (255, 0, 0, 0))
+
+    result = quantize.quantize_frames(frames, colors=16)
+
+    transparency = result[0].info["transparency"]
+    assert result[0].getpixel((0, 0)) == transparency
+    # Only the frame that uses it has a transparent color
+    assert not any("transparency" in frame.info for frame in result[1:])
+    # Black is in the palette, the transparent index never replaces it
+    assert result[3].getpixel((0, 0)) != transparency
+    assert result[3].convert("RGB").getpixel((0, 0)) == (0, 0, 0)
+
+
+def test_quantize_frames_opaque_alpha():
+    frames = _make_frames("RGBA")
+    frames[1].putalpha(200)
+
+    result = quantize.quantize_frames(frames)
+
+    assert not any("transparency" in frame.info for frame in result)
+
+
+def test_build_sample(mocker):
+    palette = quantize.GlobalPalette(sample_frames=2, sample_pixel_budget=32)
+    get_tile = mocker.spy(palette, "_get_tile")
+
+    palette.build(_make_frames())
+
+    assert get_tile.call_count == 2
+    assert all(tile.width * tile.height <= 32 for tile in get_tile.spy_return_list)
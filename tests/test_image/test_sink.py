@@ -0,0 +1,135 @@
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from image import sink, utils
+from image.editor import StaticEditor
+
+
+@pytest.fixture
+def resize_save_options():
+    return [
+        {
+            "resize": {"size": size, "resample": 1, "reducing_gap": 3},
+            "save": {"format": "PNG"},
+        }
+        for size in [(64, 32), (16, 8)]
+    ]
+
+
+@pytest.fixture
+def image():
+    return Image.linear_gradient("L").convert("RGB").resize((128, 64))
+
+
+def test_buffer_writer():
+    writer = sink.BufferWriter(bytearray(2))
+    writer.write(b"abc")
+    writer.seek(1)
+    writer.write(b"X")
+    writer.seek(0, os.SEEK_END)
+    writer.write(memoryview(b"de"))
+
+    assert writer.tell() == 5
+    assert writer.getvalue() == b"aXcde"
+    assert len(writer.buffer) >= 5
+
+
+def test_buffer_writer_grow_viewed_buffer():
+    buffer = bytearray(2)
+    view = memoryview(buffer)
+    writer = sink.BufferWriter(buffer)
+    writer.write(b"abc")
+
+    assert writer.getvalue() == b"abc"
+    assert writer.buffer is not buffer
+    view.release()
+
+
+def test_buffer_writer_seek():
+    writer = sink.BufferWriter(bytearray(2))
+    writer.write(b"abc")
+
+    with pytest.raises(ValueError):
+        writer.seek(-1)
+    with pytest.raises(ValueError):
+        writer.seek(-4, os.SEEK_END)
+    with pytest.raises(ValueError):
+        writer.seek(0, 3)
+    assert writer.tell() == 3
+
+
+def test_buffer_sink(image, resize_save_options):
+    buffer_sink = sink.BufferSink(size_hint=16)
+
+    results = list(
+        utils.bulk_resize(StaticEditor(image), resize_save_options, sink=buffer_sink)
+    )
+    assert [Image.open(BytesIO(result)).size for result in results] == [
+        (64, 32),
+        (16, 8),
+    ]
+
+    # The buffers grown by the 1st run are reused by the next one
+    buffers = list(map(id, buffer_sink._buffers))
+    del results
+    list(utils.bulk_resize(StaticEditor(image), resize_save_options, sink=buffer_sink))
+    assert list(map(id, buffer_sink._buffers)) == buffers
+
+
+def test_spooled_sink(image, resize_save_options):
+    with sink.SpooledSink(max_size=1024) as spooled_sink:
+        results = list(
+            utils.bulk_resize(
+                StaticEditor(image), resize_save_options, sink=spooled_sink
+            )
+        )
+
+        with Image.open(results[1]) as resized:
+            assert resized.size == (16, 8)
+        # fileno() moves it to disk, so it can be streamed with sendfile
+        assert os.fstat(results[0].fileno()).st_size == len(results[0].read())
+
+    assert all(result.closed for result in results)
+
+
+@pytest.mark.parametrize("own_directory", [True, False])
+def test_directory_sink(image, resize_save_options, tmp_path, own_directory):
+    directory = None if own_directory else str(tmp_path)
+
+    with sink.DirectorySink(directory, suffix=".png") as directory_sink:
+        results = list(
+            utils.bulk_resize(
+                StaticEditor(image),
+                resize_save_options,
+                cascade=True,
+                sink=directory_sink,
+            )
+        )
+        assert all(
+            os.path.dirname(result) == directory_sink.directory for result in results
+        )
+        with Image.open(results[1]) as resized:
+            assert resized.size == (16, 8)
+
+    assert not any(map(os.path.exists, results))
+    assert os.path.exists(directory_sink.directory) != own_directory
+
+
+def test_buffer_sink_stale_view(image, resize_save_options):
+    buffer_sink = sink.BufferSink(size_hint=16)
+
+    stale, exported = utils.bulk_resize(
+        StaticEditor(image), resize_save_options, sink=buffer_sink
+    )
+    held = memoryview(exported)
+    value = bytes(held)
+    list(utils.bulk_resize(StaticEditor(image), resize_save_options, sink=buffer_sink))
+
+    with pytest.raises(ValueError):
+        bytes(stale)
+    # Still exported, so its buffer was swapped out instead of overwritten
+    assert bytes(held) == value
+    assert all(buffer is not held.obj for buffer in buffer_sink._buffers)
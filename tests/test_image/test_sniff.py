@@ -0,0 +1,120 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from example_settings import SUPPORTED_IMAGES
+from image import sniff
+from image.category import CategoryProxy
+
+
+def _encode(image, format, **options):
+    output = BytesIO()
+    image.save(output, format=format, **options)
+    output.seek(0)
+    return output
+
+
+def _frames(mode):
+    return [Image.new(mode, (40, 30), (index * 60, 0, 0)) for index in range(3)]
+
+
+@pytest.mark.parametrize(
+    "image, format, options",
+    [
+        [Image.new("RGB", (40, 30)), "JPEG", {}],
+        [Image.new("L", (40, 30)), "JPEG", {}],
+        [Image.new("RGB", (40, 30)), "PNG", {}],
+        [Image.new("RGBA", (40, 30)), "PNG", {}],
+        [Image.new("P", (40, 30)), "PNG", {}],
+        [
+            _frames("RGBA")[0],
+            "PNG",
+            {"save_all": True, "append_images": _frames("RGBA")},
+        ],
+        [Image.new("RGB", (40, 30)), "WEBP", {}],
+        [Image.new("RGB", (40, 30)), "WEBP", {"lossless": True}],
+        [Image.new("RGBA", (40, 30), (0, 0, 0, 10)), "WEBP", {"lossless": True}],
+        [Image.new("RGBA", (40, 30), (0, 0, 0, 10)), "WEBP", {}],
+        [
+            _frames("RGB")[0],
+            "WEBP",
+            {"save_all": True, "append_images": _frames("RGB")},
+        ],
+        [_frames("RGB")[0], "GIF", {"save_all": True, "append_images": _frames("RGB")}],
+        [Image.new("RGB", (40, 30), (5, 100, 3)), "GIF", {}],
+        [Image.new("L", (40, 30)), "GIF", {}],
+    ],
+)
+def test_sniff_header_matches_category(image, format, options):
+    source = _encode(image, format, **options)
+    sniffed = sniff.sniff_header(sniff.read_header(source))
+
+    with Image.open(source) as decoded:
+        proxy = CategoryProxy(decoded, SUPPORTED_IMAGES)
+        category = proxy.get_category()
+        format_mode = "_".join([decoded.format, decoded.mode])
+
+    assert sniffed is not None
+    assert sniff.get_format_mode(sniffed) == (
+        "ANIMATED" if type(category).__name__ == "AnimatedCategory" else "STATIC",
+        format_mode,
+    )
+
+
+def test_sniff_header_ambiguous():
+    # The frame header comes after a large EXIF block
+    exif = b"Exif\x00\x00" + b"\x00" * sniff.HEADER_SIZE
+    source = _encode(Image.new("RGB", (40, 30)), "JPEG", exif=exif)
+
+    assert sniff.sniff_header(sniff.read_header(source)) is None
+
+
+def test_sniff_header_mpo():
+    # Phone cameras save several pictures in one JPEG
+    frames = [Image.effect_noise((64, 48), 40).convert("RGB") for _ in range(2)]
+    source = _encode(frames[0], "MPO", save_all=True, append_images=frames[1:])
+
+    assert sniff.sniff_header(sniff.read_header(source)) is None
+    with Image.open(source) as decoded:
+        assert (decoded.format, decoded.is_animated) == ("MPO", True)
+
+
+def test_read_header_keeps_position():
+    source = BytesIO(b"0123456789")
+    source.seek(2)
+
+    assert sniff.read_header(source, 4) == b"2345"
+    assert source.tell() == 2
+
+
+class TestGetProfileClass:
+    def test_sniffed(self, mocker):
+        image_open = mocker.spy(Image, "open")
+        source = _encode(Image.new("RGBA", (40, 30)), "PNG")
+
+        profile_class = sniff.get_profile_class(source, SUPPORTED_IMAGES)
+
+        assert profile_class is SUPPORTED_IMAGES["STATIC"]["PNG_RGBA"]
+        image_open.assert_not_called()
+
+    def test_unknown_format(self, mocker):
+        image_open = mocker.spy(Image, "open")
+        source = _encode(Image.new("RGB", (40, 30)), "BMP")
+
+        assert sniff.get_profile_class(source, SUPPORTED_IMAGES) is None
+        image_open.assert_not_called()
+
+    def test_unsupported(self):
+        source = _encode(Image.new("P", (40, 30)), "PNG")
+        assert sniff.get_profile_class(source, SUPPORTED_IMAGES) is None
+
+    def test_fallback(self, mocker):
+        image_open = mocker.spy(Image, "open")
+        exif = b"Exif\x00\x00" + b"\x00" * sniff.HEADER_SIZE
+        source = _encode(Image.new("RGB", (40, 30)), "JPEG", exif=exif)
+
+        profile_class = sniff.get_profile_class(source, SUPPORTED_IMAGES)
+
+        assert profile_class is SUPPORTED_IMAGES["STATIC"]["JPEG_RGB"]
+        image_open.assert_called_once()
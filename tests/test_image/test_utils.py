@@ -1,22 +1,35 @@
+from io import BytesIO
+
 import pytest
+from PIL import Image, ImageChops, ImageSequence
 
-from image import utils
+from image import editor, utils
 
 
 @pytest.mark.parametrize(
-    "extrema, bands",
+    "image, is_translucent",
     [
-        [False, (0, 255)],  # GreySlcale
-        [False, ((0, 255), (0, 255), (0, 255))],  # RGB
-        [True, ((0, 255), (0, 255), (0, 255), (0, 255))],  # RGBA wo translucency
-        [True, ((0, 255), (0, 255), (0, 255), (0, 100))],  # RGBA w translucency
+        [Image.new("L", (4, 4)), False],
+        [Image.new("RGB", (4, 4)), False],
+        [Image.new("RGBA", (4, 4), (0, 0, 0, 255)), False],
+        [Image.new("RGBA", (4, 4), (0, 0, 0, 100)), True],
     ],
 )
-def test_has_translucent_alpha(mocker, bands, extrema):
-    img = mocker.Mock(getextrema=lambda: bands)
-    hta = utils.has_translucent_alpha(img)
+def test_has_translucent_alpha(image, is_translucent):
+    assert utils.has_translucent_alpha(image) is is_translucent
+
+
+def test_has_translucent_alpha_last_strip(mocker):
+    mocker.patch("image.utils._ALPHA_STRIP_ROWS", 2)
+    image = Image.new("RGBA", (4, 5), (0, 0, 0, 255))
+    image.putpixel((3, 4), (0, 0, 0, 254))
+    getchannel = mocker.spy(image, "getchannel")
+    crop = mocker.spy(image, "crop")
 
-    assert hta == extrema
+    assert utils.has_translucent_alpha(image) is True
+    # The strips are cut from the alpha band, not from every band
+    getchannel.assert_called_once_with("A")
+    crop.assert_not_called()
 
 
 def test_bulk_resize(mocker, editor_options):
@@ -28,19 +41,30 @@ def test_bulk_resize(mocker, editor_options):
     ]
     bulk_resize = utils.bulk_resize(editor, resize_save_options)
 
-    output_1 = mocker.patch("image.utils.BytesIO").return_value
+    output_1 = mocker.patch("image.sink.BytesIO").return_value
     result = next(bulk_resize)
     editor.resize.assert_called_with(**options["resize"])
     editor.save.assert_called_with(output_1, **options["save"])
     assert result == output_1
 
-    output_2 = mocker.patch("image.utils.BytesIO").return_value
+    output_2 = mocker.patch("image.sink.BytesIO").return_value
     result = next(bulk_resize)
     editor.resize.assert_called_with(**options["resize"])
     editor.save.assert_called_with(output_2, **options["save"])
     assert result == output_2
 
 
+def test_bulk_resize_plans_decode(mocker, editor_options):
+    editor = mocker.Mock()
+    options = [editor_options, {**editor_options, "resize": {"size": (64, 64)}}]
+
+    list(utils.bulk_resize(editor, options))
+
+    editor.plan_decode.assert_has_calls(
+        [mocker.call((512, 512), 2), mocker.call((64, 64), None)]
+    )
+
+
 def test_bulk_resize_tempfile(mocker, editor_options):
     editor = mocker.Mock()
 
@@ -50,16 +74,264 @@ def test_bulk_resize_tempfile(mocker, editor_options):
     ]
     bulk_resize = utils.bulk_resize_tempfile(editor, resize_save_options)
 
-    tempfile_1 = mocker.patch("image.utils.NamedTemporaryFile").return_value
+    tempfile_1 = mocker.patch("image.sink.NamedTemporaryFile").return_value
     result = next(bulk_resize)
     editor.resize.assert_called_with(**options["resize"])
     editor.save.assert_called_with(tempfile_1, **options["save"])
     tempfile_1.close.assert_called()
     assert result == tempfile_1.name
 
-    tempfile_2 = mocker.patch("image.utils.NamedTemporaryFile").return_value
+    tempfile_2 = mocker.patch("image.sink.NamedTemporaryFile").return_value
     result = next(bulk_resize)
     editor.resize.assert_called_with(**options["resize"])
     editor.save.assert_called_with(tempfile_2, **options["save"])
     tempfile_2.close.assert_called()
     assert result == tempfile_2.name
+
+
+@pytest.mark.parametrize(
+    "size, pixel_budget, budget_size",
+    [
+        [(4000, 2000), 80_000, (400, 200)],
+        [(100, 100), 80_000, (100, 100)],
+    ],
+)
+def test_get_pixel_budget_size(size, pixel_budget, budget_size):
+    assert utils.get_pixel_budget_size(size, pixel_budget) == budget_size
+
+
+def test_draft_to_pixel_budget(mocker):
+    image = mocker.Mock(size=(4000, 2000))
+    utils.draft_to_pixel_budget(image, 80_000)
+
+    image.draft.assert_called_with(None, (400, 200))
+
+
+@pytest.mark.parametrize(
+    "min_size, scale",
+    [
+        [(1000, 500), 4],
+        [(1001, 500), 2],
+        [(256, 256), 4],
+        [(250, 250), 8],
+        [(5000, 1), 1],
+    ],
+)
+def test_get_draft_scale(min_size, scale):
+    assert utils.get_draft_scale((4000, 2000), min_size) == scale
+
+
+@pytest.mark.parametrize(
+    "memory_budget, scale", [[32_000_000, 1], [8_000_000, 2], [100, 8]]
+)
+def test_get_memory_budget_scale(memory_budget, scale):
+    assert utils.get_memory_budget_scale("RGB", (4000, 2000), memory_budget) == scale
+
+
+@pytest.mark.parametrize("scale, draft_size", [[1, None], [4, (1000, 500)]])
+def test_draft_to_scale(mocker, scale, draft_size):
+    image = mocker.Mock(size=(4000, 2000))
+    utils.draft_to_scale(image, scale)
+
+    if draft_size:
+        image.draft.assert_called_with(None, draft_size)
+    else:
+        image.draft.assert_not_called()
+
+
+def test_get_mode_bytes():
+    assert utils.get_mode_bytes("RGB", (10, 10)) == 400
+    assert utils.get_mode_bytes("P", (10, 10)) == 100
+    assert utils.get_mode_bytes("I;16", (10, 10)) == 200
+
+
+@pytest.mark.parametrize("resample", [1, 2, 3, 5])
+@pytest.mark.parametrize("mode", [None, "L"])
+@pytest.mark.parametrize("size", [(40, 30), (200, 150)])
+def test_resize_in_strips(resample, mode, size):
+    image = Image.effect_mandelbrot((160, 120), (-2, -1.5, 1, 1.5), 50)
+    image = image.convert("RGB")
+    strip_rows = utils.get_strip_rows(image, size, resample, mode, 60_000)
+
+    resized = utils.resize_in_strips(image, size, resample, mode, strip_rows)
+
+    expected = image.convert(mode or "RGB").resize(size, resample)
+    difference = ImageChops.difference(resized, expected)
+    assert 0 < strip_rows < size[1]
+    assert resized.mode == expected.mode
+    assert difference.point(lambda value: value > 1 and 255).getbbox() is None
+
+
+def test_get_strip_rows_over_budget():
+    image = Image.new("RGB", (1000, 1000))
+
+    assert utils.get_strip_rows(image, (100, 100), 1, None, 10_000) == 0
+
+
+@pytest.mark.parametrize(
+    "size, pixel_budget, reduced_size",
+    [
+        [(1000, 500), 10_000, (125, 63)],
+        [(1000, 500), 500_000, (1000, 500)],
+    ],
+)
+def test_reduce_to_pixel_budget(size, pixel_budget, reduced_size):
+    image = Image.new("RGB", size)
+    reduced = utils.reduce_to_pixel_budget(image, pixel_budget)
+
+    assert reduced.size == reduced_size
+    assert reduced.width * reduced.height <= pixel_budget
+
+
+@pytest.mark.parametrize("bulk_resize", [utils.bulk_resize, utils.bulk_resize_tempfile])
+def test_bulk_resize_cascade(mocker, bulk_resize):
+    static_editor = editor.StaticEditor(Image.new("RGB", (2048, 1024)))
+    resize = mocker.spy(static_editor._original_image, "resize")
+    sizes = [(128, 64), (1024, 512), (400, 200), (256, 128)]
+    resize_save_options = [
+        {
+            "resize": {"size": size, "resample": 1, "reducing_gap": 2},
+            "save": {"format": "PNG"},
+        }
+        for size in sizes
+    ]
+
+    results = list(bulk_resize(static_editor, resize_save_options, cascade=True))
+
+    # Only the largest size resamples the original, 256x128 can't cascade from 400
+    assert [call.kwargs["size"] for call in resize.call_args_list] == [
+        (1024, 512),
+        (256, 128),
+    ]
+    for result, size in zip(results, sizes):
+        with Image.open(result) as image:
+            assert image.size == size
+
+
+def test_bulk_resize_cascade_streams(mocker):
+    static_editor = editor.StaticEditor(Image.new("RGB", (256, 128)))
+    resize = mocker.spy(static_editor, "resize")
+    resize_save_options = [
+        {
+            "resize": {"size": size, "resample": 1, "reducing_gap": 2},
+            "save": {"format": "PNG"},
+        }
+        for size in [(64, 32), (16, 8)]
+    ]
+    resized = utils.bulk_resize(static_editor, resize_save_options, cascade=True)
+
+    # Largest first already, so each output comes before the next resize
+    next(resized)
+    assert resize.call_count == 1
+    next(resized)
+    assert resize.call_count == 2
+
+    resized.close()
+    assert static_editor._resized_image is None
+
+
+def test_bulk_resize_cascade_fallback(mocker, editor_options):
+    _editor = mocker.Mock(can_cascade=lambda *_: False)
+    options = dict(resize=editor_options["resize"], save=editor_options["save"])
+    mocker.patch("image.sink.BytesIO")
+
+    list(utils.bulk_resize(_editor, [options], cascade=True))
+
+    _editor.resize.assert_called_with(**options["resize"], cascade=False)
+
+
+def test_get_image_bytes():
+    assert utils.get_image_bytes(Image.new("RGBA", (4, 2))) == 32
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "P"])
+def test_save_gif_stream(mode):
+    frames = [Image.new("RGB", (8, 4), (index * 50, 0, 0)) for index in range(3)]
+    frames = [frame.convert(mode) for frame in frames]
+    output = BytesIO()
+
+    stats = utils.save_gif_stream(
+        output, iter(frames), duration=[10, 20, 30], disposal=2, loop=0
+    )
+
+    assert stats == {"frames": 3, "peak_held_bytes": 32 * len(mode)}
+    with Image.open(output) as image:
+        assert image.n_frames == 3
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            assert frame.info["duration"] == (index + 1) * 10
+            expected = frames[index].convert("RGB").getpixel((0, 0))
+            assert frame.convert("RGB").getpixel((0, 0)) == expected
+
+
+def test_bulk_resize_single_pass(mocker, editor_options):
+    _editor = mocker.Mock()
+    options = dict(resize=editor_options["resize"], save=editor_options["save"])
+
+    results = list(utils.bulk_resize(_editor, [options, options], single_pass=True))
+
+    _editor.bulk_save.assert_called_once_with(results, [options, options])
+    _editor.resize.assert_not_called()
+
+
+def test_bulk_resize_tempfile_single_pass(mocker, editor_options):
+    _editor = mocker.Mock()
+    options = dict(resize=editor_options["resize"], save=editor_options["save"])
+    tempfile = mocker.patch("image.sink.NamedTemporaryFile").return_value
+
+    results = list(utils.bulk_resize_tempfile(_editor, [options], single_pass=True))
+
+    _editor.bulk_save.assert_called_once_with([tempfile], [options])
+    tempfile.close.assert_called()
+    assert results == [tempfile.name]
+
+
+def test_save_gif_stream_options():
+    frames = [Image.new("L", (32, 16), value) for value in (0, 255)]
+    outputs = [BytesIO(), BytesIO()]
+
+    for output, optimize in zip(outputs, [False, True]):
+        utils.save_gif_stream(output, iter(frames), optimize=optimize, background=1)
+
+    # The unused grays are dropped from the palettes
+    assert len(outputs[1].getvalue()) < len(outputs[0].getvalue())
+    with Image.open(outputs[1]) as image:
+        assert image.info["background"] == 1
+        for frame, expected in zip(ImageSequence.Iterator(image), (0, 255)):
+            assert frame.convert("L").getpixel((0, 0)) == expected
+
+
+def test_save_gif_stream_empty(tmp_path):
+    path = tmp_path / "empty.gif"
+
+    with pytest.raises(ValueError):
+        utils.save_gif_stream(str(path), iter([]))
+
+
+def test_save_gif_stream_quantize(mocker):
+    colors = [(0, 0, 0), (50, 0, 0), (0, 0, 0)]
+    frames = [Image.new("RGB", (8, 4), color) for color in colors]
+    build = mocker.spy(utils.GlobalPalette, "build")
+    output = BytesIO()
+
+    stats = utils.save_gif_stream(
+        output, iter(frames), quantize={"sample_frames": 2}, duration=10
+    )
+
+    # The 1st 2 frames are held to build the palette
+    assert stats == {"frames": 3, "peak_held_bytes": 2 * 96}
+    build.assert_called_once()
+    with Image.open(output) as image:
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            assert frame.convert("RGB").getpixel((0, 0)) == colors[index]
+
+
+@pytest.mark.parametrize("alpha, transparent", [[255, False], [0, True]])
+def test_save_gif_stream_quantize_transparency(alpha, transparent):
+    frames = [Image.new("RGBA", (8, 4), (255, 0, 0, 255)) for _ in range(3)]
+    frames[0].putpixel((0, 0), (0, 0, 0, alpha))
+    output = BytesIO()
+
+    utils.save_gif_stream(output, iter(frames), quantize={"sample_frames": 2})
+
+    with Image.open(output) as image:
+        assert ("transparency" in image.info) == transparent